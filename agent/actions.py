@@ -1,164 +1,97 @@
-from pymongo import MongoClient
 from config import settings
 from datetime import datetime
-import stripe
-import sendgrid
-from sendgrid.helpers.mail import Mail
-import paypalrestsdk
-from paystackapi.transaction import Transaction
+from typing import Optional
+from .images import ImageProcessor
+from .metrics import metrics
+from .notifications import OwnerNotifier, SendGridTransport, SmtpTransport
+from .orders import OrderRepository, PAID_STATUS
+from .outbox import Deferred, MongoOutboxStore, OutboxWorker, task_status
+from .payments import payment_links
+from .services import services
+from .storage import URL_PREFIX, proof_storage, variant_key
 
 
-client = MongoClient(settings.mongodb_uri)
-db = client[settings.db_name]
-orders_collection = db[settings.orders_collection]
+def _create_mongo_client():
+    from pymongo import MongoClient
 
-# Stripe Initialization
-if settings.stripe_secret_key:
-    stripe.api_key = settings.stripe_secret_key
-    print("Stripe functionality enabled.")
-else:
-    print("Warning: Stripe API key is missing. Stripe functionality disabled.")
-    stripe.api_key = None # Explicitly set to None for clearer handling
-
-# PayPal Initialization
-if settings.paypal_client_id and settings.paypal_secret:
-    paypalrestsdk.configure({
-        "mode": "sandbox",  # Change to "live" when production is ready
-        "client_id": settings.paypal_client_id,
-        "client_secret": settings.paypal_secret
-    })
-    print("PayPal functionality enabled.")
-else:
-    print("Warning: PayPal credentials missing. PayPal functionality disabled.")
-    paypalrestsdk.configure({"mode": "sandbox", "client_id": None, "client_secret": None}) 
+    return MongoClient(settings.mongodb_uri)
 
 
-# Paystack Initialization and Check
-if settings.paystack_secret_key:
-    # We rely on the 'paystackapi' library to use the config when we call 'Transaction' later
-    print("Paystack functionality enabled.")
-else:
-    print("Warning: Paystack secret key is missing. Paystack functionality disabled.")
+# Built on first use (or by the warm-up after startup); see agent/services.py.
+mongo_client = services.register("mongo", _create_mongo_client)
+orders_collection = services.register(
+    "orders_collection", lambda: mongo_client.get()[settings.db_name][settings.orders_collection]
+)
+order_stats_collection = services.register(
+    "order_stats_collection", lambda: mongo_client.get()[settings.db_name][settings.order_stats_collection]
+)
+order_repository = OrderRepository(orders_collection, order_stats_collection)
+
+# Payment providers are set up in agent/payments.py (pooled clients, link cache).
 
 # SendGrid Initialization
 sg = None
 if settings.sendgrid_api_key:
-    sg = sendgrid.SendGridAPIClient(settings.sendgrid_api_key)
+    def _create_sendgrid_client():
+        import sendgrid
+
+        return sendgrid.SendGridAPIClient(settings.sendgrid_api_key)
+
+    sg = services.register("sendgrid", _create_sendgrid_client)
     print("SendGrid functionality enabled.")
 else:
     print("Warning: SendGrid API key is missing. Email alerts disabled.")
 
-
-def send_email_alert(order: dict, source: str, proof_url: str = None) -> None:
-    """Send new order alert to business owner, including proof URL."""
-
-    if sg is None:
-        print("Email skipped: SendGrid client not configured.")
-        return
-
-    html_content = f"""
-    <h3>New Order!</h3>
-    <p><strong>Order Number:</strong> {order['order_number']}</p>
-    <p><strong>Item:</strong> {order['item']}</p>
-    <p><strong>Customer:</strong> {order['customer']}</p>
-    <p><strong>Phone:</strong> {order['phone_number']}</p>
-    <p><strong>Email:</strong> {order['email']}</p>
-    <p><strong>Price:</strong> ${order['price']}</p>
-    <p><strong>Delivery:</strong> {order['delivery_time']}</p>
-    <p><strong>Payment:</strong> {order['payment_method'].title()}</p>
-    <p><strong>Source:</strong> {source}</p>
-    """
-    
-    if proof_url:
-        html_content += f'<p><strong>Payment Proof:</strong> <a href="{proof_url}">View Proof Image</a></p>'
-        subject = f"Order CONFIRMED: {order['order_number']} from {source}"
-    else:
-        subject = f"New PENDING Order: {order['order_number']} from {source}"
-
-    message = Mail(
-        from_email=settings.from_email,
-        to_emails=settings.owner_email,
-        subject=subject,
-        html_content=html_content
-    )
-    try:
-        sg.send(message)
-    except Exception as e:
-        print(f"Email failed: {e}")
+# Owner emails go through SMTP when SMTP_HOST is set, otherwise through SendGrid.
+if settings.smtp_host:
+    email_transport = SmtpTransport(settings.smtp_host, settings.smtp_port, settings.from_email, settings.owner_email,
+                                    settings.smtp_username, settings.smtp_password, settings.smtp_starttls)
+    print("Owner emails via SMTP.")
+elif sg is not None:
+    email_transport = SendGridTransport(sg, settings.from_email, settings.owner_email)
+else:
+    email_transport = None
+if email_transport is not None and not settings.public_base_url:
+    print("Warning: PUBLIC_BASE_URL is missing. Proof links and thumbnails in owner emails will not open.")
+owner_notifier = OwnerNotifier(
+    orders_collection,
+    email_transport,
+    digest_window=settings.owner_digest_window_seconds,
+    immediate_min_price=settings.owner_immediate_min_price,
+    max_digest_orders=settings.owner_digest_max_orders,
+    public_base_url=settings.public_base_url,
+)
 
 
 def create_stripe_link(amount: int, order_number: str) -> str:
     """Generate Stripe payment URL."""
-    if stripe.api_key is None:
-        return None  
-
-    amount_cents = int(amount * 100)
-    session = stripe.checkout.sessions.create(
-        payment_method_types=['card'],
-        line_items=[{
-            'price_data': {
-                'currency': 'usd',
-                'product_data': {'name': f'Order {order_number}'},
-                'unit_amount': amount_cents,
-            },
-            'quantity': 1,
-        }],
-        mode='payment',
-        success_url='https://yourbusiness.com/success',
-        cancel_url='https://yourbusiness.com/cancel',
-        metadata={'order_number': order_number}
-    )
-    return session.url
+    return payment_links.get_link("stripe", order_number, amount)
 
 
 def create_paystack_link(amount: int, email: str, order_number: str) -> str:
     """Generate Paystack payment URL."""
-    # Check for the correct key (Paystack, not PayPal)
-    if settings.paystack_secret_key is None:
-        print("Paystack not configured.")
-        return None
+    return payment_links.get_link("paystack", order_number, amount, email)
 
-    
-
-    amount_kobo = int(amount * 100)
-    try:
-        response = Transaction.initialize(
-            amount=amount_kobo,
-            email=email or "customer@example.com",
-            reference=order_number,
-            callback_url="https://yourbusiness.com/verify"
-        )
-        return response['data']['authorization_url']
-    except Exception as e:
-        print(f"Paystack link creation failed: {e}")
-        return None
 
 def create_paypal_link(amount: int, order_number: str) -> str:
     """Generate PayPal payment URL."""
-    if not paypalrestsdk.api.Configuration.client_id: 
-        print("PayPal not configured.")
-        return None
+    return payment_links.get_link("paypal", order_number, amount)
 
-    amount_str = f"{amount:.2f}"
-    payment = paypalrestsdk.Payment({
-        "intent": "sale",
-        "payer": {"payment_method": "paypal"},
-        "redirect_urls": {
-            "return_url": "https://yourbusiness.com/paypal-success",
-            "cancel_url": "https://yourbusiness.com/cancel"
-        },
-        "transactions": [{
-            "item_list": {"items": [{"name": order_number, "price": amount_str, "currency": "USD", "quantity": 1}]},
-            "amount": {"total": amount_str, "currency": "USD"},
-            "description": f"Order {order_number}"
-        }]
-    })
-    if payment.create():
-        return [link.href for link in payment.links if link.rel == "approval_url"][0]
-    return None
+
+def resolve_payment_method(payment_method: Optional[str], source_website: str, email: Optional[str]) -> str:
+    """Turn "auto" (or a missing method) into the provider to bill with."""
+    payment_method = payment_method or "auto"
+    if payment_method == "auto":
+        if any(x in source_website.lower() for x in ["ng", "nigeria", "lagos", "abuja"]) or "paystack" in (email or "").lower():
+            payment_method = "paystack"
+        elif "paypal" in payment_method.lower():
+            payment_method = "paypal"
+        else:
+            payment_method = "stripe"
+    return payment_method
 
 
-def take_order(
+def build_order(
     item: str,
     customer_name: str,
     address: str,
@@ -167,20 +100,15 @@ def take_order(
     source_website: str = "Unknown",
     price_override: int = None,
     phone_number: str = "N/A",
-    order_number: str = None 
- ) -> str:
-    """Save order and return payment instructions."""
-
-    if item is None: return "I need to know what you would like to order before I can proceed."
-    if customer_name is None or address is None: return "To finalize your order, I need your name and delivery address."
-    if phone_number is None or phone_number == "N/A": return "Please provide a valid phone number for delivery."
-
+    order_number: str = None
+) -> dict:
+    """The order document as stored in the orders collection."""
     order_id = order_number if order_number is not None else f"TEMP-{datetime.utcnow().timestamp()}"
 
-    price = price_override if price_override is not None else (150 if "premium" in item.lower() else 99)
-    delivery_time = "2 hours" if "urgent" in item.lower() else "tomorrow 10 AM"
-    
-    order = {
+    price = price_override if price_override is not None else (150 if "premium" in (item or "").lower() else 99)
+    delivery_time = "2 hours" if "urgent" in (item or "").lower() else "tomorrow 10 AM"
+
+    return {
         "order_number": order_id, 
         "item": item,
         "customer": customer_name,
@@ -194,72 +122,84 @@ def take_order(
         "source_website": source_website,
         "created_at": datetime.utcnow()
     }
-    
-    orders_collection.insert_one(order)
-    
-    
-    if payment_method == "auto":
-        if any(x in source_website.lower() for x in ["ng", "nigeria", "lagos", "abuja"]) or "paystack" in email.lower():
-            payment_method = "paystack"
-        elif "paypal" in payment_method.lower():
-            payment_method = "paypal"
-        else:
-            payment_method = "stripe"
 
-    
-    if payment_method == "bank":
-        return f"""
-ORDER PLACED!
-Order Number: {order_id}
-Item: {item}
-Price: ${price}
-Delivery: {delivery_time}
-Phone: {phone_number}
 
-Pay via Bank Transfer:
-Bank: {settings.bank_name}
-Account Name: {settings.account_name}
-Account Number: {settings.account_number}
+def create_payment_link(order: dict) -> Optional[str]:
+    """Payment URL for an order's provider, or None for bank transfers and unconfigured providers."""
+    method, price, order_number = order["payment_method"], order["price"], order["order_number"]
+    if method == "paystack":
+        return create_paystack_link(price, order.get("email"), order_number)
+    if method == "paypal":
+        return create_paypal_link(price, order_number)
+    if method == "stripe":
+        return create_stripe_link(price, order_number)
+    return None
 
-Please use the upload button below to send your payment proof.
-        """.strip()
 
-    elif payment_method == "paystack":
-        link = create_paystack_link(price, email, order_id)
-        return f"Pay with Paystack (Card/Bank/Mobile): {link or 'Error'}. Please upload proof after paying."
+# Side effects of a confirmed order, delivered by the outbox worker. Each handler gets the
+# stored order and returns fields to set on it; each must be safe to run twice.
 
-    elif payment_method == "paypal":
-        link = create_paypal_link(price, order_id)
-        return f"Pay with PayPal: {link or 'Error'}. Please upload proof after paying."
+def deliver_payment_link(order: dict) -> Optional[dict]:
+    if order.get("payment_link"):
+        return None
+    link = create_payment_link(order)
+    if link is None and payment_links.configured(order["payment_method"]):
+        raise RuntimeError(f"{order['payment_method']} did not return a payment link")
+    return {"payment_link": link}
+
+
+def deliver_proof_images(order: dict) -> Optional[dict]:
+    """Store a compact copy and a thumbnail of the proof next to the original, which is kept."""
+    proof_url = order.get("proof_url") or ""
+    if order.get("proof_compact_url") or not proof_url.startswith(URL_PREFIX):
+        return None
+    key = proof_url[len(URL_PREFIX):]
+    updates = {}
+    for variant, data in image_processor.render(proof_storage.read(key)).items():
+        derived = variant_key(key, variant)
+        proof_storage.put(derived, data, "image/jpeg")
+        updates[f"proof_{variant}_url"] = URL_PREFIX + derived
+    return updates
+
+
+def deliver_owner_email(order: dict) -> Optional[dict]:
+    """Email the owner now, or queue the order for the next digest (see agent/notifications.py)."""
+    if order.get("owner_notified_at") or order.get("owner_digest_queued_at"):
+        return None
+    if task_status(order, "proof_images") in ("pending", "in_progress"):
+        raise Deferred("waiting for the compact proof image")
+    return owner_notifier.notify(order)
 
-    else:
-        link = create_stripe_link(price, order_id)
-        return f"Pay with Card (Global): {link}. Please upload proof after paying."
 
+ORDER_TASK_HANDLERS = {
+    "payment_link": deliver_payment_link,
+    "proof_images": deliver_proof_images,
+    "owner_email": deliver_owner_email,
+}
 
-def forward_order_to_company(order_number: str, details: dict):
+image_processor = ImageProcessor(settings.image_workers or None)
+
+outbox_store = MongoOutboxStore(orders_collection)
+outbox_worker = OutboxWorker(
+    outbox_store,
+    ORDER_TASK_HANDLERS,
+    concurrency=settings.outbox_concurrency,
+    max_attempts=settings.outbox_max_attempts,
+)
+
+
+def place_order(proof_url: str, **order_fields) -> dict:
     """
-    Updates the order status and sends the final confirmation email to the owner
-    after payment proof is uploaded.
+    Record a paid order and queue its side effects in the same write.
+    The payment link, proof images and owner email are handled later by outbox_worker.
     """
-    
-    orders_collection.update_one(
-        {"order_number": order_number},
-        {"$set": {"status": "payment_verified_pending_shipping", "proof_url": details.get("proof_url")}}
-    )
-
-    
-    order_summary = {
-        "order_number": order_number,
-        "item": details.get("item"),
-        "customer": details.get("customer_name"),
-        "phone_number": details.get("phone"),
-        "email": details.get("email"),
-        "price": details.get("price"),
-        "delivery_time": "N/A (check DB)",
-        "payment_method": details.get("payment_method"),
-    }
-    
-    
-    send_email_alert(order_summary, details.get("source_website", "Unknown"), proof_url=details.get("proof_url"))
-    print(f"Order {order_number} finalized and forwarded to company.")
+    order = build_order(**order_fields)
+    order["payment_method"] = resolve_payment_method(order["payment_method"], order["source_website"], order["email"])
+    order["status"] = PAID_STATUS
+    order["proof_url"] = proof_url
+    if order_repository.add_order(order, list(ORDER_TASK_HANDLERS)):
+        outbox_worker.notify()
+        print(f"Order {order['order_number']} recorded; side effects queued.")
+    else:
+        print(f"Order {order['order_number']} was already finalized; nothing queued.")
+    return order
@@ -0,0 +1,240 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import Counter, OrderedDict
+from typing import Callable, Optional
+
+from agent.metrics import metrics
+from config import settings
+
+# Lower runs first. Proof uploads carry a payment; chat is everything else.
+PRIORITIES = {"proof": 0, "chat": 1}
+
+
+class AdmissionRejected(Exception):
+    """A turn refused before it reached the LLM; ``retry_after`` is in seconds."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def source_key(client_host: Optional[str]) -> str:
+    """The source bucket of a request: the client address, never a header the client can rotate (Referer)."""
+    return f"ip:{client_host or 'unknown'}"
+
+
+class RateLimiter:
+    """
+    Token buckets per key: ``rate`` tokens per second up to ``burst``.
+
+    Buckets are kept in LRU order and capped at ``max_keys``, so a flood of new
+    keys (random session ids) cannot grow memory; an evicted bucket was idle the
+    longest and simply starts full again. A rate of 0 disables the limit.
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 100_000, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.max_keys = max_keys
+        self.clock = clock
+        # key -> [tokens, last refill]
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+
+    def _bucket(self, key: str) -> list:
+        """The bucket for ``key``, refilled up to now (a new one starts full)."""
+        now = self.clock()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [self.burst, now]
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        return bucket
+
+    def wait(self, key: str) -> float:
+        """Seconds until ``key`` has a token, 0 when it has one now; spends nothing."""
+        if self.rate <= 0:
+            return 0.0
+        tokens = self._bucket(key)[0]
+        return 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+
+    def take(self, key: str) -> float:
+        """Spend one token for ``key``: 0 when allowed, else the seconds until one is available."""
+        wait = self.wait(key)
+        if not wait and self.rate > 0:
+            self._buckets[key][0] -= 1
+        return wait
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class Slot:
+    """One admitted turn; release it (or leave ``async with``) when the turn is done. Releasing twice is harmless."""
+
+    __slots__ = ("controller", "released")
+
+    def __init__(self, controller: "AdmissionController"):
+        self.controller = controller
+        self.released = False
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            self.controller._release()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+
+class AdmissionController:
+    """
+    Admission control in front of the LLM-backed routes.
+
+    A turn first spends a token from its session's and its source's (client
+    address's) bucket (``RateLimiter``), plus one from the source's
+    ``new_session_limiter`` bucket when it came without a session, since a
+    fresh session id also means a fresh session bucket; then it takes one of ``max_in_flight`` slots. When all slots
+    are busy it waits in a priority queue of at most ``max_queue`` turns for up to
+    ``queue_timeout`` seconds; a full queue sheds at once, and a proof upload
+    arriving at a full queue takes the place of the newest queued chat turn.
+    Every refusal raises AdmissionRejected (the routes answer 429) and is counted
+    as ``admission_rejected`` by reason and kind.
+
+    Runs on the event loop and is not thread-safe. Limits are per process, so
+    with several workers the effective limits are multiplied by the worker count.
+    """
+
+    def __init__(self, source_limiter: RateLimiter, session_limiter: RateLimiter,
+                 new_session_limiter: Optional[RateLimiter] = None, max_in_flight: int = 32, max_queue: int = 64,
+                 queue_timeout: float = 10.0, enabled: bool = True):
+        self.source_limiter = source_limiter
+        self.session_limiter = session_limiter
+        self.new_session_limiter = new_session_limiter or RateLimiter(0, 1)
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.enabled = enabled
+        self.in_flight = 0
+        self.admitted = Counter()
+        self.rejected = Counter()
+        # [priority, arrival, future, kind]; heap order serves uploads first, then arrival order.
+        self._waiters: list = []
+        self._arrivals = itertools.count()
+
+    async def admit(self, kind: str, source: str, session_id: Optional[str], new_session: bool = False) -> Slot:
+        """``limit`` then ``acquire``: the whole admission of one turn."""
+        self.limit(kind, source, session_id, new_session)
+        return await self.acquire(kind)
+
+    def limit(self, kind: str, source: str, session_id: Optional[str], new_session: bool = False) -> None:
+        """Spend a token from the session's and the source's buckets, or raise AdmissionRejected."""
+        if not self.enabled:
+            return
+        buckets = [(reason, limiter, key) for reason, limiter, key in (
+            ("new_session_rate", self.new_session_limiter, source if new_session else None),
+            ("session_rate", self.session_limiter, session_id),
+            ("source_rate", self.source_limiter, source),
+        ) if key is not None]
+        # Check them all before spending from any: a refused turn costs no tokens, and
+        # Retry-After is the longest wait, so a retry at that time gets through.
+        wait, reason = max((limiter.wait(key), reason) for reason, limiter, key in buckets)
+        if wait:
+            self._reject(reason, kind, wait)
+        for _, limiter, key in buckets:
+            limiter.take(key)
+
+    async def acquire(self, kind: str) -> Slot:
+        """Take an in-flight slot for a turn of ``kind`` ("chat" or "proof"), waiting in the queue if needed."""
+        if not self.enabled:
+            slot = Slot(self)
+            slot.released = True  # not counted, nothing to hand back
+            return slot
+        slot = await self._acquire(kind)
+        self.admitted[kind] += 1
+        return slot
+
+    async def _acquire(self, kind: str) -> Slot:
+        priority = PRIORITIES.get(kind, PRIORITIES["chat"])
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            return Slot(self)
+        if len(self._waiters) >= self.max_queue:
+            victim = max(self._waiters, default=None)
+            if victim is None or victim[0] <= priority:
+                self._reject("queue_full", kind, 1.0)
+            self._waiters.remove(victim)
+            heapq.heapify(self._waiters)
+            self.rejected[("displaced", victim[3])] += 1
+            metrics.count("admission_rejected", reason="displaced", kind=victim[3])
+            victim[2].set_exception(AdmissionRejected("displaced", 1.0))
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self._arrivals), future, kind]
+        heapq.heappush(self._waiters, entry)
+        try:
+            with metrics.stage("admission_wait", kind=kind):
+                await asyncio.wait_for(future, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._forget(entry)
+            self._reject("queue_timeout", kind, 1.0)
+        except asyncio.CancelledError:
+            # The client went away; hand back a slot that was granted as we were cancelled.
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self._release()
+            self._forget(entry)
+            raise
+        return Slot(self)
+
+    def _reject(self, reason: str, kind: str, retry_after: float) -> None:
+        self.rejected[(reason, kind)] += 1
+        metrics.count("admission_rejected", reason=reason, kind=kind)
+        raise AdmissionRejected(reason, retry_after)
+
+    def _forget(self, entry: list) -> None:
+        if entry in self._waiters:
+            self._waiters.remove(entry)
+            heapq.heapify(self._waiters)
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        # Hand the slot straight to the next waiter so new arrivals cannot jump the queue.
+        while self._waiters and self.in_flight < self.max_in_flight:
+            future = heapq.heappop(self._waiters)[2]
+            if not future.done():
+                self.in_flight += 1
+                future.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "admitted": dict(self.admitted),
+            "rejected": {f"{reason}:{kind}": n for (reason, kind), n in self.rejected.items()},
+            "tracked_sources": len(self.source_limiter),
+            "tracked_sessions": len(self.session_limiter),
+        }
+
+
+admission = AdmissionController(
+    source_limiter=RateLimiter(settings.admission_source_rate_per_minute / 60, settings.admission_source_burst),
+    session_limiter=RateLimiter(settings.admission_session_rate_per_minute / 60, settings.admission_session_burst),
+    new_session_limiter=RateLimiter(settings.admission_new_session_rate_per_minute / 60,
+                                    settings.admission_new_session_burst),
+    max_in_flight=settings.admission_max_in_flight,
+    max_queue=settings.admission_max_queue,
+    queue_timeout=settings.admission_queue_timeout_seconds,
+    enabled=settings.admission_enabled,
+)
+metrics.gauge("admission_in_flight", "Turns holding an admission slot.", lambda: [({}, admission.in_flight)])
+metrics.gauge("admission_queued", "Turns waiting for an admission slot.", lambda: [({}, len(admission._waiters))])
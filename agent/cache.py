@@ -0,0 +1,124 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from config import settings
+
+from .entities import EntityExtractor
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+# Turns carrying personal or order details must never be answered from (or stored in) the cache.
+_ORDER_DETAILS = re.compile(
+    r"\d|@|deliver|address|my name|i am |i'm |paid|proof|receipt|order number|phone",
+    re.IGNORECASE,
+)
+
+
+def normalize_text(text: str) -> str:
+    """Case-fold, drop punctuation and collapse whitespace so trivial variants share a key."""
+    return " ".join(_NON_WORD.sub(" ", text.lower()).split())
+
+
+def has_order_details(text: str) -> bool:
+    return bool(_ORDER_DETAILS.search(text))
+
+
+def has_entities(messages: List[dict]) -> bool:
+    """True when the conversation so far holds any order slot (item, phone, email, address, payment...)."""
+    extractor = EntityExtractor()
+    for message in messages:
+        extractor.feed(message["content"], "")
+    return any(slot is not None for slot in extractor.slots())
+
+
+class ResponseCache:
+    """
+    LRU + TTL cache of assistant replies for repeated prompts.
+
+    The key is the whole prompt the LLM saw, normalized: system prompt, every
+    history turn that fit the budget, and the new message. A reply can only be
+    shared with a session whose conversation is identical, so it never carries
+    another session's details; turns whose conversation holds order details
+    or any order slot bypass the cache altogether.
+    """
+
+    def __init__(self, max_entries: int = 2048, ttl_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key_for(self, messages: List[dict]) -> Optional[Tuple[str, str]]:
+        """Return the cache key for a prompt, or None when the turn must bypass the cache."""
+        current = messages[-1]
+        if "image_url" in current:
+            return None
+        conversation = messages[1:]
+        if any(has_order_details(m["content"]) for m in conversation) or has_entities(conversation):
+            return None
+        context = "\x1f".join(f"{m['role']}:{normalize_text(m['content'])}" for m in messages[:-1])
+        return hashlib.blake2b(context.encode(), digest_size=16).hexdigest(), normalize_text(current["content"])
+
+    def get(self, messages: List[dict]) -> Tuple[Optional[str], Optional[Tuple[str, str]]]:
+        """Look up a prompt. Returns (cached reply or None, key to store the fresh reply under)."""
+        key = self.key_for(messages) if self.max_entries else None
+        if key is None:
+            self.bypassed += 1
+            return None, None
+        with self._lock:
+            reply = self._get(key)
+            if reply is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return reply, key
+
+    def put(self, key: Optional[Tuple[str, str]], reply: str) -> None:
+        if key is None or not reply:
+            return
+        with self._lock:
+            self._entries[key] = (reply, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _get(self, key: Tuple[str, str]) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        reply, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return reply
+
+
+response_cache = ResponseCache(
+    max_entries=settings.response_cache_size,
+    ttl_seconds=settings.response_cache_ttl_seconds,
+)
@@ -1,138 +1,300 @@
-import openai
+import asyncio
 import json
-import re
+import time
 import uuid
-from google import genai
-from google.genai.types import Content, Part
 from config import settings
 from .memory import memory
-from .actions import take_order, forward_order_to_company
+from .cache import response_cache
+from .entities import EntityExtractor
+from .intent import classifier
+from .router import IntentRouter
+from .prompt import PromptBuilder
+from .metrics import metrics
+from .providers import CircuitBreaker, Provider, ProviderRouter
+from .services import services
+from .actions import place_order
 
-openai.api_key = settings.openai_api_key
-gemini_client = genai.Client(api_key=settings.gemini_api_key)
+# The SDKs are imported and their clients built on first use (or by the warm-up
+# after startup), not when the app is imported; see agent/services.py.
+# Clients are still created once so every request reuses the same connection pool.
+# No SDK retries: a failed call falls over to the other provider instead (see ProviderRouter).
 
-_part_from_text = Part.from_text
+def _create_openai_client():
+    import openai
+
+    return openai.AsyncOpenAI(api_key=settings.openai_api_key, timeout=settings.llm_timeout_seconds, max_retries=0)
+
+def _create_gemini_client():
+    from google import genai
+    from google.genai.types import HttpOptions
+
+    return genai.Client(
+        api_key=settings.gemini_api_key,
+        http_options=HttpOptions(timeout=int(settings.llm_timeout_seconds * 1000)),
+    )
+
+def _create_static_gemini_config():
+    from google.genai.types import GenerateContentConfig
+
+    return GenerateContentConfig(temperature=0.7, max_output_tokens=200, system_instruction=SYSTEM_PROMPT)
+
+# Warm the primary provider's client right after the intent model; the fallback comes later.
+_PRIMARY = "gemini" if (settings.ai_provider or "").lower() == "gemini" else "openai"
+async_openai_client = services.register("openai_async", _create_openai_client,
+                                        warm_order=10 if _PRIMARY == "openai" else 100)
+gemini_client = services.register("gemini", _create_gemini_client)
+async_gemini_client = services.register("gemini_async", lambda: gemini_client.get().aio,
+                                        warm_order=10 if _PRIMARY == "gemini" else 100)
+# The system prompt as a Gemini system instruction, built once.
+_static_gemini_config = services.register("gemini_config", _create_static_gemini_config)
 
 COMPLAINT_CONTACT_INFO = "For complaints --- contact at email wisetee01@gmail.com OR number 08012356678"
 
-def get_ai_response(messages: list[dict], model_name="gpt-3.5-turbo"):
-    """Attempts to get a response from OpenAI, falling back to Gemini if necessary."""
+def _to_gemini_request(messages: list[dict]):
+    """
+    Convert OpenAI-style chat messages into Gemini (contents, config).
+    Only called when the Gemini fallback actually runs; system messages become the system instruction.
+    """
+    from google.genai.types import Content, Part
+
+    system = "\n\n".join(m["content"] for m in messages if m["role"] == "system")
     gemini_contents = []
     for message in messages:
-        role = "user" if message["role"] == "user" else "model" if message["role"] == "assistant" else "model"
-        content_part = _part_from_text(text=message["content"])
-        content_item = Content(role=role, parts=[content_part])
-        gemini_contents.append(content_item)
-
-    try:
-        response = openai.chat.completions.create(
-            model=model_name,
-            messages=messages,
-            max_tokens=200,
-        )
-        return response.choices.message.content.strip()
-
-    except (openai.RateLimitError, openai.APIError) as e:
-        print(f"OpenAI failed ({type(e).__name__}). Falling back to Gemini...")
-        gemini_response = gemini_client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=gemini_contents,
-            config=genai.types.GenerateContentConfig(
-                temperature=0.7,
-                max_output_tokens=200,
-            ),
-        )
-        return gemini_response.text.strip()
+        if message["role"] == "system":
+            continue
+        role = "user" if message["role"] == "user" else "model"
+        content_part = Part.from_text(text=message["content"])
+        gemini_contents.append(Content(role=role, parts=[content_part]))
+    return gemini_contents, _gemini_config(system)
+
+def _gemini_config(system: str):
+    from google.genai.types import GenerateContentConfig
+
+    if system == SYSTEM_PROMPT:
+        return _static_gemini_config.get()
+    return GenerateContentConfig(temperature=0.7, max_output_tokens=200, system_instruction=system or None)
+
+OPENAI_MODEL = "gpt-3.5-turbo"
+GEMINI_MODEL = "gemini-2.5-flash"
+
+async def _openai_complete(messages: list[dict]) -> str:
+    response = await async_openai_client.chat.completions.create(
+        model=OPENAI_MODEL,
+        messages=messages,
+        max_tokens=200,
+    )
+    return response.choices[0].message.content.strip()
+
+async def _gemini_complete(messages: list[dict]) -> str:
+    # The Gemini payload is only built when the router actually sends the turn to Gemini.
+    gemini_contents, gemini_config = _to_gemini_request(messages)
+    gemini_response = await async_gemini_client.models.generate_content(
+        model=GEMINI_MODEL,
+        contents=gemini_contents,
+        config=gemini_config,
+    )
+    return gemini_response.text.strip()
+
+async def _openai_stream(messages: list[dict]):
+    stream = await async_openai_client.chat.completions.create(
+        model=OPENAI_MODEL,
+        messages=messages,
+        max_tokens=200,
+        stream=True,
+    )
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+async def _gemini_stream(messages: list[dict]):
+    gemini_contents, gemini_config = _to_gemini_request(messages)
+    gemini_stream = await async_gemini_client.models.generate_content_stream(
+        model=GEMINI_MODEL,
+        contents=gemini_contents,
+        config=gemini_config,
+    )
+    async for chunk in gemini_stream:
+        if chunk.text:
+            yield chunk.text
+
+def _provider(name: str, complete, stream) -> Provider:
+    return Provider(
+        name, complete, stream,
+        timeout=settings.llm_timeout_seconds,
+        breaker=CircuitBreaker(settings.llm_breaker_failures, settings.llm_breaker_cooldown_seconds),
+    )
+
+def create_provider_router() -> ProviderRouter:
+    """OpenAI first and Gemini as the fallback, or the other way round with AI_PROVIDER=gemini."""
+    providers = [
+        _provider("OpenAI", _openai_complete, _openai_stream),
+        _provider("Gemini", _gemini_complete, _gemini_stream),
+    ]
+    if _PRIMARY == "gemini":
+        providers.reverse()
+    return ProviderRouter(providers, hedge=settings.llm_hedging, hedge_min_delay=settings.llm_hedge_min_ms / 1000,
+                          hedge_max_delay=settings.llm_hedge_max_ms / 1000)
+
+provider_router = create_provider_router()
+metrics.gauge(
+    "llm_circuit_open", "1 while a provider's circuit breaker is open.",
+    lambda: [({"provider": p.name}, int(p.breaker.state == "open")) for p in provider_router.providers],
+)
+
+async def get_ai_response_async(messages: list[dict]):
+    """
+    Get a reply from the best healthy provider, falling back to the other one if it fails or times out;
+    may also hedge a slow call with the other provider (LLM_HEDGING).
+    """
+    return await provider_router.complete(messages)
+
+async def stream_ai_response(messages: list[dict]):
+    """Yield reply text deltas as the provider produces them; fallback and hedging apply until the first delta."""
+    async for delta in provider_router.stream(messages):
+        yield delta
 
 def generate_order_number():
     """Generates a unique order number using UUID."""
     return str(uuid.uuid4().int)[:10]
 
 
-def process_user_input(user_input_data: dict, source: str = "Direct") -> str:
-    """Handle user message and return bot response dynamically."""
-    system_prompt = f"""
+SYSTEM_PROMPT = """
 You are a professional business assistant taking orders. Collect all details (item, price, address, customer name, email, phone number, and payment method).
 Available payment methods are PayPal, Paystack, and Bank Transfer.
 Once a method is chosen, provide specific details (e.g., a link or account number . if its bank transfer bank details in .env should be detect and show it to customer).
 After details are provided, the user will upload a payment proof via the website interface.
 CRITICAL RULE: Immediately after the user uploads their proof (which the system handles in the backend), you must provide the final confirmation message with the order number. Do not ask any more questions.
 """
-    messages = [{"role": "system", "content": system_prompt}]
-    for h in memory.history:
-        messages.append({"role": "user", "content": h["user"]})
-        messages.append({"role": "assistant", "content": h["assistant"]})
-
-    messages.append(user_input_data)
-    reply = get_ai_response(messages)
-
-    if "image_url" in user_input_data:
-        
-        item, price, customer_name, address, email, payment_method, phone_number = extract_entities_from_history(
-            memory.history + [{"user": user_input_data["content"], "assistant": "Payment proof uploaded."}]
-        )
-
-        order_number = generate_order_number()
-
-    
-        take_order(
-            item=item,
-            customer_name=customer_name,
-            address=address,
-            email=email,
-            payment_method=payment_method,
-            source_website=source,
-            price_override=price,
-            phone_number=phone_number,
-            order_number=order_number
-        )
-
-        
-        forward_order_to_company(
-            order_number=order_number,
-            details={
-                "item": item, "price": price, "customer_name": customer_name,
-                "address": address, "email": email, "phone": phone_number,
-                "payment_method": payment_method,
-                "proof_url": user_input_data["image_url"]
-            }
-        )
-
-        
-        reply = f"Thank you! Your payment proof has been received. Your order number is **{order_number}**. The business owner will verify the payment shortly and process your order."
-
-    
-        reply += f"\n\n{COMPLAINT_CONTACT_INFO}"
-
-    memory.add(user_input_data["content"], reply)
+
+# The static prefix of every prompt, built once.
+prompt_builder = PromptBuilder(SYSTEM_PROMPT, history_token_budget=settings.prompt_history_tokens)
+
+def _bank_details_reply():
+    if not settings.account_number:
+        return None
+    return f"""
+You can pay via Bank Transfer:
+Bank: {settings.bank_name}
+Account Name: {settings.account_name}
+Account Number: {settings.account_number}
+
+Once you have paid, please use the upload button below to send your payment proof.
+""".strip()
+
+# Canned replies for intents that never need the LLM; see IntentRouter.
+ROUTED_REPLIES = {
+    "greeting": lambda: "Hello! Welcome, what would you like to order today?",
+    "pay_bank": _bank_details_reply,
+    "bank_details": _bank_details_reply,
+    "pay_paystack": lambda: (
+        "Great, you can pay with Paystack (card, bank or mobile money). Please make sure I have your name, "
+        "delivery address, phone number and email, then upload your payment proof with the upload button once you have paid."
+    ),
+    "pay_paypal": lambda: (
+        "Great, you can pay with PayPal. Please make sure I have your name, delivery address, phone number "
+        "and email, then upload your payment proof with the upload button once you have paid."
+    ),
+    "complaint": lambda: COMPLAINT_CONTACT_INFO,
+}
+
+intent_router = IntentRouter(classifier, ROUTED_REPLIES, threshold=settings.intent_confidence_threshold)
+services.on_warm("intent_model", lambda: classifier.model, warm_order=0)
+
+def build_messages(user_input_data: dict, history: list[dict]) -> list[dict]:
+    """Assemble the system prompt, as much of the session's history as fits the token budget, and the new user turn."""
+    with metrics.stage("prompt_build"):
+        return prompt_builder.build(user_input_data, history)
+
+
+def finalize_order(user_input_data: dict, source: str, entities: EntityExtractor) -> str:
+    """Record the order for an uploaded payment proof and return the confirmation; the owner is notified in the background."""
+    with metrics.stage("entity_extraction"):
+        entities.feed(user_input_data["content"], "Payment proof uploaded.")
+        item, price, customer_name, address, email, payment_method, phone_number = entities.slots()
+
+    order_number = generate_order_number()
+
+    place_order(
+        proof_url=user_input_data["image_url"],
+        item=item,
+        customer_name=customer_name,
+        address=address,
+        email=email,
+        payment_method=payment_method,
+        source_website=source,
+        price_override=price,
+        phone_number=phone_number,
+        order_number=order_number
+    )
+
+    reply = f"Thank you! Your payment proof has been received. Your order number is **{order_number}**. The business owner will verify the payment shortly and process your order."
+
+    reply += f"\n\n{COMPLAINT_CONTACT_INFO}"
     return reply
 
-def extract_entities_from_history(history_list):
-    """A helper function to dynamically pull data from the conversation history, including phone number."""
-    full_text = " ".join([msg["user"] + " " + msg["assistant"] for msg in history_list]).lower()
 
-    item, price, customer_name, address, email, payment_method, phone_number = None, None, None, None, None, None, None
+async def lookup_reply_async(user_input_data: dict, messages: list[dict]):
+    """
+    Answer from an intent template or the response cache when possible; the intent
+    classification is micro-batched on the event loop.
+    Returns (reply or None, cache key to store a fresh LLM reply under).
+    Not a stage of its own: both lookups are in-process and cheaper than the timing.
+    """
+    if "image_url" not in user_input_data:
+        reply = await intent_router.route_async(user_input_data["content"])
+        if reply is not None:
+            return reply, None
+    return response_cache.get(messages)
+
+
+async def _call_memory(stage: str, method, *args):
+    """Run a session-store call, moving it off the event loop (and timing it) when the store does network I/O."""
+    if not memory.is_remote:
+        # An in-process lookup takes less time than timing it would.
+        return method(*args)
+    with metrics.stage(stage):
+        return await asyncio.to_thread(method, *args)
 
-    phone_match = re.search(r"(\+?\d{1,3}[-.\s\(\)]*?\d{3,4}[-.\s\(\)]*?\d{4,9})", full_text)
-    if phone_match: phone_number = phone_match.group(0).strip()
 
-    price_match = re.search(r"[$€]?\s*(\d+(\.\d{1,2})?)", full_text)
-    if price_match:
-        try:
-            price = float(price_match.group(1))
-        except ValueError: pass
+async def process_user_input_async(user_input_data: dict, source: str = "Direct", session_id: str = "default") -> str:
+    """Handle a user message and return the bot's reply; the LLM call is awaited and the order write runs in a worker thread."""
+    with metrics.stage("chat_turn", mode="reply"):
+        history = await _call_memory("session_load", memory.history, session_id)
+        messages = build_messages(user_input_data, history)
+        reply, cache_key = await lookup_reply_async(user_input_data, messages)
+        if reply is None:
+            start = time.perf_counter()
+            reply = await get_ai_response_async(messages)
+            intent_router.record_latency("llm", time.perf_counter() - start)
+            response_cache.put(cache_key, reply)
 
-    if "deliver to" in full_text: address = " ".join(full_text.split("deliver to")[-1].split()[:3])
-    elif "my address is" in full_text: address = " ".join(full_text.split("my address is")[-1].split()[:3])
+        if "image_url" in user_input_data:
+            entities = await _call_memory("session_load", memory.entities, session_id)
+            # The order insert is a blocking Mongo write; everything slower goes through the outbox.
+            reply = await asyncio.to_thread(finalize_order, user_input_data, source, entities)
 
-    email_match = re.search(r"\b[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}\b", full_text)
-    if email_match: email = email_match.group(0)
+        await _call_memory("session_save", memory.add, session_id, user_input_data["content"], reply)
+        return reply
 
-    if any(w in full_text for w in ["bank", "transfer", "fidelity"]): payment_method = "bank"
-    elif "paystack" in full_text: payment_method = "paystack"
-    elif "paypal" in full_text: payment_method = "paypal"
 
-    if "pizza" in full_text: item = "Pizza"
-    elif "laptop" in full_text: item = "Laptop"
+async def stream_user_input(user_input_data: dict, source: str = "Direct", session_id: str = "default"):
+    """Streaming process_user_input_async for chat turns: yields deltas, then commits the full reply to memory."""
+    turn_start = time.perf_counter()
+    history = await _call_memory("session_load", memory.history, session_id)
+    messages = build_messages(user_input_data, history)
+    reply, cache_key = await lookup_reply_async(user_input_data, messages)
+    if reply is not None:
+        yield reply
+    else:
+        start = time.perf_counter()
+        parts = []
+        async for delta in stream_ai_response(messages):
+            parts.append(delta)
+            yield delta
+        reply = "".join(parts).strip()
+        intent_router.record_latency("llm", time.perf_counter() - start)
+        response_cache.put(cache_key, reply)
 
-    return item, price, customer_name, address, email, payment_method, phone_number
+    # Only completed replies are remembered; an abandoned stream leaves history untouched.
+    await _call_memory("session_save", memory.add, session_id, user_input_data["content"], reply)
+    metrics.observe("chat_turn", time.perf_counter() - turn_start, mode="stream")
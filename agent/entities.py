@@ -0,0 +1,128 @@
+import re
+from typing import Optional
+
+PHONE_PATTERN = re.compile(r"(\+?\d{1,3}[-.\s\(\)]*?\d{3,4}[-.\s\(\)]*?\d{4,9})")
+PRICE_PATTERN = re.compile(r"[$€]?\s*(\d+(\.\d{1,2})?)")
+EMAIL_PATTERN = re.compile(r"\b[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}\b")
+
+# Every keyword slot is found by one pass of a single alternation. The lookahead lets
+# overlapping keywords ("laptopaypal") all match, like the substring checks they replace.
+KEYWORD_PATTERN = re.compile(r"(?=(deliver to|my address is|bank|transfer|fidelity|paystack|paypal|pizza|laptop))")
+ADDRESS_MARKERS = ("deliver to", "my address is")
+BANK_KEYWORDS = ("bank", "transfer", "fidelity")
+
+# Text kept from the end of the transcript so matches that straddle two turns are still found.
+TAIL_CHARS = 64
+
+
+class EntityExtractor:
+    """
+    Incremental order-slot extractor for one conversation.
+
+    ``feed`` scans each new turn once and updates the slots, so ``slots`` is O(1)
+    however long the conversation is. The results match rescanning the joined,
+    lower-cased transcript (the reference in benchmarks/bench_entity_extraction.py):
+    first phone/price/email match, three words after the last "deliver to"
+    (else "my address is"), bank > paystack > paypal, and pizza > laptop.
+    """
+
+    __slots__ = ("phone_number", "price", "email", "keywords", "address_words", "_tail", "_has_text")
+
+    def __init__(self):
+        self.phone_number: Optional[str] = None
+        self.price: Optional[float] = None
+        self.email: Optional[str] = None
+        self.keywords: set = set()
+        # marker -> words following its latest occurrence (only the first three matter)
+        self.address_words: dict = {}
+        self._tail = ""
+        self._has_text = False
+
+    def feed(self, user: str, assistant: str) -> None:
+        """Add one turn, exactly as it is joined into the transcript."""
+        segment = f"{user} {assistant}".lower()
+        window = f"{self._tail} {segment}" if self._has_text else segment
+        new_from = len(window) - len(segment)
+
+        if self.phone_number is None:
+            match = PHONE_PATTERN.search(window)
+            if match:
+                self.phone_number = match.group(0).strip()
+        if self.price is None:
+            match = PRICE_PATTERN.search(window)
+            if match:
+                try:
+                    self.price = float(match.group(1))
+                except ValueError:
+                    pass
+        if self.email is None:
+            match = EMAIL_PATTERN.search(window)
+            if match:
+                self.email = match.group(0)
+
+        latest = {}
+        for match in KEYWORD_PATTERN.finditer(window):
+            keyword = match.group(1)
+            if keyword in ADDRESS_MARKERS:
+                end = match.start() + len(keyword)
+                # Occurrences wholly inside the tail were handled by an earlier turn.
+                if end > new_from:
+                    latest[keyword] = end
+            else:
+                self.keywords.add(keyword)
+
+        for marker, words in self.address_words.items():
+            if marker not in latest and len(words) < 3:
+                words.extend(segment.split()[:3 - len(words)])
+        for marker, end in latest.items():
+            self.address_words[marker] = window[end:].split()[:3]
+
+        self._tail = window[-TAIL_CHARS:]
+        self._has_text = True
+
+    def slots(self):
+        """(item, price, customer_name, address, email, payment_method, phone_number)"""
+        keywords = self.keywords
+        address = None
+        for marker in ADDRESS_MARKERS:
+            if marker in self.address_words:
+                address = " ".join(self.address_words[marker])
+                break
+
+        payment_method = None
+        if any(k in keywords for k in BANK_KEYWORDS): payment_method = "bank"
+        elif "paystack" in keywords: payment_method = "paystack"
+        elif "paypal" in keywords: payment_method = "paypal"
+
+        item = None
+        if "pizza" in keywords: item = "Pizza"
+        elif "laptop" in keywords: item = "Laptop"
+
+        return item, self.price, None, address, self.email, payment_method, self.phone_number
+
+    def copy(self) -> "EntityExtractor":
+        return EntityExtractor.from_dict(self.to_dict())
+
+    def to_dict(self) -> dict:
+        return {
+            "phone_number": self.phone_number,
+            "price": self.price,
+            "email": self.email,
+            "keywords": sorted(self.keywords),
+            "address_words": {marker: list(words) for marker, words in self.address_words.items()},
+            "tail": self._tail,
+            "has_text": self._has_text,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict]) -> "EntityExtractor":
+        extractor = cls()
+        if data:
+            extractor.phone_number = data["phone_number"]
+            extractor.price = data["price"]
+            extractor.email = data["email"]
+            extractor.keywords = set(data["keywords"])
+            extractor.address_words = {marker: list(words) for marker, words in data["address_words"].items()}
+            extractor._tail = data["tail"]
+            extractor._has_text = data["has_text"]
+        return extractor
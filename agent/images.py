@@ -0,0 +1,69 @@
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+
+from .metrics import metrics
+
+# Longest side in pixels of each derived JPEG.
+VARIANTS = {"compact": 1600, "thumb": 320}
+JPEG_QUALITY = 82
+
+
+def render_variants(data: bytes, variants: Dict[str, int] = VARIANTS, quality: int = JPEG_QUALITY) -> Dict[str, bytes]:
+    """
+    Compact re-encodes of a proof image, as JPEG bytes keyed by variant name.
+
+    Runs in a worker process. The photo is rotated upright from its EXIF
+    orientation first; the outputs carry no EXIF (location, device) at all.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as image:
+        image.draft("RGB", (max(variants.values()),) * 2)  # JPEG: decode at reduced scale when possible
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+
+        rendered = {}
+        for name, side in sorted(variants.items(), key=lambda item: -item[1]):
+            image.thumbnail((side, side), Image.Resampling.LANCZOS)
+            out = io.BytesIO()
+            image.save(out, "JPEG", quality=quality, optimize=True, progressive=True)
+            rendered[name] = out.getvalue()
+        return rendered
+
+
+class ImageProcessor:
+    """
+    Process pool for proof images, created on first use.
+
+    Uses "spawn" workers: the app process runs threads (uvicorn, the outbox
+    pool), which fork does not copy safely.
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers or os.cpu_count() or 1
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def render(self, data: bytes) -> Dict[str, bytes]:
+        """Blocking; call from a worker thread, never from the event loop."""
+        with metrics.stage("proof_images"):
+            return self.pool.submit(render_variants, data).result()
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
@@ -1,29 +1,219 @@
+import asyncio
+import os
 import pickle
+import threading
+import time
 from pathlib import Path
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
-from sklearn.pipeline import make_pipeline
+from typing import List, Optional, Tuple
+
+from config import settings
 
 MODEL_PATH = Path("models/intent_model.pkl")
 MODEL_PATH.parent.mkdir(exist_ok=True)
 
+# "order" and "chat" are open-ended and go to the LLM; the other intents have canned replies.
 TRAINING_DATA = [
     ("buy premium", "order"), ("order package", "order"), ("purchase", "order"),
-    ("pay with bank", "order"), ("pay with paystack", "order"), ("use paypal", "order"),
-    ("deliver to lagos", "order"), ("what is ai", "chat"), ("hello", "chat")
+    ("deliver to lagos", "order"), ("i want to order a pizza", "order"), ("i need a laptop", "order"),
+    ("how much is the premium package", "order"), ("my name is", "order"), ("my address is", "order"),
+    ("what is ai", "chat"), ("what do you sell", "chat"), ("tell me about your business", "chat"),
+    ("how long does delivery take", "chat"), ("do you deliver on weekends", "chat"), ("can you help me", "chat"),
+    ("hello", "greeting"), ("hi", "greeting"), ("hey", "greeting"), ("hi there", "greeting"),
+    ("good morning", "greeting"), ("good afternoon", "greeting"), ("good evening", "greeting"), ("hello there", "greeting"),
+    ("pay with bank", "pay_bank"), ("bank transfer", "pay_bank"), ("i will pay by transfer", "pay_bank"),
+    ("i want to pay with bank transfer", "pay_bank"), ("pay by bank", "pay_bank"),
+    ("send your account number", "bank_details"), ("what is your account number", "bank_details"),
+    ("bank details", "bank_details"), ("what are your bank details", "bank_details"), ("account details", "bank_details"),
+    ("pay with paystack", "pay_paystack"), ("paystack", "pay_paystack"), ("i will use paystack", "pay_paystack"),
+    ("i want to pay with paystack", "pay_paystack"), ("pay by card with paystack", "pay_paystack"),
+    ("use paypal", "pay_paypal"), ("paypal", "pay_paypal"), ("pay with paypal", "pay_paypal"),
+    ("i want to pay with paypal", "pay_paypal"), ("i will use paypal", "pay_paypal"),
+    ("i have a complaint", "complaint"), ("i want to complain", "complaint"), ("complaint", "complaint"),
+    ("who do i contact for complaints", "complaint"), ("i am not happy with my order", "complaint"),
+    ("my order is wrong", "complaint"),
 ]
 
-def train_model():
+def train_model(path: Path = MODEL_PATH):
+    """Fit the TF-IDF + LogisticRegression pipeline and pickle it atomically to ``path``."""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import make_pipeline
+
     texts, labels = zip(*TRAINING_DATA)
-    model = make_pipeline(TfidfVectorizer(lowercase=True), LogisticRegression())
+    model = make_pipeline(TfidfVectorizer(lowercase=True, ngram_range=(1, 2)), LogisticRegression(C=20, max_iter=1000))
     model.fit(texts, labels)
-    with open(MODEL_PATH, "wb") as f:
+    # Write-then-rename so a worker hot-reloading the model never reads a half-written file.
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "wb") as f:
         pickle.dump(model, f)
+    os.replace(tmp_path, path)
+
+def load_classifier(path: Path = MODEL_PATH):
+    if not path.exists():
+        print(f"Intent model missing at {path}; training it now.")
+        train_model(path)
+    with open(path, "rb") as f:
+        model = pickle.load(f)
+    # A model pickled before the intent labels changed has to be retrained.
+    if set(model.classes_) != {label for _, label in TRAINING_DATA}:
+        train_model(path)
+        with open(path, "rb") as f:
+            model = pickle.load(f)
+    return model
+
+
+class IntentClassifier:
+    """
+    Intent model service.
+
+    The pickle is loaded on first use rather than at import, and reloaded when
+    the file on disk changes (checked at most every ``reload_interval`` seconds),
+    so a retrained model goes live without a restart. ``predict_many`` batches
+    concurrent callers into one vectorized transform + predict_proba call.
+
+    On the event loop nothing is loaded inline: ``predict_many`` loads, checks
+    and reloads the model in a worker thread and answers None until a model
+    is in memory, so the caller falls back to the LLM. A lone request is
+    classified on the next loop iteration; the ``batch_window`` wait only
+    applies while requests arrive faster than the window.
+    """
+
+    def __init__(self, path: Path = MODEL_PATH, batch_window: float = 0.002, max_batch: int = 64,
+                 reload_interval: float = 5.0):
+        self.path = path
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.reload_interval = reload_interval
+        self.batches = 0
+        self.batched_texts = 0
+        self._model = None
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._pending: List[Tuple[List[str], asyncio.Future]] = []
+        self._pending_count = 0
+        self._flush_handle: Optional[asyncio.Handle] = None
+        self._last_arrival = float("-inf")
+        self._refreshing: Optional[asyncio.Future] = None
+
+    @property
+    def model(self):
+        now = time.monotonic()
+        if self._model is None or now - self._checked_at >= self.reload_interval:
+            self._checked_at = now
+            self._load_if_changed()
+        return self._model
+
+    @property
+    def classes_(self):
+        return self.model.classes_
+
+    @property
+    def named_steps(self):
+        return self.model.named_steps
+
+    def reload(self) -> None:
+        """Force the model to be re-read from disk."""
+        with self._lock:
+            self._mtime = None
+        self._load_if_changed()
+
+    def _load_if_changed(self) -> None:
+        with self._lock:
+            try:
+                mtime = self.path.stat().st_mtime
+            except FileNotFoundError:
+                mtime = None
+            if self._model is not None and mtime == self._mtime:
+                return
+            model = load_classifier(self.path)
+            self._mtime = self.path.stat().st_mtime
+            self._model = model
+
+    def predict_proba(self, texts: List[str]):
+        return self.model.predict_proba(texts)
+
+    @property
+    def ready(self) -> bool:
+        return self._model is not None
+
+    def classify(self, texts: List[str]) -> List[Tuple[str, float]]:
+        """Top intent and its probability for each text, in one vectorized call."""
+        return self._classify(self.model, texts)
+
+    @staticmethod
+    def _classify(model, texts: List[str]) -> List[Tuple[str, float]]:
+        probabilities = model.predict_proba(texts)
+        best = probabilities.argmax(axis=1)
+        confidences = probabilities[range(len(texts)), best]
+        return [(str(model.classes_[i]), float(p)) for i, p in zip(best, confidences)]
+
+    async def predict_many(self, texts: List[str]) -> Optional[List[Tuple[str, float]]]:
+        """Micro-batched ``classify`` for use from the event loop; None while the model is not loaded yet."""
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+        if self._model is None or now - self._checked_at >= self.reload_interval:
+            self._refresh_in_background(loop)
+        if self._model is None:
+            return None
+        future = loop.create_future()
+        self._pending.append((texts, future))
+        self._pending_count += len(texts)
+        busy = now - self._last_arrival < self.batch_window
+        self._last_arrival = now
+        if self._pending_count >= self.max_batch:
+            if self._flush_handle is not None:
+                self._flush_handle.cancel()
+            self._flush()
+        elif self._flush_handle is None:
+            # call_soon still coalesces everything queued in the same loop iteration.
+            if busy:
+                self._flush_handle = loop.call_later(self.batch_window, self._flush)
+            else:
+                self._flush_handle = loop.call_soon(self._flush)
+        return await future
+
+    def _refresh_in_background(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Load the model, or check the file for a newer one, in a worker thread."""
+        if self._refreshing is not None and not self._refreshing.done():
+            return
+        self._checked_at = time.monotonic()
+        self._refreshing = loop.run_in_executor(None, self._load_if_changed)
+        self._refreshing.add_done_callback(self._refresh_done)
+
+    def _refresh_done(self, future: asyncio.Future) -> None:
+        if not future.cancelled() and future.exception() is not None:
+            print(f"Warning: could not load the intent model: {future.exception()}")
+
+    def _flush(self) -> None:
+        batch, self._pending = self._pending, []
+        self._pending_count = 0
+        self._flush_handle = None
+        texts = [text for chunk, _ in batch for text in chunk]
+        try:
+            # Only the model already in memory; loading and reloading happen in a thread.
+            results = self._classify(self._model, texts)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batches += 1
+        self.batched_texts += len(texts)
+        offset = 0
+        for chunk, future in batch:
+            if not future.done():
+                future.set_result(results[offset:offset + len(chunk)])
+            offset += len(chunk)
+
+
+classifier = IntentClassifier(
+    batch_window=settings.intent_batch_window_ms / 1000,
+    reload_interval=settings.intent_reload_interval_seconds,
+)
 
-def load_classifier():
-    if not MODEL_PATH.exists():
-        train_model()
-    with open(MODEL_PATH, "rb") as f:
-        return pickle.load(f)
 
-classifier = load_classifier()
\ No newline at end of file
+if __name__ == "__main__":
+    # Retrain in place; running workers pick the new model up on their next reload check.
+    train_model()
+    print(f"Intent model written to {MODEL_PATH}")
@@ -1,18 +1,305 @@
-from typing import List, Dict
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from typing import Deque, Dict, List, Optional
+
+from config import settings
+from .entities import EntityExtractor
+from .services import Service, services
+
+# Rough bookkeeping costs used for the memory cap: per turn (dict + two str headers)
+# and per session (deque, entity slots, LRU entry).
+TURN_OVERHEAD_BYTES = 350
+SESSION_OVERHEAD_BYTES = 1200
+# Optimistic updates of a session's entity slots retry this often when other turns keep winning the race.
+MAX_UPDATE_ATTEMPTS = 10
+
 
 class ConversationMemory:
-   
-    def __init__(self, max_size: int = 10): 
-        self.history: List[Dict[str, str]] = []
+    """Bounded history for a single conversation."""
+
+    __slots__ = ("history", "max_size", "size_bytes", "last_seen", "entities")
+
+    def __init__(self, max_size: int = 10):
+        self.history: Deque[Dict[str, str]] = deque(maxlen=max_size)
         self.max_size = max_size
+        self.size_bytes = SESSION_OVERHEAD_BYTES
+        self.last_seen = time.monotonic()
+        self.entities = EntityExtractor()
 
-    def add(self, user: str, assistant: str) -> None:
+    def add(self, user: str, assistant: str) -> int:
+        """Append a turn and return the change in approximate size."""
+        before = self.size_bytes
+        if len(self.history) == self.max_size:
+            dropped = self.history[0]
+            self.size_bytes -= _turn_size(dropped["user"], dropped["assistant"])
         self.history.append({"user": user, "assistant": assistant})
-        if len(self.history) > self.max_size:
-            self.history.pop(0)
+        self.entities.feed(user, assistant)
+        self.size_bytes += _turn_size(user, assistant)
+        return self.size_bytes - before
 
     def get_recent(self) -> List[Dict[str, str]]:
-        
-        return self.history 
+        return list(self.history)
+
+
+def _turn_size(user: str, assistant: str) -> int:
+    return len(user) + len(assistant) + TURN_OVERHEAD_BYTES
+
+
+class InMemorySessionStore:
+    """
+    Session-keyed conversation store kept in this process.
+
+    Sessions are held in LRU order. A session idle for longer than ``ttl_seconds``
+    is dropped, and the least recently used sessions are evicted whenever
+    ``max_sessions`` or ``max_bytes`` would be exceeded.
+    """
+
+    is_remote = False
+
+    def __init__(self, history_size: int = 10, ttl_seconds: float = 1800,
+                 max_sessions: int = 100_000, max_bytes: int = 256 * 1024 * 1024):
+        self.history_size = history_size
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.evictions = 0
+        self._sessions: "OrderedDict[str, ConversationMemory]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def history(self, session_id: str) -> List[Dict[str, str]]:
+        """Return a snapshot of the session's recent turns (oldest first)."""
+        with self._lock:
+            self._expire(time.monotonic())
+            session = self._sessions.get(session_id)
+            if session is None:
+                return []
+            self._sessions.move_to_end(session_id)
+            return session.get_recent()
+
+    def entities(self, session_id: str) -> EntityExtractor:
+        """A copy of the order slots extracted so far, safe to feed further turns into."""
+        with self._lock:
+            self._expire(time.monotonic())
+            session = self._sessions.get(session_id)
+            return session.entities.copy() if session is not None else EntityExtractor()
+
+    def add(self, session_id: str, user: str, assistant: str) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = ConversationMemory(self.history_size)
+                self.total_bytes += session.size_bytes
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_seen = now
+            self.total_bytes += session.add(user, assistant)
+            self._enforce_caps()
+
+    def clear(self, session_id: str) -> None:
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is not None:
+                self.total_bytes -= session.size_bytes
+
+    def _expire(self, now: float) -> None:
+        # LRU order is also last-seen order, so expired sessions sit at the front.
+        deadline = now - self.ttl_seconds
+        while self._sessions:
+            if next(iter(self._sessions.values())).last_seen >= deadline:
+                break
+            self._evict_oldest()
+
+    def _enforce_caps(self) -> None:
+        while self._sessions and (len(self._sessions) > self.max_sessions
+                                  or self.total_bytes > self.max_bytes):
+            self._evict_oldest()
+
+    def _evict_oldest(self) -> None:
+        _, session = self._sessions.popitem(last=False)
+        self.total_bytes -= session.size_bytes
+        self.evictions += 1
+
+
+class MongoSessionStore:
+    """
+    Conversation store shared by every worker through a Mongo collection.
+
+    Each session is one document; ``$push`` with ``$slice`` keeps the history
+    bounded and a TTL index on ``updated_at`` removes idle sessions. The entity
+    slots are read, fed and written back conditionally on ``entities_version``,
+    so concurrent turns on one session (in any worker) retry instead of
+    overwriting each other's slots.
+    """
+
+    is_remote = True
+
+    def __init__(self, collection, history_size: int = 10, ttl_seconds: float = 1800):
+        self.collection = collection
+        self.history_size = history_size
+        self.ttl_seconds = ttl_seconds
+
+    def ensure_indexes(self) -> None:
+        self.collection.create_index("updated_at", expireAfterSeconds=int(self.ttl_seconds))
+
+    def history(self, session_id: str) -> List[Dict[str, str]]:
+        doc = self.collection.find_one({"_id": session_id}, {"history": 1, "updated_at": 1})
+        if doc is None:
+            return []
+        # The TTL monitor only runs once a minute; don't serve sessions it hasn't reaped yet.
+        if doc["updated_at"] < datetime.utcnow() - timedelta(seconds=self.ttl_seconds):
+            return []
+        return doc["history"]
+
+    def entities(self, session_id: str) -> EntityExtractor:
+        doc = self.collection.find_one({"_id": session_id}, {"entities": 1})
+        return EntityExtractor.from_dict(doc.get("entities") if doc else None)
+
+    def add(self, session_id: str, user: str, assistant: str) -> None:
+        from pymongo.errors import DuplicateKeyError
+
+        turn = {"user": user, "assistant": assistant}
+        for _ in range(MAX_UPDATE_ATTEMPTS):
+            doc = self.collection.find_one({"_id": session_id}, {"entities": 1, "entities_version": 1})
+            entities = EntityExtractor.from_dict(doc.get("entities") if doc else None)
+            entities.feed(user, assistant)
+            now = datetime.utcnow()
+            if doc is None:
+                try:
+                    self.collection.insert_one({"_id": session_id, "history": [turn], "updated_at": now,
+                                                "entities": entities.to_dict(), "entities_version": 1})
+                    return
+                except DuplicateKeyError:
+                    continue  # another turn created the session first
+            # A missing version (older documents) matches None, and $inc then starts it at 1.
+            result = self.collection.update_one(
+                {"_id": session_id, "entities_version": doc.get("entities_version")},
+                {
+                    "$push": {"history": {"$each": [turn], "$slice": -self.history_size}},
+                    "$set": {"updated_at": now, "entities": entities.to_dict()},
+                    "$inc": {"entities_version": 1},
+                },
+            )
+            if result.matched_count:
+                return
+        raise RuntimeError(f"Session {session_id} kept changing; turn not saved.")
+
+    def clear(self, session_id: str) -> None:
+        self.collection.delete_one({"_id": session_id})
+
+
+class RedisSessionStore:
+    """
+    Conversation store shared by every worker through Redis (or anything that
+    speaks its protocol).
+
+    A session is two keys with the same TTL: a list of JSON turns, trimmed to
+    ``history_size``, and the JSON entity slots. A turn is written in one
+    MULTI/EXEC, so a reader never sees the history without its entities, under
+    WATCH of the entities key, so a turn whose slots another turn changed in the
+    meantime re-reads them and retries instead of overwriting them. The session
+    id is a hash tag, so both keys land on the same Redis Cluster slot.
+    """
+
+    is_remote = True
+
+    def __init__(self, client, history_size: int = 10, ttl_seconds: float = 1800, prefix: str = "session"):
+        self.client = client
+        self.history_size = history_size
+        self.ttl_seconds = int(ttl_seconds)
+        self.prefix = prefix
+
+    @property
+    def redis(self):
+        # Not through the Service proxy: its own get() would shadow Redis GET.
+        return self.client.get() if isinstance(self.client, Service) else self.client
+
+    def _keys(self, session_id: str):
+        return f"{self.prefix}:{{{session_id}}}:history", f"{self.prefix}:{{{session_id}}}:entities"
+
+    def history(self, session_id: str) -> List[Dict[str, str]]:
+        history_key, _ = self._keys(session_id)
+        return [json.loads(turn) for turn in self.redis.lrange(history_key, 0, -1)]
+
+    def entities(self, session_id: str) -> EntityExtractor:
+        _, entities_key = self._keys(session_id)
+        data = self.redis.get(entities_key)
+        return EntityExtractor.from_dict(json.loads(data) if data else None)
+
+    def add(self, session_id: str, user: str, assistant: str) -> None:
+        from redis.exceptions import WatchError
+
+        history_key, entities_key = self._keys(session_id)
+        with self.redis.pipeline(transaction=True) as pipe:
+            for _ in range(MAX_UPDATE_ATTEMPTS):
+                try:
+                    pipe.watch(entities_key)
+                    data = pipe.get(entities_key)
+                    entities = EntityExtractor.from_dict(json.loads(data) if data else None)
+                    entities.feed(user, assistant)
+                    pipe.multi()
+                    pipe.rpush(history_key, json.dumps({"user": user, "assistant": assistant}))
+                    pipe.ltrim(history_key, -self.history_size, -1)
+                    pipe.expire(history_key, self.ttl_seconds)
+                    pipe.set(entities_key, json.dumps(entities.to_dict()), ex=self.ttl_seconds)
+                    pipe.execute()
+                    return
+                except WatchError:
+                    continue
+        raise RuntimeError(f"Session {session_id} kept changing; turn not saved.")
+
+    def clear(self, session_id: str) -> None:
+        self.redis.delete(*self._keys(session_id))
+
+
+def _create_redis_client():
+    try:
+        import redis
+    except ImportError:
+        raise RuntimeError("SESSION_BACKEND=redis needs the redis package (pip install redis).")
+    return redis.Redis.from_url(settings.redis_url, socket_timeout=5, health_check_interval=30)
+
+
+def create_session_store(backend: Optional[str] = None):
+    """
+    Build the session store selected by ``SESSION_BACKEND`` ("memory", "mongo" or "redis").
+    Use mongo or redis when running more than one worker; see gunicorn.conf.py.
+    """
+    backend = (backend or settings.session_backend).lower()
+    # Clients are built on first use, i.e. in each worker after the fork, never in the master.
+    if backend == "mongo":
+        # The app's Mongo client (agent/actions.py), shared with the orders collection.
+        collection = services.register(
+            "sessions_collection",
+            lambda: services["mongo"].get()[settings.db_name][settings.sessions_collection],
+        )
+        return MongoSessionStore(
+            collection,
+            history_size=settings.session_history_size,
+            ttl_seconds=settings.session_ttl_seconds,
+        )
+    if backend == "redis":
+        return RedisSessionStore(
+            services.register("redis", _create_redis_client),
+            history_size=settings.session_history_size,
+            ttl_seconds=settings.session_ttl_seconds,
+        )
+    if backend != "memory":
+        raise ValueError(f"Unknown session backend: {backend}")
+    return InMemorySessionStore(
+        history_size=settings.session_history_size,
+        ttl_seconds=settings.session_ttl_seconds,
+        max_sessions=settings.session_max_count,
+        max_bytes=settings.session_memory_cap_mb * 1024 * 1024,
+    )
+
 
-memory = ConversationMemory()
+memory = create_session_store()
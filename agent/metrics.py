@@ -0,0 +1,150 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from config import settings
+
+# Upper bounds in seconds: sub-millisecond prompt builds up to LLM calls near their timeout.
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _format(labels: Labels, extra: Labels = ()) -> str:
+    pairs = tuple((key, str(value)) for key, value in labels if value is not None) + extra
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+
+class _Stage:
+    """Context manager timing one stage; see Metrics.stage."""
+
+    __slots__ = ("metrics", "name", "labels", "key", "start", "span")
+
+    def __init__(self, metrics: "Metrics", name: str, labels: dict):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+        self.key = (name, tuple(labels.items()))
+        self.span = None
+
+    def __enter__(self):
+        tracer = self.metrics.tracer
+        if tracer is not None:
+            self.span = tracer.start_as_current_span(self.name, attributes=self.labels)
+            self.span.__enter__()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        if exc_type is None or issubclass(exc_type, Exception):
+            self.metrics._record(self.key, seconds)
+            if exc_type is not None:
+                self.metrics.count("stage_error", stage=self.name, **self.labels)
+        if self.span is not None:
+            self.span.__exit__(exc_type, exc, tb)
+        return False
+
+
+class Metrics:
+    """
+    In-process stage timings and event counters, exported in Prometheus text format.
+
+    ``stage(name, **labels)`` times a block into the ``bot_stage_seconds``
+    histogram and counts an error when the block raises; ``count`` increments
+    ``bot_events_total``. When ``tracing`` is on and OpenTelemetry is installed,
+    every stage is also an OpenTelemetry span (exporters are configured the
+    usual OTel way, e.g. with opentelemetry-instrument and OTEL_* variables).
+    """
+
+    def __init__(self, enabled: bool = True, tracing: bool = False):
+        self.enabled = enabled
+        self.tracer = None
+        if enabled and tracing:
+            try:
+                from opentelemetry import trace
+
+                self.tracer = trace.get_tracer("business-assistance")
+                print("OpenTelemetry tracing enabled.")
+            except ImportError:
+                print("Warning: opentelemetry-api is not installed. Tracing disabled.")
+        self._histogram: Dict[Tuple[str, Labels], list] = {}
+        self._events: Dict[Tuple[str, Labels], int] = {}
+        self._gauges: Dict[str, Tuple[str, Callable[[], Iterable[Tuple[dict, float]]]]] = {}
+        self._lock = threading.Lock()
+
+    def stage(self, name: str, **labels):
+        if not self.enabled:
+            return nullcontext()
+        return _Stage(self, name, labels)
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        if self.enabled:
+            # Labels keep call-site order; normalizing them here would cost more than the rest of observe.
+            self._record((name, tuple(labels.items())), seconds)
+
+    def _record(self, key: Tuple[str, Labels], seconds: float) -> None:
+        index = bisect_left(BUCKETS, seconds)
+        with self._lock:
+            series = self._histogram.get(key)
+            if series is None:
+                # Per-bucket counts (cumulated on export), then sum.
+                series = self._histogram[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += seconds
+
+    def count(self, event: str, value: int = 1, **labels) -> None:
+        if not self.enabled:
+            return
+        key = (event, tuple(labels.items()))
+        with self._lock:
+            self._events[key] = self._events.get(key, 0) + value
+
+    def gauge(self, name: str, help_text: str, read: Callable[[], Iterable[Tuple[dict, float]]]) -> None:
+        """Export ``bot_<name>``, read from ``read()`` as (labels, value) pairs at scrape time."""
+        self._gauges[name] = (help_text, read)
+
+    def snapshot(self) -> dict:
+        """Count and total seconds per stage (for benchmarks and debugging)."""
+        with self._lock:
+            return {
+                (name, labels): {"count": sum(series[:-1]), "seconds": series[-1]}
+                for (name, labels), series in self._histogram.items()
+            }
+
+    def render(self) -> str:
+        with self._lock:
+            histogram = {key: list(series) for key, series in self._histogram.items()}
+            events = dict(self._events)
+        lines = [
+            "# HELP bot_stage_seconds Time spent in each stage of a chat turn and its side effects.",
+            "# TYPE bot_stage_seconds histogram",
+        ]
+        for (name, labels), series in sorted(histogram.items(), key=str):
+            labels = (("stage", name),) + labels
+            cumulative = 0
+            for bound, count in zip(BUCKETS + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"bot_stage_seconds_bucket{_format(labels, (('le', le),))} {cumulative}")
+            lines.append(f"bot_stage_seconds_sum{_format(labels)} {series[-1]}")
+            lines.append(f"bot_stage_seconds_count{_format(labels)} {cumulative}")
+        lines += [
+            "# HELP bot_events_total Fallbacks, retries and errors, by event.",
+            "# TYPE bot_events_total counter",
+        ]
+        for (event, labels), value in sorted(events.items(), key=str):
+            lines.append(f"bot_events_total{_format((('event', event),) + labels)} {value}")
+        for name, (help_text, read) in sorted(self._gauges.items()):
+            lines += [f"# HELP bot_{name} {help_text}", f"# TYPE bot_{name} gauge"]
+            for labels, value in read():
+                lines.append(f"bot_{name}{_format(tuple(labels.items()))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics(enabled=settings.metrics_enabled, tracing=settings.otel_tracing)
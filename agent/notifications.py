@@ -0,0 +1,208 @@
+import asyncio
+import os
+import smtplib
+import uuid
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import List, Optional, Tuple
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+from .metrics import metrics
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates", "email")
+# Only what the templates show; proofs are linked, never attached.
+DIGEST_FIELDS = ("order_number", "item", "customer", "email", "phone_number", "address", "price",
+                 "payment_method", "source_website", "proof_url", "proof_compact_url", "proof_thumb_url",
+                 "owner_digest_queued_at")
+
+
+class SendGridTransport:
+    """Sends through the SendGrid API; ``client`` is a SendGridAPIClient (or the service building one)."""
+
+    def __init__(self, client, from_email: str, to_email: str):
+        self.client = client
+        self.from_email = from_email
+        self.to_email = to_email
+
+    def send(self, subject: str, html: str) -> None:
+        from sendgrid.helpers.mail import Mail
+
+        self.client.send(Mail(from_email=self.from_email, to_emails=self.to_email, subject=subject,
+                              html_content=html))
+
+
+class SmtpTransport:
+    """Sends through an SMTP server, one connection per message (digests keep messages rare)."""
+
+    def __init__(self, host: str, port: int, from_email: str, to_email: str, username: Optional[str] = None,
+                 password: Optional[str] = None, starttls: bool = True, timeout: float = 10.0):
+        self.host = host
+        self.port = port
+        self.from_email = from_email
+        self.to_email = to_email
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+
+    def send(self, subject: str, html: str) -> None:
+        message = EmailMessage()
+        message["Subject"] = subject
+        message["From"] = self.from_email
+        message["To"] = self.to_email
+        message.set_content("This message is HTML; open it in a mail client that shows HTML.")
+        message.add_alternative(html, subtype="html")
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password or "")
+            smtp.send_message(message)
+
+
+class OwnerNotifier:
+    """
+    Emails the business owner about orders, rendered from templates/email.
+
+    ``notify`` is the owner_email outbox task. With a ``digest_window`` it does
+    not email: it marks the order ``owner_digest_queued_at``, and ``flush``
+    (every ``digest_window`` seconds once started) emails all queued orders in
+    one digest of up to ``max_digest_orders``. Orders priced at
+    ``immediate_min_price`` or more, and every order when the window is 0, are
+    emailed on their own right away.
+
+    The queue is the orders collection itself, so queued orders survive a
+    restart. ``flush`` claims orders with a lease, so several workers never put
+    one order in two digests unless a worker dies mid-send. Without a
+    ``transport`` nothing is sent and orders are marked notified.
+
+    Proof URLs are stored app-relative (/static/uploads/...); the templates
+    make them absolute with ``public_base_url`` (the ``absolute`` filter), as
+    a mail client has no page to resolve them against.
+    """
+
+    def __init__(self, collection, transport=None, digest_window: float = 300.0, immediate_min_price: float = 500,
+                 max_digest_orders: int = 100, lease_seconds: float = 120.0, public_base_url: Optional[str] = None):
+        self.collection = collection
+        self.transport = transport
+        self.digest_window = digest_window
+        self.immediate_min_price = immediate_min_price
+        self.max_digest_orders = max_digest_orders
+        self.lease_seconds = lease_seconds
+        self.public_base_url = public_base_url
+        # Compiled once here, not per email.
+        environment = Environment(loader=FileSystemLoader(TEMPLATE_DIR), autoescape=select_autoescape(["html"]))
+        environment.filters["absolute"] = self.absolute_url
+        self.order_template = environment.get_template("order.html")
+        self.digest_template = environment.get_template("digest.html")
+        self.emails = 0
+        self.digested = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def absolute_url(self, url: Optional[str]) -> Optional[str]:
+        # Kept under the base's path, so an app served from a sub-path still resolves.
+        if not url or not self.public_base_url or not url.startswith("/"):
+            return url
+        return self.public_base_url.rstrip("/") + url
+
+    def render_order(self, order: dict, source: str, proof_url: Optional[str] = None) -> Tuple[str, str]:
+        if proof_url:
+            subject = f"Order CONFIRMED: {order['order_number']} from {source}"
+        else:
+            subject = f"New PENDING Order: {order['order_number']} from {source}"
+        return subject, self.order_template.render(order=order, source=source, proof_url=proof_url)
+
+    def render_digest(self, orders: List[dict]) -> Tuple[str, str]:
+        revenue = sum(order.get("price") or 0 for order in orders)
+        queued = [order["owner_digest_queued_at"] for order in orders]
+        subject = f"{len(orders)} confirmed order{'s' if len(orders) != 1 else ''} (${revenue})"
+        html = self.digest_template.render(orders=orders, revenue=revenue, first=min(queued), last=max(queued))
+        return subject, html
+
+    def send_order(self, order: dict, source: str, proof_url: Optional[str] = None) -> None:
+        """Email one order now; raises if the transport fails."""
+        if self.transport is None:
+            print("Email skipped: no email transport configured.")
+            metrics.count("email_skipped")
+            return
+        subject, html = self.render_order(order, source, proof_url)
+        with metrics.stage("email", kind="order"):
+            self.transport.send(subject, html)
+        self.emails += 1
+
+    def notify(self, order: dict) -> dict:
+        """Email a confirmed order now or queue it for the digest; returns the fields to set on the order."""
+        now = datetime.utcnow()
+        if self.transport is not None and self.digest_window > 0 and (order.get("price") or 0) < self.immediate_min_price:
+            return {"owner_digest_queued_at": now}
+        proof_url = order.get("proof_compact_url") or order.get("proof_url")
+        self.send_order(order, order.get("source_website", "Unknown"), proof_url=proof_url)
+        return {"owner_notified_at": now}
+
+    def flush(self) -> int:
+        """Email every queued order, ``max_digest_orders`` per digest; returns how many were sent."""
+        sent = 0
+        while True:
+            batch = self._claim()
+            if not batch:
+                return sent
+            claim, orders = batch
+            try:
+                subject, html = self.render_digest(orders)
+                with metrics.stage("email", kind="digest"):
+                    self.transport.send(subject, html)
+            except Exception:
+                # Let another flush (here or in another worker) pick them up.
+                self.collection.update_many({"owner_digest_claim": claim},
+                                            {"$unset": {"owner_digest_claim": "", "owner_digest_lease_until": ""}})
+                raise
+            self.collection.update_many(
+                {"owner_digest_claim": claim},
+                {"$set": {"owner_notified_at": datetime.utcnow(), "owner_digest_id": claim},
+                 "$unset": {"owner_digest_queued_at": "", "owner_digest_claim": "", "owner_digest_lease_until": ""}},
+            )
+            self.emails += 1
+            self.digested += len(orders)
+            sent += len(orders)
+            metrics.count("owner_digest_orders", len(orders))
+
+    def _claim(self) -> Optional[Tuple[str, List[dict]]]:
+        now = datetime.utcnow()
+        claimable = {"owner_digest_queued_at": {"$exists": True}, "$or": [
+            {"owner_digest_lease_until": {"$exists": False}},
+            {"owner_digest_lease_until": {"$lte": now}},
+        ]}
+        ids = [doc["_id"] for doc in self.collection.find(claimable, {"_id": 1})
+               .sort("owner_digest_queued_at", 1).limit(self.max_digest_orders)]
+        if not ids:
+            return None
+        claim = uuid.uuid4().hex
+        # Conditional on still being claimable, so each order goes to one claim only.
+        self.collection.update_many(
+            {"_id": {"$in": ids}, **claimable},
+            {"$set": {"owner_digest_claim": claim, "owner_digest_lease_until": now + timedelta(seconds=self.lease_seconds)}},
+        )
+        orders = list(self.collection.find({"owner_digest_claim": claim}, {"_id": 0, **dict.fromkeys(DIGEST_FIELDS, 1)})
+                      .sort("owner_digest_queued_at", 1))
+        return (claim, orders) if orders else None
+
+    def start(self) -> None:
+        if self.transport is not None and self.digest_window > 0:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        # Queued orders stay queued; the next process to start sends them.
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.digest_window)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                metrics.count("owner_digest_error")
+                print(f"Owner digest failed: {e}")
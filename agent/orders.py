@@ -0,0 +1,302 @@
+import base64
+import threading
+from datetime import datetime
+from typing import Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+from .metrics import metrics
+from .outbox import new_task
+
+PAID_STATUS = "payment_verified_pending_shipping"
+DUPLICATE_KEY = 11000
+# pymongo.ASCENDING / DESCENDING; pymongo itself is only imported once a write needs it.
+ASCENDING, DESCENDING = 1, -1
+
+# Set on every finalize, even when the order was already recorded as pending; the
+# rest of the document is only written when the order is new.
+FINALIZED_FIELDS = ("status", "proof_url", "outbox")
+# Newest first; order_number breaks ties between orders created in the same instant.
+LIST_ORDER = [("created_at", DESCENDING), ("order_number", DESCENDING)]
+
+
+def order_site(source_website: Optional[str]) -> str:
+    """The host of the page an order came from; stats are kept per site, not per page URL."""
+    source_website = source_website or "Unknown"
+    if "://" in source_website:
+        return urlsplit(source_website).hostname or source_website
+    return source_website
+
+
+def encode_cursor(created_at: datetime, order_number: str) -> str:
+    """Opaque keyset cursor: the sort key of the last order on a page."""
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{order_number}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Inverse of encode_cursor; raises ValueError for a cursor it did not produce."""
+    try:
+        created_at, order_number = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return datetime.fromisoformat(created_at), order_number
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"invalid cursor: {cursor!r}") from e
+
+
+class OrderRepository:
+    """
+    Every write to the orders collection goes through here.
+
+    All lookups are by ``order_number``, which has a unique index, so a write is
+    one indexed upsert instead of an insert followed by an update that scans
+    the collection.
+
+    With a ``stats_collection``, every write that records a new order or
+    finalizes one also increments a per-day, per-site document there (orders,
+    paid orders, revenue), so ``stats`` reads a few small documents instead of
+    aggregating the orders. Orders are counted on the day they were created,
+    payments on the day the proof came in (UTC). ``bulk_ingest`` does not count;
+    run ``rebuild_stats`` after an import.
+
+    Writes depend on the unique index, so none goes through until
+    ``ensure_indexes`` has succeeded; each write tries it again until then.
+    """
+
+    def __init__(self, collection, stats_collection=None):
+        self.collection = collection
+        self.stats_collection = stats_collection
+        self._indexed = False
+        self._index_lock = threading.Lock()
+
+    def ensure_indexes(self) -> None:
+        """Create the indexes once per process; raises (and the next call retries) if Mongo refuses."""
+        if self._indexed:
+            return
+        with self._index_lock:
+            if not self._indexed:
+                self._create_indexes()
+                self._indexed = True
+
+    def _create_indexes(self) -> None:
+        self.collection.create_index([("order_number", ASCENDING)], unique=True, name="order_number_unique")
+        self.collection.create_index([("status", ASCENDING), ("created_at", DESCENDING)], name="status_created_at")
+        self.collection.create_index([("source_website", ASCENDING)], name="source_website")
+        self.collection.create_index([("outbox.status", ASCENDING), ("outbox.next_attempt_at", ASCENDING)],
+                                     name="outbox_due")
+        # Keyset pagination for list_orders, unfiltered and by each filter.
+        self.collection.create_index(LIST_ORDER, name="created_at_order_number")
+        self.collection.create_index([("status", ASCENDING)] + LIST_ORDER, name="status_created_at_order_number")
+        self.collection.create_index([("source_website", ASCENDING)] + LIST_ORDER,
+                                     name="source_website_created_at_order_number")
+        # Orders waiting for the owner's digest (agent/notifications.py); the field is removed once sent.
+        self.collection.create_index([("owner_digest_queued_at", ASCENDING)], name="owner_digest_queued", sparse=True)
+        if self.stats_collection is not None:
+            self.stats_collection.create_index([("day", ASCENDING)], name="day")
+
+    def add_order(self, order: dict, tasks: Sequence[str] = ()) -> bool:
+        """
+        Record an order, queueing its outbox ``tasks`` in the same write.
+
+        Without tasks this only inserts a new (pending) order. With tasks the order
+        is finalized: a new order is inserted as given, and an order already
+        recorded as pending gets its status, proof and tasks. Returns False if the
+        order was already finalized, so resubmitting never queues tasks twice.
+        """
+        from pymongo.errors import DuplicateKeyError
+
+        # Without the unique index two finalizing upserts could both insert the order.
+        self.ensure_indexes()
+        if not tasks:
+            with metrics.stage("db_write", op="insert_order"):
+                result = self.collection.update_one(
+                    {"order_number": order["order_number"]}, {"$setOnInsert": order}, upsert=True
+                )
+            if result.upserted_id is None:
+                return False
+            self._count(order["created_at"], order.get("source_website"), orders=1)
+            return True
+
+        finalized = {field: order.get(field) for field in FINALIZED_FIELDS}
+        finalized["outbox"] = [new_task(task) for task in tasks]
+        finalized["updated_at"] = datetime.utcnow()
+        rest = {k: v for k, v in order.items() if k not in finalized}
+        with metrics.stage("db_write", op="finalize_order"):
+            try:
+                # The order as it was before (None when this inserted it), for the stats.
+                previous = self.collection.find_one_and_update(
+                    {"order_number": order["order_number"], "outbox": {"$exists": False}},
+                    {"$set": finalized, "$setOnInsert": rest},
+                    projection={"_id": 0, "price": 1, "source_website": 1},
+                    upsert=True,
+                )
+            except DuplicateKeyError:
+                # The filter missed because the order already has an outbox; the upsert's
+                # insert then hit the unique index.
+                return False
+        if previous is None:
+            previous = order
+            self._count(order["created_at"], order.get("source_website"), orders=1)
+        self._count(finalized["updated_at"], previous.get("source_website"),
+                    paid_orders=1, revenue=previous.get("price") or 0)
+        return True
+
+    def _count(self, when: datetime, source_website: Optional[str], **increments) -> None:
+        if self.stats_collection is None:
+            return
+        day, site = when.strftime("%Y-%m-%d"), order_site(source_website)
+        try:
+            with metrics.stage("db_write", op="order_stats"):
+                self.stats_collection.update_one(
+                    {"_id": f"{day}|{site}"},
+                    {"$inc": increments, "$setOnInsert": {"day": day, "source": site}},
+                    upsert=True,
+                )
+        except Exception as e:
+            # The order itself is stored; rebuild_stats repairs the counts.
+            metrics.count("order_stats_error")
+            print(f"Warning: could not update order stats: {e}")
+
+    def bulk_ingest(self, orders: Iterable[dict], batch_size: int = 1000) -> dict:
+        """
+        Import or backfill orders with unordered ``bulk_write`` batches.
+
+        Plain inserts are the cheapest write; an order number that already exists
+        fails on the unique index and is skipped while the rest of the batch goes
+        through, so an import can be re-run. Returns the number of orders
+        inserted and skipped.
+        """
+        from pymongo import InsertOne
+        from pymongo.errors import BulkWriteError
+
+        self.ensure_indexes()
+        inserted = skipped = 0
+        batch: List[InsertOne] = []
+
+        def flush():
+            nonlocal inserted, skipped
+            try:
+                inserted += self.collection.bulk_write(batch, ordered=False).inserted_count
+            except BulkWriteError as e:
+                errors = e.details["writeErrors"]
+                if any(error["code"] != DUPLICATE_KEY for error in errors):
+                    raise
+                inserted += e.details["nInserted"]
+                skipped += len(errors)
+            batch.clear()
+
+        for order in orders:
+            batch.append(InsertOne(dict(order)))
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+        return {"inserted": inserted, "skipped": skipped}
+
+    def get(self, order_number: str):
+        return self.collection.find_one({"order_number": order_number}, {"_id": 0})
+
+    def list_orders(
+        self,
+        limit: int = 50,
+        after: Optional[Tuple[datetime, str]] = None,
+        status: Optional[str] = None,
+        source_website: Optional[str] = None,
+    ) -> Tuple[List[dict], Optional[Tuple[datetime, str]]]:
+        """
+        One page of orders, newest first, and the key to pass as ``after`` for the
+        next page (None on the last one).
+
+        Keyset pagination: the page starts right after the (created_at,
+        order_number) of the previous page's last order, so every page is one
+        index range scan however deep it is, and orders arriving meanwhile do not
+        shift the pages.
+        """
+        query = {}
+        if status:
+            query["status"] = status
+        if source_website:
+            query["source_website"] = source_website
+        if after is not None:
+            created_at, order_number = after
+            query["$or"] = [
+                {"created_at": {"$lt": created_at}},
+                {"created_at": created_at, "order_number": {"$lt": order_number}},
+            ]
+        with metrics.stage("db_read", op="list_orders"):
+            orders = list(self.collection.find(query, {"_id": 0, "outbox": 0}).sort(LIST_ORDER).limit(limit + 1))
+        if len(orders) <= limit:
+            return orders, None
+        last = orders[limit - 1]
+        return orders[:limit], (last["created_at"], last["order_number"])
+
+    def stats(self, since: str, until: str, source: Optional[str] = None) -> dict:
+        """Orders, paid orders and revenue per day and per site between two YYYY-MM-DD days (inclusive)."""
+        query = {"day": {"$gte": since, "$lte": until}}
+        if source:
+            query["source"] = source
+        with metrics.stage("db_read", op="order_stats"):
+            docs = list(self.stats_collection.find(query, {"_id": 0}))
+        fields = ("orders", "paid_orders", "revenue")
+        totals = dict.fromkeys(fields, 0)
+        by_day, by_source = {}, {}
+        for doc in docs:
+            for key, groups in ((doc["day"], by_day), (doc["source"], by_source)):
+                group = groups.setdefault(key, dict.fromkeys(fields, 0))
+                for field in fields:
+                    group[field] += doc.get(field, 0)
+            for field in fields:
+                totals[field] += doc.get(field, 0)
+        return {
+            "since": since,
+            "until": until,
+            "totals": totals,
+            "by_day": [{"day": day, **by_day[day]} for day in sorted(by_day)],
+            "by_source": [
+                {"source": site, **values}
+                for site, values in sorted(by_source.items(), key=lambda item: item[1]["revenue"], reverse=True)
+            ],
+        }
+
+    def rebuild_stats(self) -> int:
+        """
+        Recompute the stats documents from the orders (after ``bulk_ingest``, or
+        to repair counts after a failed stats write). This is the full
+        aggregation the incremental counts avoid, so it is for maintenance only.
+        Returns the number of stats documents written.
+        """
+        counts = {}
+
+        def add(day, source_website, **increments):
+            site = order_site(source_website)
+            doc = counts.setdefault(f"{day}|{site}", {"day": day, "source": site,
+                                                      "orders": 0, "paid_orders": 0, "revenue": 0})
+            for field, value in increments.items():
+                doc[field] += value
+
+        created = [
+            {"$match": {"created_at": {"$type": "date"}}},
+            {"$group": {
+                "_id": {"day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
+                        "source": "$source_website"},
+                "orders": {"$sum": 1},
+            }},
+        ]
+        paid = [
+            {"$match": {"status": PAID_STATUS}},
+            {"$group": {
+                "_id": {"day": {"$dateToString": {"format": "%Y-%m-%d",
+                                                  "date": {"$ifNull": ["$updated_at", "$created_at"]}}},
+                        "source": "$source_website"},
+                "paid_orders": {"$sum": 1},
+                "revenue": {"$sum": "$price"},
+            }},
+        ]
+        with metrics.stage("db_read", op="rebuild_order_stats"):
+            for group in self.collection.aggregate(created):
+                add(group["_id"]["day"], group["_id"]["source"], orders=group["orders"])
+            for group in self.collection.aggregate(paid):
+                add(group["_id"]["day"], group["_id"]["source"],
+                    paid_orders=group["paid_orders"], revenue=group["revenue"])
+        with metrics.stage("db_write", op="rebuild_order_stats"):
+            self.stats_collection.delete_many({})
+            if counts:
+                self.stats_collection.insert_many([{"_id": key, **doc} for key, doc in counts.items()])
+        return len(counts)
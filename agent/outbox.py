@@ -0,0 +1,275 @@
+import asyncio
+import copy
+import functools
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .metrics import metrics
+
+
+def new_task(task: str) -> dict:
+    """An outbox entry, stored inside the order document it belongs to."""
+    return {"task": task, "status": "pending", "attempts": 0, "next_attempt_at": datetime.utcnow(),
+            "lease_until": None, "last_error": None}
+
+
+class Deferred(Exception):
+    """
+    Raised by a handler whose task cannot run yet, e.g. because it waits on
+    another task of the same order. Retried after ``delay`` seconds without
+    using up an attempt.
+    """
+
+    def __init__(self, reason: str, delay: float = 2.0):
+        super().__init__(reason)
+        self.delay = delay
+
+
+def task_status(order: dict, task: str) -> Optional[str]:
+    """Status of one of the order's outbox tasks, or None if it has no such task."""
+    return next((entry["status"] for entry in order.get("outbox", []) if entry["task"] == task), None)
+
+
+def _due(entry: dict, now: datetime) -> bool:
+    if entry["status"] == "pending":
+        return entry["next_attempt_at"] <= now
+    # An in-progress task whose lease ran out belongs to a worker that died mid-delivery.
+    return entry["status"] == "in_progress" and entry["lease_until"] <= now
+
+
+class MongoOutboxStore:
+    """
+    Outbox kept inside the order documents.
+
+    The order and its pending side-effect tasks are one document, so writing the
+    order and queueing its tasks is a single atomic write
+    (``OrderRepository.add_order``); no transaction or replica set is needed.
+    Tasks are claimed with ``find_one_and_update`` and a lease, so several
+    workers (or processes) never deliver the same task twice unless one of them
+    dies mid-delivery.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def claim_due(self, lease_seconds: float) -> Optional[Tuple[dict, dict]]:
+        now = datetime.utcnow()
+        due = {"$or": [
+            {"status": "pending", "next_attempt_at": {"$lte": now}},
+            {"status": "in_progress", "lease_until": {"$lte": now}},
+        ]}
+        for doc in self.collection.find({"outbox": {"$elemMatch": due}}).limit(16):
+            for i, entry in enumerate(doc["outbox"]):
+                if not _due(entry, now):
+                    continue
+                # The outbox array is fixed when the order is written, so an index addresses
+                # one task; the update is conditional on it still being due, so one worker wins.
+                path = f"outbox.{i}"
+                claimed = self.collection.find_one_and_update(
+                    {"_id": doc["_id"], f"{path}.task": entry["task"], "$or": [
+                        {f"{path}.status": "pending", f"{path}.next_attempt_at": {"$lte": now}},
+                        {f"{path}.status": "in_progress", f"{path}.lease_until": {"$lte": now}},
+                    ]},
+                    {
+                        "$set": {f"{path}.status": "in_progress",
+                                 f"{path}.lease_until": now + timedelta(seconds=lease_seconds)},
+                        "$inc": {f"{path}.attempts": 1},
+                    },
+                    return_document=True,  # ReturnDocument.AFTER
+                )
+                if claimed is not None:
+                    return claimed, claimed["outbox"][i]
+        return None
+
+    def complete(self, order_number: str, task: str, updates: Optional[dict] = None) -> None:
+        fields = dict(updates or {})
+        fields.update({"outbox.$.status": "done", "outbox.$.lease_until": None, "outbox.$.last_error": None})
+        self.collection.update_one({"order_number": order_number, "outbox.task": task}, {"$set": fields})
+
+    def retry(self, order_number: str, task: str, next_attempt_at: datetime, error: Optional[str],
+              refund_attempt: bool = False) -> None:
+        update = {"$set": {"outbox.$.status": "pending", "outbox.$.next_attempt_at": next_attempt_at,
+                           "outbox.$.lease_until": None, "outbox.$.last_error": error}}
+        if refund_attempt:
+            update["$inc"] = {"outbox.$.attempts": -1}
+        self.collection.update_one({"order_number": order_number, "outbox.task": task}, update)
+
+    def fail(self, order_number: str, task: str, error: str) -> None:
+        self.collection.update_one(
+            {"order_number": order_number, "outbox.task": task},
+            {"$set": {"outbox.$.status": "failed", "outbox.$.lease_until": None, "outbox.$.last_error": error}},
+        )
+
+
+class InMemoryOutboxStore:
+    """Process-local stand-in for MongoOutboxStore, for tests and benchmarks."""
+
+    def __init__(self):
+        self.orders: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def add_order(self, order: dict, tasks: List[str]) -> bool:
+        with self._lock:
+            if order["order_number"] in self.orders:
+                return False
+            self.orders[order["order_number"]] = dict(copy.deepcopy(order), outbox=[new_task(t) for t in tasks])
+            return True
+
+    def claim_due(self, lease_seconds: float) -> Optional[Tuple[dict, dict]]:
+        now = datetime.utcnow()
+        with self._lock:
+            for doc in self.orders.values():
+                for entry in doc["outbox"]:
+                    if _due(entry, now):
+                        entry.update(status="in_progress", lease_until=now + timedelta(seconds=lease_seconds),
+                                     attempts=entry["attempts"] + 1)
+                        return copy.deepcopy(doc), dict(entry)
+        return None
+
+    def _entry(self, order_number: str, task: str) -> dict:
+        return next(e for e in self.orders[order_number]["outbox"] if e["task"] == task)
+
+    def complete(self, order_number: str, task: str, updates: Optional[dict] = None) -> None:
+        with self._lock:
+            self.orders[order_number].update(updates or {})
+            self._entry(order_number, task).update(status="done", lease_until=None, last_error=None)
+
+    def retry(self, order_number: str, task: str, next_attempt_at: datetime, error: Optional[str],
+              refund_attempt: bool = False) -> None:
+        with self._lock:
+            entry = self._entry(order_number, task)
+            entry.update(status="pending", next_attempt_at=next_attempt_at, lease_until=None, last_error=error,
+                         attempts=entry["attempts"] - refund_attempt)
+
+    def fail(self, order_number: str, task: str, error: str) -> None:
+        with self._lock:
+            self._entry(order_number, task).update(status="failed", lease_until=None, last_error=error)
+
+
+class OutboxWorker:
+    """
+    Background pool that delivers outbox tasks.
+
+    ``handlers`` maps a task name to a blocking function taking the order
+    document and returning fields to set on the order (or None). Handlers and
+    store calls run on the worker's own ``concurrency`` threads, so a slow or
+    unreachable Mongo never ties up the default executor the request path
+    uses; after a polling error the worker backs off up to
+    ``max_poll_interval``. A handler that raises is retried with exponential backoff and
+    jitter until ``max_attempts``, then marked failed; one that raises Deferred
+    is simply tried again later. Handlers must be idempotent, since a task
+    whose worker died is delivered again after its lease.
+    """
+
+    def __init__(self, store, handlers: Dict[str, Callable[[dict], Optional[dict]]], concurrency: int = 4,
+                 max_attempts: int = 6, base_delay: float = 2.0, max_delay: float = 300.0,
+                 poll_interval: float = 1.0, lease_seconds: float = 120.0, max_poll_interval: float = 30.0):
+        self.store = store
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_poll_interval = max_poll_interval
+        self.delivered = 0
+        self.retried = 0
+        self.failed = 0
+        self._tasks: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._tasks = [self._loop.create_task(self._run()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._executor is not None:
+            # Calls stuck on a dead server are abandoned rather than waited for.
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def notify(self) -> None:
+        """Wake idle workers after new tasks were queued. Safe to call from any thread."""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def run_until_idle(self) -> None:
+        """Deliver every task that is due now, then return (for tests and batch jobs)."""
+        while await self.process_one():
+            pass
+
+    async def _call(self, fn, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="outbox")
+        return await asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(fn, *args))
+
+    async def process_one(self) -> bool:
+        claimed = await self._call(self.store.claim_due, self.lease_seconds)
+        if claimed is None:
+            return False
+        order, entry = claimed
+        order_number, task = order["order_number"], entry["task"]
+        start = time.perf_counter()
+        try:
+            handler = self.handlers[task]
+            updates = await self._call(handler, order)
+        except Deferred as e:
+            metrics.count("outbox_deferred", task=task)
+            next_attempt_at = datetime.utcnow() + timedelta(seconds=e.delay)
+            await self._call(self.store.retry, order_number, task, next_attempt_at, None, True)
+            return True
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if entry["attempts"] >= self.max_attempts:
+                self.failed += 1
+                metrics.count("outbox_failed", task=task)
+                print(f"Outbox task {task} for order {order_number} failed permanently: {error}")
+                await self._call(self.store.fail, order_number, task, error)
+            else:
+                self.retried += 1
+                metrics.count("outbox_retry", task=task)
+                delay = min(self.max_delay, self.base_delay * 2 ** (entry["attempts"] - 1)) * random.uniform(0.5, 1.0)
+                print(f"Outbox task {task} for order {order_number} failed ({error}); retrying in {delay:.1f}s")
+                next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+                await self._call(self.store.retry, order_number, task, next_attempt_at, error)
+            return True
+        metrics.observe("outbox_task", time.perf_counter() - start, task=task)
+        await self._call(self.store.complete, order_number, task, updates)
+        self.delivered += 1
+        return True
+
+    async def _run(self) -> None:
+        errors = 0
+        while True:
+            try:
+                worked = await self.process_one()
+                errors = 0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                errors += 1
+                metrics.count("outbox_poll_error")
+                print(f"Outbox worker error: {e}")
+                worked = False
+            if not worked:
+                # Back off while the store keeps failing; a new order (notify) still wakes the worker.
+                wait = min(self.max_poll_interval, self.poll_interval * 2 ** errors)
+                if errors:
+                    wait *= random.uniform(0.5, 1.0)
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
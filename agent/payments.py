@@ -0,0 +1,321 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+
+from config import settings
+from .metrics import metrics
+
+SUCCESS_URL = "https://yourbusiness.com/success"
+CANCEL_URL = "https://yourbusiness.com/cancel"
+
+
+class PaymentGateway(ABC):
+    """
+    One payment provider behind a shared, pooled HTTP client.
+
+    The client is created on first use and reused for every order after
+    that, so checkout calls skip the TCP/TLS handshake, and every call has a
+    hard timeout instead of hanging the outbox worker. ``create_link`` raises
+    on any failure.
+    """
+
+    name = ""
+    label = ""
+    base_url = ""
+
+    def __init__(self, base_url: Optional[str] = None, timeout: float = 10.0, max_connections: int = 20):
+        if base_url:
+            self.base_url = base_url
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._http = None
+        self._http_lock = threading.Lock()
+
+    @property
+    def http(self):
+        if self._http is None:
+            with self._http_lock:
+                if self._http is None:
+                    import httpx
+
+                    self._http = httpx.Client(
+                        base_url=self.base_url,
+                        timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 3.0)),
+                        limits=httpx.Limits(max_connections=self.max_connections,
+                                            max_keepalive_connections=self.max_connections),
+                    )
+        return self._http
+
+    @property
+    def configured(self) -> bool:
+        return True
+
+    @abstractmethod
+    def create_link(self, order_number: str, amount_minor: int, email: Optional[str], idempotency_key: str) -> str:
+        """Create a checkout for the order and return its URL."""
+
+    def close(self) -> None:
+        if self._http is not None:
+            self._http.close()
+
+
+class StripeGateway(PaymentGateway):
+    name = "stripe"
+    label = "Stripe"
+    base_url = "https://api.stripe.com"
+
+    def __init__(self, secret_key: Optional[str], **kwargs):
+        super().__init__(**kwargs)
+        self.secret_key = secret_key
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.secret_key)
+
+    def create_link(self, order_number, amount_minor, email, idempotency_key):
+        response = self.http.post(
+            "/v1/checkout/sessions",
+            headers={"Authorization": f"Bearer {self.secret_key}", "Idempotency-Key": idempotency_key},
+            data={
+                "payment_method_types[0]": "card",
+                "line_items[0][price_data][currency]": "usd",
+                "line_items[0][price_data][product_data][name]": f"Order {order_number}",
+                "line_items[0][price_data][unit_amount]": amount_minor,
+                "line_items[0][quantity]": 1,
+                "mode": "payment",
+                "success_url": SUCCESS_URL,
+                "cancel_url": CANCEL_URL,
+                "metadata[order_number]": order_number,
+            },
+        )
+        response.raise_for_status()
+        return response.json()["url"]
+
+
+class PaystackGateway(PaymentGateway):
+    """
+    Paystack transactions, one per reference.
+
+    Paystack has no idempotency header: the reference is the order number and
+    a second initialize with it fails as a duplicate. When this process made
+    that transaction its checkout (``access_code``) is reused; otherwise an
+    attempt whose response we never saw made it, nobody holds its checkout, and
+    a new transaction is started under ``<order number>-<n>``. Every
+    transaction carries the order number in its metadata.
+    """
+
+    name = "paystack"
+    label = "Paystack"
+    base_url = "https://api.paystack.co"
+    checkout_url = "https://checkout.paystack.com/"
+    max_references = 5
+
+    def __init__(self, secret_key: Optional[str], max_access_codes: int = 4096, **kwargs):
+        super().__init__(**kwargs)
+        self.secret_key = secret_key
+        self.max_access_codes = max_access_codes
+        # reference -> (amount in minor units, access_code) of transactions initialized here.
+        self._access_codes: "OrderedDict[str, Tuple[int, str]]" = OrderedDict()
+        self._access_codes_lock = threading.Lock()
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.secret_key)
+
+    def create_link(self, order_number, amount_minor, email, idempotency_key):
+        for attempt in range(self.max_references):
+            reference = order_number if attempt == 0 else f"{order_number}-{attempt}"
+            response = self.http.post(
+                "/transaction/initialize",
+                headers={"Authorization": f"Bearer {self.secret_key}"},
+                json={
+                    "amount": amount_minor,
+                    "email": email or "customer@example.com",
+                    "reference": reference,
+                    "callback_url": "https://yourbusiness.com/verify",
+                    "metadata": {"order_number": order_number},
+                },
+            )
+            if response.status_code == 400 and "duplicate" in self._message(response).lower():
+                with self._access_codes_lock:
+                    known = self._access_codes.get(reference)
+                if known is not None and known[0] == amount_minor:
+                    return self.checkout_url + known[1]
+                continue
+            response.raise_for_status()
+            data = response.json()["data"]
+            with self._access_codes_lock:
+                self._access_codes[reference] = (amount_minor, data["access_code"])
+                while len(self._access_codes) > self.max_access_codes:
+                    self._access_codes.popitem(last=False)
+            return data["authorization_url"]
+        raise RuntimeError(f"Paystack references {order_number} to {order_number}-{self.max_references - 1} are taken")
+
+    @staticmethod
+    def _message(response) -> str:
+        try:
+            return str(response.json().get("message", ""))
+        except ValueError:
+            return ""
+
+
+class PayPalGateway(PaymentGateway):
+    name = "paypal"
+    label = "PayPal"
+    base_url = "https://api-m.sandbox.paypal.com"  # https://api-m.paypal.com when production is ready
+
+    def __init__(self, client_id: Optional[str], secret: Optional[str], **kwargs):
+        super().__init__(**kwargs)
+        self.client_id = client_id
+        self.secret = secret
+        self._token: Optional[str] = None
+        self._token_expires_at = 0.0
+        self._token_lock = threading.Lock()
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.client_id and self.secret)
+
+    def access_token(self) -> str:
+        """OAuth token shared by all calls until shortly before it expires."""
+        with self._token_lock:
+            if self._token is None or time.monotonic() >= self._token_expires_at:
+                response = self.http.post(
+                    "/v1/oauth2/token", auth=(self.client_id, self.secret),
+                    data={"grant_type": "client_credentials"},
+                )
+                response.raise_for_status()
+                body = response.json()
+                self._token = body["access_token"]
+                self._token_expires_at = time.monotonic() + body.get("expires_in", 3600) - 60
+            return self._token
+
+    def create_link(self, order_number, amount_minor, email, idempotency_key):
+        amount = f"{amount_minor / 100:.2f}"
+        response = self.http.post(
+            "/v1/payments/payment",
+            headers={"Authorization": f"Bearer {self.access_token()}", "PayPal-Request-Id": idempotency_key},
+            json={
+                "intent": "sale",
+                "payer": {"payment_method": "paypal"},
+                "redirect_urls": {"return_url": "https://yourbusiness.com/paypal-success", "cancel_url": CANCEL_URL},
+                "transactions": [{
+                    "item_list": {"items": [{"name": order_number, "price": amount, "currency": "USD", "quantity": 1}]},
+                    "amount": {"total": amount, "currency": "USD"},
+                    "description": f"Order {order_number}",
+                }],
+            },
+        )
+        response.raise_for_status()
+        return next(link["href"] for link in response.json()["links"] if link["rel"] == "approval_url")
+
+
+class PaymentLinks:
+    """
+    Idempotent payment-link creation across gateways.
+
+    Links are cached by (provider, order number, amount in minor units) with an
+    LRU + TTL, so a retried upload or a page refresh returns the checkout it
+    already created. Concurrent requests for the same key share one provider
+    call, and the key is also sent as the provider's idempotency key so
+    duplicates across processes collapse too. ``get_links`` creates several
+    providers' links in parallel.
+    """
+
+    def __init__(self, gateways: Dict[str, PaymentGateway], cache_size: int = 4096,
+                 ttl_seconds: float = 23 * 3600, max_workers: int = 8):
+        self.gateways = gateways
+        self.cache_size = cache_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.created = 0
+        self.failed = 0
+        self._links: "OrderedDict[Tuple[str, str, int], Tuple[str, float]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str, int], Future] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="payment-link")
+
+    def configured(self, method: str) -> bool:
+        gateway = self.gateways.get(method)
+        return gateway is not None and gateway.configured
+
+    def get_link(self, method: str, order_number: str, amount: float, email: Optional[str] = None) -> Optional[str]:
+        """Checkout URL for an order, or None when the provider is unconfigured or the call failed."""
+        if not self.configured(method):
+            print(f"{method.title()} not configured.")
+            return None
+
+        gateway = self.gateways[method]
+        key = (method, order_number, round(amount * 100))
+        with self._lock:
+            cached = self._links.get(key)
+            if cached is not None and cached[1] > time.monotonic():
+                self._links.move_to_end(key)
+                self.hits += 1
+                metrics.count("payment_link_cached", provider=gateway.label)
+                return cached[0]
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            return future.result()
+
+        link = None
+        try:
+            with metrics.stage("payment_link", provider=gateway.label):
+                link = gateway.create_link(order_number, key[2], email, idempotency_key=f"{order_number}:{key[2]}")
+        except Exception as e:
+            print(f"{gateway.label} link creation failed: {e}")
+        finally:
+            with self._lock:
+                if link:
+                    self.created += 1
+                    self._links[key] = (link, time.monotonic() + self.ttl_seconds)
+                    self._links.move_to_end(key)
+                    while len(self._links) > self.cache_size:
+                        self._links.popitem(last=False)
+                else:
+                    self.failed += 1
+                del self._inflight[key]
+            future.set_result(link)
+        return link
+
+    def get_links(self, methods: Iterable[str], order_number: str, amount: float,
+                  email: Optional[str] = None) -> Dict[str, Optional[str]]:
+        """Links for several providers at once, created concurrently."""
+        futures = {m: self._executor.submit(self.get_link, m, order_number, amount, email) for m in methods}
+        return {method: future.result() for method, future in futures.items()}
+
+    def stats(self) -> dict:
+        return {"links": len(self._links), "hits": self.hits, "created": self.created, "failed": self.failed}
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+        for gateway in self.gateways.values():
+            gateway.close()
+
+
+def create_gateways(timeout: float = None) -> Dict[str, PaymentGateway]:
+    timeout = timeout if timeout is not None else settings.payment_timeout_seconds
+    gateways = {
+        "stripe": StripeGateway(settings.stripe_secret_key, timeout=timeout),
+        "paystack": PaystackGateway(settings.paystack_secret_key, timeout=timeout),
+        "paypal": PayPalGateway(settings.paypal_client_id, settings.paypal_secret, timeout=timeout),
+    }
+    for gateway in gateways.values():
+        if gateway.configured:
+            print(f"{gateway.label} functionality enabled.")
+        else:
+            print(f"Warning: {gateway.label} credentials missing. {gateway.label} functionality disabled.")
+    return gateways
+
+
+payment_links = PaymentLinks(
+    create_gateways(),
+    cache_size=settings.payment_link_cache_size,
+    ttl_seconds=settings.payment_link_ttl_seconds,
+)
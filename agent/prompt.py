@@ -0,0 +1,86 @@
+from functools import lru_cache
+from typing import List, Optional
+
+from .entities import EntityExtractor
+
+# Chat formats wrap every message in a few tokens of role/separator markup.
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_encoding = None
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    """Token count with tiktoken when it is installed, else the usual ~4 characters per token."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except ImportError:
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+def message_tokens(message: dict) -> int:
+    return count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+def summarize_turns(turns: List[dict]) -> Optional[str]:
+    """One-line note of the order details found in turns that no longer fit the prompt."""
+    entities = EntityExtractor()
+    for turn in turns:
+        entities.feed(turn["user"], turn["assistant"])
+    item, price, _, address, email, payment_method, phone_number = entities.slots()
+    details = [f"{label}: {value}" for label, value in (
+        ("item", item), ("price", price), ("delivery address", address), ("email", email),
+        ("payment method", payment_method), ("phone", phone_number),
+    ) if value is not None]
+    if not details:
+        return None
+    return "Earlier in this conversation the customer gave these order details: " + "; ".join(details) + "."
+
+
+class PromptBuilder:
+    """
+    Assembles the messages for one turn within a token budget.
+
+    The system message is built once and shared by every prompt. History is
+    added newest first while it fits in ``history_token_budget``; older turns
+    are dropped, and the order details they contained are kept as a short
+    system note so the model does not ask for them again.
+    """
+
+    def __init__(self, system_prompt: str, history_token_budget: int = 1500):
+        self.system_message = {"role": "system", "content": system_prompt}
+        self.system_tokens = message_tokens(self.system_message)
+        self.history_token_budget = history_token_budget
+
+    def build(self, user_input_data: dict, history: List[dict]) -> List[dict]:
+        kept: List[dict] = []
+        budget = self.history_token_budget
+        cut = 0
+        for index in range(len(history) - 1, -1, -1):
+            turn = history[index]
+            pair = [{"role": "user", "content": turn["user"]}, {"role": "assistant", "content": turn["assistant"]}]
+            cost = message_tokens(pair[0]) + message_tokens(pair[1])
+            if cost > budget:
+                cut = index + 1
+                break
+            budget -= cost
+            kept[:0] = pair
+
+        messages = [self.system_message]
+        if cut:
+            summary = summarize_turns(history[:cut])
+            if summary is not None:
+                messages.append({"role": "system", "content": summary})
+        messages.extend(kept)
+        messages.append(user_input_data)
+        return messages
+
+    def prompt_tokens(self, messages: List[dict]) -> int:
+        return sum(self.system_tokens if m is self.system_message else message_tokens(m) for m in messages)
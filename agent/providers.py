@@ -0,0 +1,337 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, List, Optional, Tuple
+
+from .metrics import metrics
+
+# Metrics stage per call kind; a stream's latency is the time to its first delta.
+STAGES = {"complete": "llm_call", "stream": "llm_first_delta"}
+
+
+class ProviderUnavailable(Exception):
+    """Every LLM provider failed, timed out or had its circuit open."""
+
+
+def _retrieve(task: asyncio.Future) -> None:
+    """Done callback marking a task's exception as seen, so an abandoned task does not log it."""
+    if not task.cancelled():
+        task.exception()
+
+
+class LatencyWindow:
+    """Latency and outcome of a provider's last ``size`` calls."""
+
+    def __init__(self, size: int = 200):
+        self._calls = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self._calls.append((seconds, ok))
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Latency percentile of the successful calls, or None before the first success."""
+        with self._lock:
+            latencies = sorted(seconds for seconds, ok in self._calls if ok)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+    def error_rate(self) -> float:
+        with self._lock:
+            if not self._calls:
+                return 0.0
+            return sum(1 for _, ok in self._calls if not ok) / len(self._calls)
+
+    def summary(self) -> dict:
+        p50, p95 = self.percentile(0.5), self.percentile(0.95)
+        return {
+            "calls": len(self),
+            "error_rate": self.error_rate(),
+            "p50_ms": p50 * 1000 if p50 is not None else None,
+            "p95_ms": p95 * 1000 if p95 is not None else None,
+        }
+
+
+class CircuitBreaker:
+    """
+    Stops calls to a provider after ``failure_threshold`` consecutive failures.
+
+    While open, ``allow`` refuses calls for ``cooldown`` seconds; after that a
+    single trial call goes through (half-open). Its success closes the circuit,
+    its failure opens it for another cooldown.
+    """
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half_open" if self._cooled_down() else "open"
+
+    def _cooled_down(self) -> bool:
+        return self.clock() - self._opened_at >= self.cooldown
+
+    def available(self) -> bool:
+        """Whether a call could go through now; unlike ``allow`` this does not take the trial slot."""
+        with self._lock:
+            return self._opened_at is None or (self._cooled_down() and not self._trial)
+
+    def allow(self) -> Tuple[bool, bool]:
+        """Whether a call may go through, and whether it took the half-open trial slot."""
+        with self._lock:
+            if self._opened_at is None:
+                return True, False
+            if self._cooled_down() and not self._trial:
+                self._trial = True
+                return True, True
+            return False, False
+
+    def release(self) -> None:
+        """Give back the trial slot of a call that was cancelled before it finished; only its holder may."""
+        with self._lock:
+            self._trial = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.failure_threshold:
+                self._opened_at = self.clock()
+            self._trial = False
+
+
+class Provider:
+    """
+    One LLM backend as the router sees it.
+
+    ``complete(messages)`` is a coroutine returning the reply and ``stream(messages)``
+    an async iterator of reply deltas. ``timeout`` bounds one attempt; for
+    streams it bounds the wait for each delta, the first one included.
+    """
+
+    def __init__(self, name: str, complete, stream=None, timeout: Optional[float] = 20.0,
+                 breaker: Optional[CircuitBreaker] = None, window: int = 200):
+        self.name = name
+        self.complete = complete
+        self.stream = stream
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.stats = {"complete": LatencyWindow(window), "stream": LatencyWindow(window)}
+
+    def record(self, kind: str, seconds: float, ok: bool) -> None:
+        self.stats[kind].record(seconds, ok)
+        if ok:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+
+
+class ProviderRouter:
+    """
+    Sends each LLM call to the best healthy provider and falls back to the others.
+
+    Providers are tried in configured order until each has ``min_samples``
+    calls on record; after that the one with the lowest expected latency goes
+    first (median latency, plus the timeout weighted by its error rate) once it
+    beats the configured first choice by more than ``switch_margin``. Every
+    ``probe_every``-th call puts the runner-up first so its stats stay current.
+
+    A provider whose circuit is open is skipped. With ``hedge`` on, the next
+    provider is started as well when the first has not answered within its own
+    p95 latency or the next one's median, whichever is sooner, kept between
+    ``hedge_min_delay`` and ``hedge_max_delay`` (the budget while there are too
+    few samples); the first answer wins and the other call is cancelled.
+    """
+
+    def __init__(self, providers: List[Provider], hedge: bool = False, hedge_min_delay: float = 0.25,
+                 hedge_max_delay: float = 2.0, min_samples: int = 5, probe_every: int = 20, switch_margin: float = 0.25):
+        self.providers = providers
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_max_delay = hedge_max_delay
+        self.min_samples = min_samples
+        self.probe_every = probe_every
+        self.switch_margin = switch_margin
+        self.calls = 0
+        self.fallbacks = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+
+    def _expected_seconds(self, provider: Provider, kind: str) -> Optional[float]:
+        stats = provider.stats[kind]
+        median = stats.percentile(0.5)
+        if len(stats) < self.min_samples or median is None:
+            return None
+        return median + stats.error_rate() * (provider.timeout or median)
+
+    def ranked(self, kind: str) -> List[Provider]:
+        """Providers to try for one call, best first; those with an open circuit are left out."""
+        available = [p for p in self.providers if p.breaker.available()]
+        expected = {p.name: self._expected_seconds(p, kind) for p in available}
+        if available and all(seconds is not None for seconds in expected.values()):
+            preferred = available[0]
+            available.sort(key=lambda p: expected[p.name])
+            # Stay on the configured provider unless another is clearly faster.
+            if expected[preferred.name] <= expected[available[0].name] * (1 + self.switch_margin):
+                available.remove(preferred)
+                available.insert(0, preferred)
+        with self._lock:
+            self.calls += 1
+            probe = self.probe_every and self.calls % self.probe_every == 0
+        if probe and len(available) > 1:
+            available.insert(0, available.pop(1))
+        return available
+
+    def _hedge_delay(self, provider: Provider, fallback: Provider, kind: str) -> float:
+        # Its own p95 alone would only ever hedge the slowest 5% of calls, however slow they all get.
+        candidates = []
+        if len(provider.stats[kind]) >= self.min_samples:
+            candidates.append(provider.stats[kind].percentile(0.95))
+        if len(fallback.stats[kind]) >= self.min_samples:
+            candidates.append(fallback.stats[kind].percentile(0.5))
+        delay = min((c for c in candidates if c is not None), default=self.hedge_max_delay)
+        return min(self.hedge_max_delay, max(self.hedge_min_delay, delay))
+
+    async def _attempt(self, provider: Provider, kind: str, call):
+        allowed, trial = provider.breaker.allow()
+        if not allowed:
+            raise ProviderUnavailable(f"{provider.name} circuit is open")
+        start = time.perf_counter()
+        # Our own task rather than the one wait_for would make: if it fails just as we are
+        # cancelled, nobody awaits it and its exception would be logged as never retrieved.
+        attempt = asyncio.ensure_future(call(provider))
+        attempt.add_done_callback(_retrieve)
+        try:
+            with metrics.stage(STAGES[kind], provider=provider.name):
+                result = await asyncio.wait_for(attempt, provider.timeout)
+        except asyncio.CancelledError:
+            if trial:
+                provider.breaker.release()
+            raise
+        except Exception:
+            provider.record(kind, time.perf_counter() - start, ok=False)
+            raise
+        provider.record(kind, time.perf_counter() - start, ok=True)
+        return result
+
+    async def _run(self, kind: str, call, discard=None):
+        """Run ``call(provider)`` on the best provider, hedging and falling back as configured."""
+        queue = self.ranked(kind)
+        if not queue:
+            raise ProviderUnavailable("every provider's circuit is open")
+        running = {}
+        errors = []
+
+        def launch(provider: Provider) -> None:
+            task = asyncio.create_task(self._attempt(provider, kind, call))
+            task.add_done_callback(_retrieve)
+            running[task] = provider
+
+        try:
+            while queue or running:
+                if not running:
+                    first = queue.pop(0)
+                    launch(first)
+                    continue
+                delay = None
+                if self.hedge and queue and len(running) == 1:
+                    delay = self._hedge_delay(next(iter(running.values())), queue[0], kind)
+                done, _ = await asyncio.wait(running, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    with self._lock:
+                        self.hedged += 1
+                    metrics.count("llm_hedge", provider=queue[0].name)
+                    launch(queue.pop(0))
+                    continue
+                for task in done:
+                    provider = running.pop(task)
+                    if task.exception() is None:
+                        if any(p is first for p in running.values()):
+                            with self._lock:
+                                self.hedge_wins += 1
+                        return provider, task.result()
+                    error = task.exception()
+                    errors.append(f"{provider.name}: {type(error).__name__}")
+                    if queue or running:
+                        with self._lock:
+                            self.fallbacks += 1
+                        metrics.count("llm_fallback", provider=provider.name)
+                        print(f"{provider.name} failed ({type(error).__name__}). Falling back...")
+        finally:
+            for task in running:
+                if task.done() and not task.cancelled() and task.exception() is None:
+                    if discard is not None:
+                        await discard(task.result())
+                else:
+                    task.cancel()
+        metrics.count("llm_unavailable")
+        raise ProviderUnavailable("all providers failed: " + "; ".join(errors))
+
+    async def complete(self, messages: List[dict]) -> str:
+        _, reply = await self._run("complete", lambda provider: provider.complete(messages))
+        return reply
+
+    async def stream(self, messages: List[dict]) -> AsyncIterator[str]:
+        """
+        Yield reply deltas. Hedging and fallback apply until the first delta
+        arrives; after that the stream is committed to that provider.
+        """
+        async def first_delta(provider: Provider):
+            chunks = provider.stream(messages)
+            try:
+                return await chunks.__anext__(), chunks
+            except StopAsyncIteration:
+                raise RuntimeError(f"{provider.name} returned an empty reply")
+            except BaseException:
+                await chunks.aclose()
+                raise
+
+        async def discard(result):
+            await result[1].aclose()
+
+        provider, (delta, chunks) = await self._run("stream", first_delta, discard)
+        try:
+            yield delta
+            while True:
+                try:
+                    delta = await asyncio.wait_for(chunks.__anext__(), provider.timeout)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    provider.breaker.record_failure()
+                    metrics.count("llm_stream_stalled", provider=provider.name)
+                    raise
+                yield delta
+        finally:
+            await chunks.aclose()
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = {"calls": self.calls, "fallbacks": self.fallbacks,
+                        "hedged": self.hedged, "hedge_wins": self.hedge_wins}
+        counters["providers"] = {
+            p.name: {"circuit": p.breaker.state, **{kind: w.summary() for kind, w in p.stats.items()}}
+            for p in self.providers
+        }
+        return counters
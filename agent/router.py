@@ -0,0 +1,75 @@
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, Optional
+
+from .metrics import metrics
+
+
+class IntentRouter:
+    """
+    Answers deterministic turns from templates before they reach the LLM.
+
+    ``templates`` maps an intent label to a function returning the reply (or None
+    to let the LLM answer after all). A turn is routed only when the classifier's
+    top intent has a template and its probability is at least ``threshold``.
+    """
+
+    def __init__(self, classifier, templates: Dict[str, Callable[[], Optional[str]]], threshold: float = 0.8):
+        self.classifier = classifier
+        self.templates = templates
+        self.threshold = threshold
+        self.routed = Counter()
+        self.turns = 0
+        self._latency = {"template": [0, 0.0], "llm": [0, 0.0]}
+        self._lock = threading.Lock()
+
+    async def route_async(self, text: str) -> Optional[str]:
+        """
+        Return a templated reply for ``text``, or None when the LLM should answer;
+        classification is micro-batched with concurrent turns.
+        """
+        start = time.perf_counter()
+        try:
+            results = await self.classifier.predict_many([text])
+        except Exception as e:
+            # A broken model must not fail the turn; the LLM answers instead.
+            print(f"Warning: intent classification failed: {e}")
+            metrics.count("intent_error")
+            return None
+        if results is None:
+            # The model is still loading; the LLM answers meanwhile.
+            return None
+        (intent, confidence), = results
+        return self._reply(intent, confidence, start)
+
+    def _reply(self, intent: str, confidence: float, start: float) -> Optional[str]:
+        template = self.templates.get(intent)
+        reply = template() if template is not None and confidence >= self.threshold else None
+        with self._lock:
+            self.turns += 1
+            if reply is not None:
+                self.routed[intent] += 1
+        if reply is not None:
+            self.record_latency("template", time.perf_counter() - start)
+        return reply
+
+    def record_latency(self, path: str, seconds: float) -> None:
+        with self._lock:
+            stats = self._latency[path]
+            stats[0] += 1
+            stats[1] += seconds
+
+    def stats(self) -> dict:
+        with self._lock:
+            routed = sum(self.routed.values())
+            return {
+                "turns": self.turns,
+                "routed": dict(self.routed),
+                "routed_share": routed / self.turns if self.turns else 0.0,
+                "llm_turns": self._latency["llm"][0],
+                "mean_latency_ms": {
+                    path: (seconds / count * 1000 if count else 0.0)
+                    for path, (count, seconds) in self._latency.items()
+                },
+            }
@@ -0,0 +1,108 @@
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+
+class Service:
+    """
+    A client or SDK object built by ``factory`` on first use, exactly once.
+
+    Attribute access is forwarded to the built object, so a Service can stand in
+    for it (``orders_collection.find_one(...)``); use ``get()`` where the real
+    object itself is needed, e.g. when handing it to an SDK.
+    """
+
+    __slots__ = ("name", "factory", "build_seconds", "_value", "_lock")
+
+    def __init__(self, name: str, factory: Callable[[], object]):
+        self.name = name
+        self.factory = factory
+        self.build_seconds: Optional[float] = None
+        self._value = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.build_seconds is not None
+
+    def get(self):
+        if self.build_seconds is None:
+            with self._lock:
+                if self.build_seconds is None:
+                    start = time.perf_counter()
+                    self._value = self.factory()
+                    self.build_seconds = time.perf_counter() - start
+        return self._value
+
+    def __getattr__(self, attr: str):
+        if attr in Service.__slots__:
+            raise AttributeError(attr)
+        return getattr(self.get(), attr)
+
+    def __repr__(self) -> str:
+        return f"<Service {self.name} {'ready' if self.ready else 'not built'}>"
+
+
+class ServiceRegistry:
+    """
+    Lazily built clients (LLM SDKs, Mongo, SendGrid, ...), so importing the app
+    stays cheap and only what is actually configured and used gets loaded.
+
+    ``warm`` builds everything registered, plus any extra warm-up callables, on
+    a background thread after startup, so the first request does not pay for it
+    either. Steps run by ascending ``warm_order``: what the first chat turn
+    needs goes first, since that request may already be waiting on it.
+    """
+
+    def __init__(self):
+        self._services: Dict[str, Service] = {}
+        self._warm_steps: Dict[str, Tuple[int, Callable[[], object]]] = {}
+
+    def register(self, name: str, factory: Callable[[], object], warm_order: int = 100) -> Service:
+        service = self._services[name] = Service(name, factory)
+        self._warm_steps[name] = (warm_order, service.get)
+        return service
+
+    def on_warm(self, name: str, warm: Callable[[], object], warm_order: int = 100) -> None:
+        """Run ``warm()`` during ``warm`` too (models and other start-up work that is not a client)."""
+        self._warm_steps[name] = (warm_order, warm)
+
+    def override(self, name: str, factory: Callable[[], object]) -> Service:
+        """Build ``name`` with ``factory`` instead (local stand-ins in benchmarks); only before it is built."""
+        service = self._services[name]
+        if service.ready:
+            raise RuntimeError(f"{name} is already built")
+        service.factory = factory
+        return service
+
+    def __getitem__(self, name: str) -> Service:
+        return self._services[name]
+
+    def warm(self, names: Optional[Iterable[str]] = None) -> threading.Thread:
+        """Build the services (and run the warmers) in ``names``, or all of them, on a daemon thread."""
+        wanted = None if names is None else set(names)
+        steps = sorted(
+            ((order, index, name, step) for index, (name, (order, step)) in enumerate(self._warm_steps.items())
+             if wanted is None or name in wanted),
+        )
+
+        def run():
+            for _, _, name, step in steps:
+                try:
+                    step()
+                except Exception as e:
+                    print(f"Warning: warming {name} failed: {e}")
+
+        thread = threading.Thread(target=run, name="warm-services", daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self) -> dict:
+        return {
+            name: {"ready": service.ready,
+                   "build_ms": service.build_seconds * 1000 if service.ready else None}
+            for name, service in self._services.items()
+        }
+
+
+services = ServiceRegistry()
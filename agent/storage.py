@@ -0,0 +1,192 @@
+import asyncio
+import os
+import re
+import uuid
+from typing import Tuple
+
+from starlette.applications import Starlette
+from starlette.datastructures import Headers
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+from starlette.routing import Route
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+from config import settings
+
+EXTENSIONS = {"image/jpeg": ".jpg", "image/png": ".png"}
+CONTENT_TYPES = {ext: content_type for content_type, ext in EXTENSIONS.items()}
+
+# Stored files never change: content-addressed keys are their own hash, and older
+# uuid-named uploads are never overwritten either.
+IMMUTABLE = "public, max-age=31536000, immutable"
+KEY_PATTERN = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})(?:\.(compact|thumb))?\.(jpg|png)$")
+
+
+def key_for(sha256: str, content_type: str) -> str:
+    """Sharded content address, e.g. ``3f/a2/3fa2...e1.jpg``."""
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}{EXTENSIONS[content_type]}"
+
+
+def variant_key(key: str, variant: str) -> str:
+    """Key of a derived JPEG next to the original, e.g. ``3f/a2/3fa2...e1.thumb.jpg``."""
+    return f"{os.path.splitext(key)[0]}.{variant}.jpg"
+
+
+def etag_for(key: str) -> str:
+    match = KEY_PATTERN.match(key)
+    if not match:
+        return None
+    return f'"{match.group(1)}-{match.group(2)}"' if match.group(2) else f'"{match.group(1)}"'
+
+
+class ProofFiles(StaticFiles):
+    """StaticFiles for proof images: the content hash as ETag, and cached as immutable."""
+
+    def lookup_path(self, path: str):
+        # Never serve staged (possibly half-written) uploads.
+        if any(part.startswith(".") for part in re.split(r"[/\\]", path)):
+            return "", None
+        return super().lookup_path(path)
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        headers = {"cache-control": IMMUTABLE}
+        etag = etag_for(os.path.relpath(full_path, self.directory).replace(os.sep, "/"))
+        if etag:
+            headers["etag"] = etag
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, headers=headers)
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+class LocalProofStorage:
+    """
+    Proof images on local disk, keyed by content hash.
+
+    Uploads are staged in ``root/.incoming`` (same filesystem, so storing is a
+    rename) and a receipt that is already stored is just dropped.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.staging_dir = os.path.join(root, ".incoming")
+        os.makedirs(self.staging_dir, exist_ok=True)
+
+    def save(self, staged_path: str, sha256: str, content_type: str) -> Tuple[str, bool]:
+        """Move a staged upload into place. Returns (key, False if it was a duplicate)."""
+        key = key_for(sha256, content_type)
+        path = os.path.join(self.root, *key.split("/"))
+        if os.path.exists(path):
+            os.remove(staged_path)
+            return key, False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(staged_path, path)
+        return key, True
+
+    def put(self, key: str, data: bytes, content_type: str) -> None:
+        """Store derived bytes under ``key`` (a no-op if they are already there)."""
+        path = os.path.join(self.root, *key.split("/"))
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Unique per write: two threads (or processes) may store the same variant at once.
+        staged = os.path.join(self.staging_dir, f".{uuid.uuid4().hex}.part")
+        try:
+            with open(staged, "wb") as f:
+                f.write(data)
+            os.replace(staged, path)
+        except BaseException:
+            if os.path.exists(staged):
+                os.remove(staged)
+            raise
+
+    def read(self, key: str) -> bytes:
+        with open(os.path.join(self.root, *key.split("/")), "rb") as f:
+            return f.read()
+
+    def asgi_app(self):
+        return ProofFiles(directory=self.root)
+
+
+class GCSProofStorage:
+    """
+    Proof images in a Google Cloud Storage bucket, keyed by content hash.
+
+    Objects are created with ``if_generation_match=0``, so a duplicate receipt
+    is rejected by the bucket itself instead of being uploaded again. Set
+    ``STORAGE_EMULATOR_HOST`` to point the client at a local emulator.
+    """
+
+    def __init__(self, bucket_name: str, staging_dir: str, client=None):
+        if client is None:
+            from google.cloud import storage
+
+            if os.environ.get("STORAGE_EMULATOR_HOST"):
+                from google.auth.credentials import AnonymousCredentials
+
+                client = storage.Client(credentials=AnonymousCredentials(), project="emulator")
+            else:
+                client = storage.Client()
+        self.bucket = client.bucket(bucket_name)
+        self.staging_dir = staging_dir
+        os.makedirs(staging_dir, exist_ok=True)
+
+    def save(self, staged_path: str, sha256: str, content_type: str) -> Tuple[str, bool]:
+        from google.api_core.exceptions import PreconditionFailed
+
+        key = key_for(sha256, content_type)
+        blob = self.bucket.blob(key)
+        blob.cache_control = IMMUTABLE
+        try:
+            blob.upload_from_filename(staged_path, content_type=content_type, if_generation_match=0)
+            return key, True
+        except PreconditionFailed:
+            return key, False
+        finally:
+            os.remove(staged_path)
+
+    def put(self, key: str, data: bytes, content_type: str) -> None:
+        from google.api_core.exceptions import PreconditionFailed
+
+        blob = self.bucket.blob(key)
+        blob.cache_control = IMMUTABLE
+        try:
+            blob.upload_from_string(data, content_type=content_type, if_generation_match=0)
+        except PreconditionFailed:
+            pass
+
+    def read(self, key: str) -> bytes:
+        return self.bucket.blob(key).download_as_bytes()
+
+    def asgi_app(self):
+        async def serve(request: Request) -> Response:
+            key = request.path_params["key"]
+            etag = etag_for(key)
+            if etag is None:
+                return Response(status_code=404)
+            headers = {"etag": etag, "cache-control": IMMUTABLE}
+            # The key is the hash, so a matching ETag is answered without asking the bucket.
+            if etag in request.headers.get("if-none-match", ""):
+                return Response(status_code=304, headers=headers)
+            from google.api_core.exceptions import NotFound
+
+            try:
+                data = await asyncio.to_thread(self.read, key)
+            except NotFound:
+                return Response(status_code=404)
+            return Response(data, media_type=CONTENT_TYPES[os.path.splitext(key)[1]], headers=headers)
+
+        return Starlette(routes=[Route("/{key:path}", serve, methods=["GET", "HEAD"])])
+
+
+UPLOAD_DIR = "uploads"
+URL_PREFIX = "/static/uploads/"
+
+
+def create_proof_storage(upload_dir: str = UPLOAD_DIR):
+    if settings.storage_backend == "gcs":
+        return GCSProofStorage(settings.gcs_bucket_name, staging_dir=os.path.join(upload_dir, ".incoming"))
+    return LocalProofStorage(upload_dir)
+
+
+proof_storage = create_proof_storage()
@@ -0,0 +1,196 @@
+import asyncio
+import hashlib
+import os
+import uuid
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from python_multipart.exceptions import FormParserError
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+)
+SNIFF_BYTES = 8
+FLUSH_BYTES = 256 * 1024  # file bytes buffered before a disk write
+MAX_FIELD_BYTES = 64 * 1024  # per text field, e.g. the chat message
+
+
+class UploadRejected(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class StoredUpload(NamedTuple):
+    path: str  # staged file, to be handed to the proof storage
+    filename: str  # as sent by the client
+    size: int
+    sha256: str
+    content_type: str
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """Content type from the file's magic bytes, or None if it is not a supported image."""
+    for signature, content_type in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    return None
+
+
+class _FileSink:
+    """
+    Receives one file part as the parser produces it.
+
+    Size and type are checked as bytes arrive; bytes are hashed and written to
+    a ``.part`` file in a worker thread, in FLUSH_BYTES batches. The file is
+    removed again if the upload is rejected part-way.
+    """
+
+    def __init__(self, directory: str, filename: str, max_size: int, allowed_types: List[str]):
+        self.directory = directory
+        self.filename = filename
+        self.max_size = max_size
+        self.allowed_types = allowed_types
+        self.size = 0
+        self.content_type: Optional[str] = None
+        self._buffer = bytearray()
+        self._hash = hashlib.sha256()
+        self._file = None
+        self._tmp_path = os.path.join(directory, f".{uuid.uuid4().hex}.part")
+
+    def feed(self, data: bytes) -> None:
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise UploadRejected(400, f"File size too large. Must be less than {self.max_size / 1024 / 1024:.0f} MB.")
+        self._buffer += data
+        if self.content_type is None and len(self._buffer) >= SNIFF_BYTES:
+            self._sniff()
+
+    @property
+    def buffered(self) -> int:
+        return len(self._buffer) if self.content_type is not None else 0
+
+    async def flush(self) -> None:
+        if self._buffer and self.content_type is not None:
+            data, self._buffer = self._buffer, bytearray()
+            await asyncio.to_thread(self._write, data)
+
+    async def finish(self) -> StoredUpload:
+        if self.content_type is None:
+            self._sniff()
+        await self.flush()
+        path = await asyncio.to_thread(self._commit)
+        return StoredUpload(path, self.filename, self.size, self._hash.hexdigest(), self.content_type)
+
+    def discard(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            if os.path.exists(self._tmp_path):
+                os.remove(self._tmp_path)
+
+    def _sniff(self) -> None:
+        content_type = sniff_image_type(bytes(self._buffer[:SNIFF_BYTES]))
+        if content_type not in self.allowed_types:
+            raise UploadRejected(400, "Invalid file type. Only JPEG and PNG are allowed.")
+        self.content_type = content_type
+
+    def _write(self, data: bytearray) -> None:
+        if self._file is None:
+            self._file = open(self._tmp_path, "wb")
+        self._hash.update(data)
+        self._file.write(data)
+
+    def _commit(self) -> str:
+        if self._file is None:
+            self._file = open(self._tmp_path, "wb")
+        self._file.close()
+        return self._tmp_path
+
+
+async def receive_upload(request, directory: str, max_size: int, allowed_types: List[str],
+                         file_field: str = "file") -> Tuple[Dict[str, str], StoredUpload]:
+    """
+    Stream a multipart form with one file straight from the socket to a staged
+    file in ``directory``.
+
+    Replaces ``UploadFile``, which spools the whole body before the handler runs:
+    here each chunk is parsed, checked and written as it arrives, so memory per
+    upload is bounded by the chunk size plus FLUSH_BYTES, and an oversized or
+    non-image upload is rejected without reading the rest of it. Returns the
+    text fields and the stored file. Raises UploadRejected.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise UploadRejected(400, "Expected a multipart/form-data upload.")
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_size + MAX_FIELD_BYTES:
+        raise UploadRejected(400, f"File size too large. Must be less than {max_size / 1024 / 1024:.0f} MB.")
+
+    fields: Dict[str, str] = {}
+    sink: Optional[_FileSink] = None
+    part = {}
+
+    def on_part_begin():
+        part.clear()
+        part.update(headers={}, header_field=b"", header_value=b"", data=bytearray(), sink=None)
+
+    def on_header_field(data, start, end):
+        part["header_field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        part["header_value"] += data[start:end]
+
+    def on_header_end():
+        part["headers"][part["header_field"].lower()] = part["header_value"]
+        part["header_field"] = part["header_value"] = b""
+
+    def on_headers_finished():
+        nonlocal sink
+        _, options = parse_options_header(part["headers"].get(b"content-disposition", b""))
+        part["name"] = options.get(b"name", b"").decode("latin-1")
+        filename = options.get(b"filename")
+        if filename is not None and part["name"] == file_field and sink is None:
+            name = os.path.basename(filename.decode("utf-8", "replace").replace("\\", "/")) or "upload"
+            sink = part["sink"] = _FileSink(directory, name, max_size, allowed_types)
+
+    def on_part_data(data, start, end):
+        if part["sink"] is not None:
+            part["sink"].feed(data[start:end])
+        elif len(part["data"]) + end - start > MAX_FIELD_BYTES:
+            raise UploadRejected(400, f"Form field {part['name']!r} is too large.")
+        else:
+            part["data"] += data[start:end]
+
+    def on_part_end():
+        if part["sink"] is None and part.get("name"):
+            fields[part["name"]] = part["data"].decode("utf-8", "replace")
+
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    try:
+        try:
+            async for chunk in request.stream():
+                if chunk:
+                    parser.write(chunk)
+                if sink is not None and sink.buffered >= FLUSH_BYTES:
+                    await sink.flush()
+            parser.finalize()
+        except FormParserError as e:
+            raise UploadRejected(400, f"Malformed upload: {e}")
+        if sink is None:
+            raise UploadRejected(400, "No file was uploaded.")
+        return fields, await sink.finish()
+    except BaseException:
+        if sink is not None:
+            await asyncio.to_thread(sink.discard)
+        raise
@@ -0,0 +1,211 @@
+"""
+Admission control with one abusive embedding site.
+
+One client address sends chat turns far above its share, with no session id
+or cookie (so each turn would start a fresh session) and a different Referer
+every time, while the visitors of --sites well-behaved sites, each from their
+own address, chat at a steady rate and now and then upload a payment proof. The LLM is a stub with a quota: calls beyond
+--quota per second count as provider rate-limit hits and take
+--throttled-latency (what the fallback path costs). The same open-loop traffic
+runs with admission control off and on; the report shows, per class of
+traffic, answered / 429 / failed turns and latency, plus LLM calls, quota
+overruns and the admission counters.
+
+    python benchmarks/bench_admission.py --duration 10 --abuse-rps 60 --quota 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import deque
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+for key, value in {
+    "OPENAI_API_KEY": "stub",
+    "GEMINI_API_KEY": "stub",
+    "MONGODB_URI": "mongodb://localhost:27017",
+    "AI_PROVIDER": "openai",
+    "SESSION_BACKEND": "memory",
+}.items():
+    os.environ.setdefault(key, value)
+
+import httpx
+
+import agent.core as core
+import main
+from agent.admission import RateLimiter, admission
+from agent.storage import LocalProofStorage, proof_storage
+from benchmarks.bench_replay import proof_png
+
+
+class QuotaLLM:
+    """Stub provider: ``quota`` calls per second at ``latency``, the rest throttled."""
+
+    def __init__(self, quota: int, latency: float, throttled_latency: float):
+        self.quota = quota
+        self.latency = latency
+        self.throttled_latency = throttled_latency
+        self.calls = 0
+        self.over_quota = 0
+        self._window = deque()
+
+    async def __call__(self, messages, model_name=None):
+        now = time.monotonic()
+        while self._window and self._window[0] <= now - 1.0:
+            self._window.popleft()
+        self.calls += 1
+        if len(self._window) >= self.quota:
+            self.over_quota += 1
+            await asyncio.sleep(self.throttled_latency)
+        else:
+            self._window.append(now)
+            await asyncio.sleep(self.latency)
+        return "Happy to help! It comes in blue and black."
+
+
+ABUSER = "203.0.113.66"
+
+
+def plan_traffic(args) -> list:
+    """(start offset, class, client address, referer, session or None) for every request, the same for both runs."""
+    rng = random.Random(args.seed)
+    plan = []
+
+    def poisson(rate, make):
+        t = rng.expovariate(rate)
+        while t < args.duration:
+            plan.append((t,) + make())
+            t += rng.expovariate(rate)
+
+    counter = iter(range(10 ** 9))
+    poisson(args.abuse_rps, lambda: ("abuse", ABUSER, f"https://spam{next(counter)}.example/", None))
+
+    def visitor(site):
+        # Each visitor (session) of a site comes from their own address.
+        session = rng.randrange(args.sessions)
+        return f"198.51.{site}.{session}", f"https://shop{site}.example/products", f"site{site}-{session:04d}"
+
+    for site in range(args.sites):
+        poisson(args.site_rps, lambda: ("chat",) + visitor(site))
+        poisson(args.proof_rps / args.sites, lambda: ("proof",) + visitor(site))
+    return sorted(plan)
+
+
+async def send(client, kind, referer, session, n):
+    headers = {"referer": referer}
+    data = {"session_id": session} if session else {}
+    if not session:
+        client.cookies.clear()  # drops the session cookie the last reply set
+    if kind == "proof":
+        files = {"file": ("receipt.png", proof_png(f"{session}-{n}"), "image/png")}
+        data["message"] = "Here is my payment receipt"
+        return await client.post("/upload-proof", data=data, files=files, headers=headers)
+    data["message"] = f"Can you tell me more about the blue one, size {n % 9 + 36}?"
+    return await client.post("/chat", data=data, headers=headers)
+
+
+async def run(plan, args) -> dict:
+    results = {kind: {"latencies": [], "429": 0, "failed": 0} for kind in ("chat", "proof", "abuse")}
+
+    clients = {}
+
+    def client_for(address):
+        # The app sees the transport's client address as request.client.
+        if address not in clients:
+            transport = httpx.ASGITransport(app=main.app, client=(address, 40000))
+            clients[address] = httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60)
+        return clients[address]
+
+    async def one(offset, kind, address, referer, session, n, start):
+        await asyncio.sleep(max(0.0, start + offset - time.perf_counter()))
+        sent = time.perf_counter()
+        try:
+            response = await send(client_for(address), kind, referer, session, n)
+        except httpx.HTTPError:
+            results[kind]["failed"] += 1
+            return
+        if response.status_code == 200:
+            results[kind]["latencies"].append(time.perf_counter() - sent)
+        elif response.status_code == 429:
+            results[kind]["429"] += 1
+        else:
+            results[kind]["failed"] += 1
+
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(one(*item, n, start) for n, item in enumerate(plan)))
+    finally:
+        for client in clients.values():
+            await client.aclose()
+    return results
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else None
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--abuse-rps", type=float, default=60.0)
+    parser.add_argument("--sites", type=int, default=4)
+    parser.add_argument("--site-rps", type=float, default=2.0, help="chat turns per second per good site")
+    parser.add_argument("--proof-rps", type=float, default=0.5, help="proof uploads per second, all sites")
+    parser.add_argument("--sessions", type=int, default=30, help="sessions per good site")
+    parser.add_argument("--quota", type=int, default=20, help="LLM calls per second before throttling")
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--throttled-latency", type=float, default=2.0)
+    parser.add_argument("--source-rpm", type=float, default=300.0)
+    parser.add_argument("--source-burst", type=int, default=20)
+    parser.add_argument("--session-rpm", type=float, default=20.0)
+    parser.add_argument("--session-burst", type=int, default=8)
+    parser.add_argument("--new-session-rpm", type=float, default=6.0)
+    parser.add_argument("--new-session-burst", type=int, default=5)
+    parser.add_argument("--max-in-flight", type=int, default=16)
+    parser.add_argument("--max-queue", type=int, default=16)
+    parser.add_argument("--queue-timeout", type=float, default=2.0)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    core.finalize_order = lambda user_input_data, source, entities: "Thanks, we received your payment proof."
+    if isinstance(proof_storage, LocalProofStorage):
+        proof_storage.root = tempfile.mkdtemp(prefix="admission-uploads-")
+        proof_storage.staging_dir = os.path.join(proof_storage.root, ".incoming")
+        os.makedirs(proof_storage.staging_dir)
+    plan = plan_traffic(args)
+    print(f"{len(plan)} requests over {args.duration:.0f}s: abuse {args.abuse_rps}/s from one address, {args.sites} sites x "
+          f"{args.site_rps}/s chat, proofs {args.proof_rps}/s; LLM quota {args.quota}/s")
+
+    for enabled in (False, True):
+        llm = QuotaLLM(args.quota, args.latency, args.throttled_latency)
+        core.get_ai_response_async = llm
+        admission.enabled = enabled
+        admission.source_limiter = RateLimiter(args.source_rpm / 60, args.source_burst)
+        admission.session_limiter = RateLimiter(args.session_rpm / 60, args.session_burst)
+        admission.new_session_limiter = RateLimiter(args.new_session_rpm / 60, args.new_session_burst)
+        admission.max_in_flight = args.max_in_flight
+        admission.max_queue = args.max_queue
+        admission.queue_timeout = args.queue_timeout
+        admission.admitted.clear()
+        admission.rejected.clear()
+        results = asyncio.run(run(plan, args))
+
+        print(f"\nadmission {'on' if enabled else 'off'}: {llm.calls} LLM calls, {llm.over_quota} over quota")
+        print(f"{'class':>8}{'sent':>7}{'ok':>7}{'429':>7}{'failed':>7}{'p50 ms':>9}{'p95 ms':>9}")
+        for kind, r in results.items():
+            sent = len(r["latencies"]) + r["429"] + r["failed"]
+            p50, p95 = percentile(r["latencies"], 0.5), percentile(r["latencies"], 0.95)
+            print(f"{kind:>8}{sent:7d}{len(r['latencies']):7d}{r['429']:7d}{r['failed']:7d}"
+                  f"{p50 * 1000 if p50 else 0:9.0f}{p95 * 1000 if p95 else 0:9.0f}")
+        if enabled:
+            print("rejected:", dict(admission.stats()["rejected"]))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,100 @@
+"""
+Concurrency benchmark for /chat with stubbed LLM providers.
+
+Fires N simultaneous /chat requests at a single in-process app with a stub
+provider taking L seconds. The async handler should finish in roughly L; the
+old blocking call path, which only exists in older trees now, in N * L.
+Each --tree runs in its own interpreter. To compare with the blocking path:
+
+    git worktree add /tmp/before <commit before the async chat path>
+    python benchmarks/bench_chat_concurrency.py --requests 20 --latency 0.2 --tree . --tree /tmp/before
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def install_stub_providers(core, latency: float) -> None:
+    async def fake_async(messages, model_name="stub"):
+        await asyncio.sleep(latency)
+        return "stub reply"
+
+    def fake_sync(messages, model_name="stub"):
+        time.sleep(latency)
+        return "stub reply"
+
+    # Older trees only have the blocking get_ai_response.
+    if hasattr(core, "get_ai_response_async"):
+        core.get_ai_response_async = fake_async
+    if hasattr(core, "get_ai_response"):
+        core.get_ai_response = fake_sync
+
+
+async def run(app, n: int) -> float:
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        start = time.perf_counter()
+        responses = await asyncio.gather(
+            *(client.post("/chat", data={"message": f"hello {i}"}) for i in range(n))
+        )
+        elapsed = time.perf_counter() - start
+    assert all(r.status_code == 200 for r in responses), [r.status_code for r in responses]
+    return elapsed
+
+
+def run_tree(tree: str, requests: int, latency: float) -> None:
+    """Runs in the child interpreter: import the app from ``tree`` and print the elapsed seconds."""
+    sys.path.insert(0, tree)
+    os.chdir(tree)
+    for key, value in {
+        "OPENAI_API_KEY": "stub",
+        "GEMINI_API_KEY": "stub",
+        "MONGODB_URI": "mongodb://localhost:27017",
+        "AI_PROVIDER": "openai",
+        "ADMISSION_ENABLED": "0",
+    }.items():
+        os.environ.setdefault(key, value)
+
+    import agent.core as core
+    import main
+
+    install_stub_providers(core, latency)
+    print(asyncio.run(run(main.app, requests)))
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--tree", action="append", help="source tree to benchmark (repeatable; default: this one)")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_tree(args.child, args.requests, args.latency)
+        return
+
+    serial = args.requests * args.latency
+    for tree in args.tree or [ROOT]:
+        tree = os.path.abspath(tree)
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", tree,
+             "--requests", str(args.requests), "--latency", str(args.latency)],
+            capture_output=True, text=True, check=True,
+        )
+        elapsed = float(out.stdout.strip().splitlines()[-1])
+        print(
+            f"{tree}: {args.requests} concurrent /chat requests: {elapsed:.3f}s "
+            f"(serial would be {serial:.3f}s, overlap x{serial / elapsed:.1f})"
+        )
+
+
+if __name__ == "__main__":
+    main_cli()
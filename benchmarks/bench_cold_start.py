@@ -0,0 +1,139 @@
+"""
+Cold start: import time, time to first served request, first LLM turn.
+
+Each run is a fresh interpreter. It times ``import main`` on its own, then
+starts uvicorn and measures when ``GET /`` first answers and how long the
+first and second /chat turns take. The turns go to the fake OpenAI server
+through OPENAI_BASE_URL. It also lists the slowest imports
+(``python -X importtime``). With --max-import-seconds the exit status is
+non-zero when the import gets slower, so a CI job can catch regressions.
+
+To compare against an older tree:
+
+    git worktree add /tmp/before <commit>
+    python benchmarks/bench_cold_start.py --runs 5 --tree . --tree /tmp/before
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import httpx
+
+from benchmarks.fake_providers import FakeLLMConfig, build_app, free_port, serve_in_thread
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+
+
+def child_env(tree: str, provider_url: str, mongo_uri: str, warm: bool) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_API_KEY": env.get("OPENAI_API_KEY", "stub"),
+        "GEMINI_API_KEY": env.get("GEMINI_API_KEY", "stub"),
+        "AI_PROVIDER": "openai",
+        # Unreachable or not, Mongo must not decide the result: fail fast in both trees.
+        "MONGODB_URI": mongo_uri,
+        "OPENAI_BASE_URL": f"{provider_url}/v1",
+        "WARM_SERVICES": "1" if warm else "0",
+        "PYTHONPATH": tree,
+    })
+    return env
+
+
+def import_seconds(tree: str, env: dict) -> float:
+    out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=tree, env=env,
+                         capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(tree: str, env: dict, top: int) -> list:
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=tree, env=env,
+                         capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2  # "main" is depth 0, what it imports depth 1
+        if depth == 1:
+            rows.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def serve_once(tree: str, env: dict) -> dict:
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=tree, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+            while True:
+                try:
+                    if client.get("/").status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if process.poll() is not None:
+                    raise RuntimeError(f"server in {tree} exited with {process.returncode}")
+                time.sleep(0.02)
+            ready = time.perf_counter() - start
+            turns = []
+            for message in ("I want a laptop delivered to 14 Marina Road", "Is there a warranty on it?"):
+                turn_start = time.perf_counter()
+                client.post("/chat", data={"message": message}).raise_for_status()
+                turns.append(time.perf_counter() - turn_start)
+        return {"ready": ready, "first_turn": turns[0], "second_turn": turns[1]}
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--tree", action="append", help="source tree to measure (repeatable; default: this one)")
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:1/?serverSelectionTimeoutMS=500")
+    parser.add_argument("--no-warm", action="store_true", help="start with WARM_SERVICES=0")
+    parser.add_argument("--top", type=int, default=8, help="slowest imports to list")
+    parser.add_argument("--max-import-seconds", type=float, help="fail if the median import of the first tree is slower")
+    args = parser.parse_args()
+    trees = [os.path.abspath(t) for t in (args.tree or [ROOT])]
+
+    config = FakeLLMConfig(first_token_delay=0.2, token_delay=0.0)
+    provider_port = free_port()
+    server = serve_in_thread(build_app(config), provider_port)
+    provider_url = f"http://127.0.0.1:{provider_port}"
+
+    medians = {}
+    try:
+        for tree in trees:
+            env = child_env(tree, provider_url, args.mongo_uri, warm=not args.no_warm)
+            imports = [import_seconds(tree, env) for _ in range(args.runs)]
+            serves = [serve_once(tree, env) for _ in range(args.runs)]
+            medians[tree] = statistics.median(imports)
+            print(f"{tree}")
+            print(f"  import main        {statistics.median(imports) * 1000:7.0f} ms (median of {args.runs})")
+            for key, label in (("ready", "first GET / served"), ("first_turn", "first /chat turn"),
+                               ("second_turn", "second /chat turn")):
+                print(f"  {label:<18} {statistics.median(s[key] for s in serves) * 1000:7.0f} ms")
+            print("  slowest imports:")
+            for seconds, name in slowest_imports(tree, env, args.top):
+                print(f"    {seconds * 1000:7.0f} ms  {name}")
+    finally:
+        server.should_exit = True
+
+    if args.max_import_seconds is not None and medians[trees[0]] > args.max_import_seconds:
+        print(f"import main took {medians[trees[0]]:.2f} s, over the {args.max_import_seconds:.2f} s budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
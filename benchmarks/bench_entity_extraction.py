@@ -0,0 +1,145 @@
+"""
+Entity extraction: re-parsing the whole transcript vs the incremental extractor.
+
+First checks that EntityExtractor reproduces the original
+extract_entities_from_history (copied below as the reference) on a corpus of
+generated conversations plus hand-written edge cases. Then times order
+finalization on long transcripts: the old approach re-joins and re-scans the
+history on every upload; the new one feeds each turn once and reads slots.
+
+    python benchmarks/bench_entity_extraction.py --turns 200 --conversations 500
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from agent.entities import EntityExtractor
+
+
+def reference_extract(history_list):
+    """extract_entities_from_history as it was before the incremental extractor."""
+    full_text = " ".join([msg["user"] + " " + msg["assistant"] for msg in history_list]).lower()
+
+    item, price, customer_name, address, email, payment_method, phone_number = None, None, None, None, None, None, None
+
+    phone_match = re.search(r"(\+?\d{1,3}[-.\s\(\)]*?\d{3,4}[-.\s\(\)]*?\d{4,9})", full_text)
+    if phone_match: phone_number = phone_match.group(0).strip()
+
+    price_match = re.search(r"[$€]?\s*(\d+(\.\d{1,2})?)", full_text)
+    if price_match:
+        try:
+            price = float(price_match.group(1))
+        except ValueError: pass
+
+    if "deliver to" in full_text: address = " ".join(full_text.split("deliver to")[-1].split()[:3])
+    elif "my address is" in full_text: address = " ".join(full_text.split("my address is")[-1].split()[:3])
+
+    email_match = re.search(r"\b[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}\b", full_text)
+    if email_match: email = email_match.group(0)
+
+    if any(w in full_text for w in ["bank", "transfer", "fidelity"]): payment_method = "bank"
+    elif "paystack" in full_text: payment_method = "paystack"
+    elif "paypal" in full_text: payment_method = "paypal"
+
+    if "pizza" in full_text: item = "Pizza"
+    elif "laptop" in full_text: item = "Laptop"
+
+    return item, price, customer_name, address, email, payment_method, phone_number
+
+
+EDGE_CASES = [
+    [],
+    [{"user": "", "assistant": ""}],
+    [{"user": "Please deliver", "assistant": "to"}, {"user": "12 Allen", "assistant": "Avenue Ikeja ok"}],
+    [{"user": "deliver to", "assistant": ""}, {"user": "", "assistant": ""}, {"user": "5 Awolowo Road", "assistant": "x"}],
+    [{"user": "deliver to 3 Main St", "assistant": ""}, {"user": "actually deliver to", "assistant": "Lekki"}],
+    [{"user": "my address is 9 Broad St", "assistant": "noted"}, {"user": "deliver to Yaba", "assistant": "ok"}],
+    [{"user": "I want a LAPTOPAYPAL", "assistant": ""}],
+    [{"user": "call +234", "assistant": "803 555 1234"}],
+    [{"user": "price $", "assistant": "150.50 ok"}],
+    [{"user": "Ada@Example.COM", "assistant": "thanks"}],
+    [{"user": "Fidelity", "assistant": "we also take PayStack"}],
+]
+
+USER_LINES = [
+    "hello", "I want a premium pizza", "how much is the laptop?", "my name is Ada",
+    "deliver to {n} Allen Avenue Ikeja", "my address is {n} Broad Street", "call me on 0803{n:07d}",
+    "+234 803 {n:03d} 4567", "email ada{n}@example.com", "I'll pay with paystack", "paypal please",
+    "bank transfer is fine", "it costs ${n}.50", "thanks", "Deliver to", "Ikeja GRA phase {n}",
+]
+ASSISTANT_LINES = [
+    "Sure, what is your address?", "Available payment methods are PayPal, Paystack, and Bank Transfer.",
+    "Great choice!", "Please share your phone number.", "Noted.", "Could you confirm your email?",
+]
+
+
+def random_conversation(rng: random.Random, turns: int) -> list:
+    return [
+        {"user": rng.choice(USER_LINES).format(n=rng.randint(1, 999)), "assistant": rng.choice(ASSISTANT_LINES)}
+        for _ in range(turns)
+    ]
+
+
+def incremental(history):
+    extractor = EntityExtractor()
+    for msg in history:
+        extractor.feed(msg["user"], msg["assistant"])
+    return extractor.slots()
+
+
+def check(conversations) -> None:
+    for history in conversations:
+        for cut in range(len(history) + 1):
+            expected, actual = reference_extract(history[:cut]), incremental(history[:cut])
+            assert expected == actual, (history[:cut], expected, actual)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--conversations", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(17)
+    corpus = EDGE_CASES + [random_conversation(rng, rng.randint(1, 12)) for _ in range(args.conversations)]
+    check(corpus)
+    print(f"correctness: incremental == reference on {len(corpus)} conversations (every prefix)")
+
+    history = random_conversation(rng, args.turns)
+
+    # Old: every upload re-parses the transcript so far.
+    start = time.perf_counter()
+    for cut in range(1, len(history) + 1):
+        reference_extract(history[:cut])
+    reparse = time.perf_counter() - start
+
+    # New: each turn is fed once; an upload reads the slots.
+    start = time.perf_counter()
+    extractor = EntityExtractor()
+    for msg in history:
+        extractor.feed(msg["user"], msg["assistant"])
+        extractor.copy().slots()
+    incremental_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    reference_extract(history)
+    one_reparse = time.perf_counter() - start
+    start = time.perf_counter()
+    extractor.copy().slots()
+    one_read = time.perf_counter() - start
+
+    print(f"{args.turns}-turn transcript, extraction after every turn:")
+    print(f"  re-parse whole history : {reparse * 1000:8.2f} ms total")
+    print(f"  incremental feed+read  : {incremental_elapsed * 1000:8.2f} ms total")
+    print(f"single finalization at turn {args.turns}: re-parse {one_reparse * 1e6:.1f} us, "
+          f"slot read {one_read * 1e6:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Intent classifier throughput: one predict call per message vs micro-batching.
+
+Issues N classification requests and compares sequential single-sample
+classify() calls with N concurrent predict_many() callers that the service
+coalesces into vectorized batches. Also reports the lazy first-use load time
+and the latency of one predict_many() call with nothing else queued, which
+should not wait out the batch window.
+
+    python benchmarks/bench_intent_batching.py --requests 5000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+for key, value in {
+    "OPENAI_API_KEY": "stub",
+    "GEMINI_API_KEY": "stub",
+    "MONGODB_URI": "mongodb://localhost:27017",
+    "AI_PROVIDER": "openai",
+}.items():
+    os.environ.setdefault(key, value)
+
+from agent.intent import IntentClassifier, TRAINING_DATA
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--window-ms", type=float, default=2.0)
+    parser.add_argument("--max-batch", type=int, default=64)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    texts = [rng.choice(TRAINING_DATA)[0] + rng.choice(["", " please", " now", "!"]) for _ in range(args.requests)]
+
+    start = time.perf_counter()
+    service = IntentClassifier(batch_window=args.window_ms / 1000, max_batch=args.max_batch)
+    service.classify(["hello"])
+    print(f"lazy load + first prediction: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    start = time.perf_counter()
+    single = [service.classify([text])[0] for text in texts]
+    single_elapsed = time.perf_counter() - start
+
+    async def batched_run():
+        return await asyncio.gather(*(service.predict_many([text]) for text in texts))
+
+    start = time.perf_counter()
+    batched = [result[0] for result in asyncio.run(batched_run())]
+    batched_elapsed = time.perf_counter() - start
+
+    async def lone_run():
+        samples = []
+        for text in texts[:200]:
+            start = time.perf_counter()
+            await service.predict_many([text])
+            samples.append(time.perf_counter() - start)
+            # Space the calls out past the window, like sparse traffic.
+            await asyncio.sleep(service.batch_window * 2)
+        return samples
+
+    lone = sorted(asyncio.run(lone_run()))
+
+    assert [label for label, _ in single] == [label for label, _ in batched]
+    print(f"single-sample : {args.requests / single_elapsed:9.0f} predictions/s")
+    print(f"micro-batched : {args.requests / batched_elapsed:9.0f} predictions/s "
+          f"({service.batches} batches, mean size {service.batched_texts / service.batches:.1f})")
+    print(f"lone request  : median {lone[len(lone) // 2] * 1e6:9.0f} us (window {args.window_ms:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Intent pre-routing benchmark.
+
+Sends a mix of deterministic turns (greetings, payment-method choices, bank
+details, complaints) and open-ended turns through process_user_input_async
+with a stubbed provider, then prints the routed share and mean latency of the
+template and LLM paths.
+
+    python benchmarks/bench_intent_routing.py --turns 2000 --latency 0.05
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+for key, value in {
+    "OPENAI_API_KEY": "stub",
+    "GEMINI_API_KEY": "stub",
+    "MONGODB_URI": "mongodb://localhost:27017",
+    "AI_PROVIDER": "openai",
+    "ACCOUNT_NUMBER": "0123456789",
+    "RESPONSE_CACHE_SIZE": "0",
+}.items():
+    os.environ.setdefault(key, value)
+
+import agent.core as core
+
+DETERMINISTIC = [
+    "hello", "hi there", "good morning", "I want to pay with paystack", "paypal please",
+    "can I pay by bank transfer", "send me your account number", "what are your bank details",
+    "I have a complaint", "who do I contact for complaints",
+]
+OPEN_ENDED = [
+    "what is ai", "how much is the premium laptop", "do you deliver on sundays",
+    "I want 2 pizzas delivered to lagos", "hello, I want to buy a laptop", "my name is tunde",
+    "can you recommend something for a birthday", "is the laptop new or used",
+]
+
+
+async def run(turns: int, latency: float, deterministic_share: float) -> None:
+    async def fake_provider(messages, model_name="stub"):
+        await asyncio.sleep(latency)
+        return "stub reply"
+
+    core.get_ai_response_async = fake_provider
+    core.intent_router.classifier.classify(["warm up"])  # the model loads lazily on first use
+    rng = random.Random(5)
+    start = time.perf_counter()
+    for i in range(turns):
+        pool = DETERMINISTIC if rng.random() < deterministic_share else OPEN_ENDED
+        await core.process_user_input_async({"role": "user", "content": rng.choice(pool)}, session_id=f"s{i % 50}")
+    elapsed = time.perf_counter() - start
+
+    stats = core.intent_router.stats()
+    print(f"turns {stats['turns']}  routed share {stats['routed_share']:.1%}  llm turns {stats['llm_turns']}")
+    print(f"routed by intent: {stats['routed']}")
+    print(f"mean latency: template {stats['mean_latency_ms']['template']:.3f} ms, "
+          f"llm {stats['mean_latency_ms']['llm']:.3f} ms (stub provider {latency * 1000:.0f} ms)")
+    print(f"wall time {elapsed:.2f}s vs {turns * latency:.2f}s if every turn hit the provider")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--deterministic-share", type=float, default=0.4)
+    args = parser.parse_args()
+    asyncio.run(run(args.turns, args.latency, args.deterministic_share))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Instrumentation overhead of agent.metrics.
+
+Times a bare ``metrics.stage`` block, ``count`` and ``render``, the same with
+8 threads recording at once, and whole chat turns answered without the LLM
+(intent templates, the cheapest path and so the worst case for relative
+overhead) with metrics enabled and disabled. Turns run in many short rounds,
+alternating enabled and disabled, and the verdict is the median of the
+per-round overheads, with a 95% confidence interval from the order
+statistics. Only an interval entirely under (over) the budget passes (fails);
+otherwise the result is inconclusive and needs more rounds. The budget is
+10 us per stage and 1% of a templated turn.
+
+    python benchmarks/bench_metrics_overhead.py --iterations 200000 --turns 40000 --rounds 400
+"""
+import argparse
+import asyncio
+import gc
+import math
+import os
+import statistics
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+for key, value in {
+    "OPENAI_API_KEY": "stub",
+    "GEMINI_API_KEY": "stub",
+    "MONGODB_URI": "mongodb://localhost:27017",
+    "AI_PROVIDER": "openai",
+}.items():
+    os.environ.setdefault(key, value)
+
+from agent.metrics import Metrics
+
+STAGE_BUDGET_US = 10.0
+TURN_BUDGET = 0.01
+
+
+def per_call(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def stage_block(m: Metrics):
+    def run():
+        with m.stage("prompt_build", provider="OpenAI"):
+            pass
+    return run
+
+
+def contended(m: Metrics, iterations: int, threads: int) -> float:
+    run = stage_block(m)
+    workers = [threading.Thread(target=lambda: [run() for _ in range(iterations // threads)]) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200_000)
+    parser.add_argument("--turns", type=int, default=40_000, help="turns per setting, over all rounds")
+    parser.add_argument("--rounds", type=int, default=400)
+    args = parser.parse_args()
+
+    enabled, disabled = Metrics(enabled=True), Metrics(enabled=False)
+    empty = per_call(lambda: None, args.iterations)
+    stage_on = per_call(stage_block(enabled), args.iterations) - empty
+    stage_off = per_call(stage_block(disabled), args.iterations) - empty
+    count_on = per_call(lambda: enabled.count("llm_fallback", provider="OpenAI"), args.iterations) - empty
+    threaded = contended(Metrics(enabled=True), args.iterations, 8)
+    for stage in ("chat_turn", "prompt_build", "session_load", "session_save", "llm_call",
+                  "llm_first_delta", "entity_extraction", "db_write", "payment_link", "email", "proof_images"):
+        for provider in ("OpenAI", "Gemini"):
+            enabled.observe(stage, 0.01, provider=provider)
+    start = time.perf_counter()
+    text = enabled.render()
+    render_ms = (time.perf_counter() - start) * 1000
+    print(f"stage block   : {stage_on:5.2f} us enabled, {stage_off:5.2f} us disabled "
+          f"(budget {STAGE_BUDGET_US:.0f} us)")
+    print(f"count         : {count_on:5.2f} us")
+    print(f"8 threads     : {threaded:5.2f} us per stage block (wall clock, GIL + lock)")
+    print(f"render        : {render_ms:5.2f} ms for {text.count(chr(10))} lines")
+
+    import agent.core as core
+    from agent.metrics import metrics
+
+    async def turns(n: int) -> float:
+        start = time.perf_counter()
+        for i in range(n):
+            await core.process_user_input_async({"role": "user", "content": "hello"}, "bench", f"bench-{i % 50:04d}")
+        return (time.perf_counter() - start) / n
+
+    async def compare():
+        # Turns go to the LLM until the intent model is loaded; load it up front, then warm up.
+        core.classifier.model
+        await turns(50)
+        per_round = max(1, args.turns // args.rounds)
+        overheads, on, off = [], [], []
+        for i in range(args.rounds):
+            # Alternate which setting goes first so drift does not favour either.
+            times = {}
+            for state in ((True, False) if i % 2 == 0 else (False, True)):
+                metrics.enabled = state
+                # Collections land in whichever half they like; keep them out of the timings.
+                gc.collect()
+                gc.disable()
+                try:
+                    times[state] = await turns(per_round)
+                finally:
+                    gc.enable()
+            metrics.enabled = True
+            on.append(times[True])
+            off.append(times[False])
+            overheads.append((times[True] - times[False]) / times[False])
+        return overheads, statistics.median(on), statistics.median(off), per_round * args.rounds + 50
+
+    before = sum(s["count"] for s in metrics.snapshot().values())
+    overheads, on, off, recorded_turns = asyncio.run(compare())
+    stages_per_turn = (sum(s["count"] for s in metrics.snapshot().values()) - before) / recorded_turns
+    measured = statistics.median(overheads)
+    # Distribution-free 95% interval for the median: order statistics n/2 -/+ 1.96 sqrt(n)/2.
+    ranked = sorted(overheads)
+    spread = math.ceil(1.96 * math.sqrt(len(ranked)) / 2)
+    low = ranked[max(0, len(ranked) // 2 - spread)]
+    high = ranked[min(len(ranked) - 1, len(ranked) // 2 + spread)]
+    if high <= TURN_BUDGET:
+        verdict = "within budget"
+    elif low > TURN_BUDGET:
+        verdict = "OVER budget"
+    else:
+        verdict = "inconclusive, raise --rounds"
+    print(f"templated turn: {on * 1e6:7.1f} us with metrics, {off * 1e6:7.1f} us without, "
+          f"{stages_per_turn:.1f} stages per turn")
+    print(f"overhead      : {measured:+.2%} measured (95% CI {low:+.2%} .. {high:+.2%}, {len(ranked)} rounds) "
+          f"(budget {TURN_BUDGET:.0%}) -> {verdict}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Order read API: precomputed stats vs an aggregation per request, keyset vs offset pages.
+
+Preloads N orders spread over --days days and a few sites, builds the per-day,
+per-site stats documents once (rebuild_stats), then times:
+
+- 30-day revenue/volume per day and per site from an aggregation pipeline
+  over the orders vs OrderRepository.stats reading the stats documents;
+- fetching page P of 50 with skip/limit vs list_orders with a keyset cursor;
+- confirming an order with and without the stats increment, the write cost
+  the precomputed stats add.
+
+    python benchmarks/bench_order_queries.py --mongo-uri mongodb://localhost:27017 --orders 1000000
+
+or a small functional pass on mongomock (no real indexes, so only the
+counts and the relative shape mean anything):
+
+    python benchmarks/bench_order_queries.py --mongomock --orders 20000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+for key, value in {
+    "OPENAI_API_KEY": "stub",
+    "GEMINI_API_KEY": "stub",
+    "MONGODB_URI": "mongodb://localhost:27017",
+    "AI_PROVIDER": "openai",
+}.items():
+    os.environ.setdefault(key, value)
+
+from agent.orders import LIST_ORDER, OrderRepository, PAID_STATUS
+
+SOURCES = ["https://shop.example.com/p/1", "https://lagos.example.ng/", "Unknown", "https://instagram.com/x"]
+
+
+def historical_orders(count: int, days: int):
+    now = datetime.utcnow()
+    for i in range(count):
+        created_at = now - timedelta(seconds=i * days * 86400 / count)
+        yield {
+            "order_number": f"H{i:09d}",
+            "item": "Pizza",
+            "price": 150 if i % 5 == 0 else 99,
+            "status": PAID_STATUS if i % 4 else "pending_payment",
+            "source_website": SOURCES[i % len(SOURCES)],
+            "created_at": created_at,
+            "updated_at": created_at,
+        }
+
+
+def timed(fn, repeat: int) -> tuple:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return samples, result
+
+
+def report(label: str, samples: list) -> None:
+    print(f"{label:<36}: median {statistics.median(samples) * 1000:9.2f} ms   max {max(samples) * 1000:9.2f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mongo-uri")
+    parser.add_argument("--mongomock", action="store_true")
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--page", type=int, default=100, help="page number to fetch (50 orders per page)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.mongomock:
+        import mongomock
+
+        client = mongomock.MongoClient()
+    elif args.mongo_uri:
+        from pymongo import MongoClient
+
+        client = MongoClient(args.mongo_uri)
+    else:
+        parser.error("pass --mongo-uri or --mongomock")
+
+    db = client["bench_order_queries"]
+    client.drop_database(db.name)
+    try:
+        repository = OrderRepository(db["orders"], db["order_stats"])
+        repository.ensure_indexes()
+        repository.bulk_ingest(historical_orders(args.orders, args.days))
+        start = time.perf_counter()
+        documents = repository.rebuild_stats()
+        rebuild = time.perf_counter() - start
+
+        until = datetime.utcnow().date()
+        since = until - timedelta(days=29)
+        pipeline = [
+            {"$match": {"created_at": {"$gte": datetime.combine(since, datetime.min.time())}}},
+            {"$group": {
+                "_id": {"day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
+                        "source": "$source_website"},
+                "orders": {"$sum": 1},
+                "paid_orders": {"$sum": {"$cond": [{"$eq": ["$status", PAID_STATUS]}, 1, 0]}},
+                "revenue": {"$sum": {"$cond": [{"$eq": ["$status", PAID_STATUS]}, "$price", 0]}},
+            }},
+        ]
+        aggregate_samples, groups = timed(lambda: list(repository.collection.aggregate(pipeline)), args.repeat)
+        stats_samples, stats = timed(lambda: repository.stats(since.isoformat(), until.isoformat()), args.repeat)
+
+        skip = (args.page - 1) * 50
+        offset_samples, offset_page = timed(
+            lambda: list(repository.collection.find({}, {"_id": 0, "outbox": 0}).sort(LIST_ORDER).skip(skip).limit(50)),
+            args.repeat,
+        )
+        # The cursor a client would hold after reading the previous pages.
+        after = None
+        if skip:
+            previous = next(iter(repository.collection.find({}, {"created_at": 1, "order_number": 1})
+                                 .sort(LIST_ORDER).skip(skip - 1).limit(1)), None)
+            after = (previous["created_at"], previous["order_number"]) if previous else None
+        keyset_samples, (keyset_page, _) = timed(lambda: repository.list_orders(50, after), args.repeat)
+
+        plain = OrderRepository(db["orders"])
+
+        def confirm(repo, prefix):
+            for i in range(50):
+                repo.add_order({"order_number": f"{prefix}{i}", "item": "Pizza", "price": 99, "status": PAID_STATUS,
+                                "source_website": SOURCES[i % 4], "created_at": datetime.utcnow()}, ["owner_email"])
+
+        plain_samples, _ = timed(lambda: confirm(plain, f"P{time.perf_counter_ns()}-"), args.repeat)
+        counted_samples, _ = timed(lambda: confirm(repository, f"C{time.perf_counter_ns()}-"), args.repeat)
+
+        print(f"orders                              : {args.orders:,} over {args.days} days")
+        print(f"rebuild_stats                       : {rebuild:8.2f} s ({documents} stats documents)")
+        report("30-day stats, aggregation", aggregate_samples)
+        report("30-day stats, precomputed", stats_samples)
+        same = sum(g["orders"] for g in groups) == stats["totals"]["orders"]
+        print(f"same 30-day order count both ways   : {same}")
+        report(f"page {args.page}, skip/limit", offset_samples)
+        report(f"page {args.page}, keyset cursor", keyset_samples)
+        same = [o["order_number"] for o in offset_page] == [o["order_number"] for o in keyset_page]
+        print(f"same page both ways                 : {same}")
+        report("50 confirmations, no stats", plain_samples)
+        report("50 confirmations, with stats", counted_samples)
+    finally:
+        client.drop_database(db.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Order write path: insert + unindexed update vs one indexed upsert.
+
+Preloads N historical orders, then times confirming K orders the old way
+(insert_one, then update_one on order_number with no index) and through
+OrderRepository (one upsert on the unique order_number index). Also reports
+bulk_ingest throughput for the preload and, on a real server, the query plan
+of an order_number lookup.
+
+Point it at a throwaway database on a local mongod:
+
+    python benchmarks/bench_order_writes.py --mongo-uri mongodb://localhost:27017 --orders 1000000
+
+or run a small functional pass on mongomock, which keeps documents in Python
+lists and enforces unique indexes by scanning, so its timings say nothing
+about index behaviour:
+
+    python benchmarks/bench_order_writes.py --mongomock --orders 2000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+for key, value in {
+    "OPENAI_API_KEY": "stub",
+    "GEMINI_API_KEY": "stub",
+    "MONGODB_URI": "mongodb://localhost:27017",
+    "AI_PROVIDER": "openai",
+}.items():
+    os.environ.setdefault(key, value)
+
+from agent.orders import OrderRepository, PAID_STATUS
+
+SOURCES = ["shop.example.com", "lagos.example.ng", "Direct", "instagram"]
+
+
+def historical_orders(count: int):
+    for i in range(count):
+        yield {
+            "order_number": f"H{i:09d}",
+            "item": "Pizza" if i % 3 else "Laptop",
+            "customer": None,
+            "price": 99,
+            "status": PAID_STATUS if i % 4 else "pending_payment",
+            "source_website": SOURCES[i % len(SOURCES)],
+            "created_at": datetime.utcnow(),
+        }
+
+
+def new_order(i: int) -> dict:
+    return {"order_number": f"N{i:09d}", "item": "Pizza", "price": 99, "status": PAID_STATUS,
+            "proof_url": f"/uploads/{i}.jpg", "source_website": "Direct", "created_at": datetime.utcnow()}
+
+
+def timed(fn, count: int) -> list:
+    samples = []
+    for i in range(count):
+        start = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mongo-uri", help="mongod to benchmark against (a scratch database is created and dropped)")
+    parser.add_argument("--mongomock", action="store_true", help="use mongomock instead of a server")
+    parser.add_argument("--orders", type=int, default=1_000_000, help="historical orders preloaded")
+    parser.add_argument("--confirmations", type=int, default=200, help="orders confirmed per write path")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.mongomock:
+        import mongomock
+
+        client = mongomock.MongoClient()
+    elif args.mongo_uri:
+        from pymongo import MongoClient
+
+        client = MongoClient(args.mongo_uri)
+    else:
+        parser.error("pass --mongo-uri or --mongomock")
+
+    db = client["bench_order_writes"]
+    client.drop_database(db.name)
+    try:
+        legacy = db["orders_legacy"]
+        repository = OrderRepository(db["orders"])
+        repository.ensure_indexes()
+
+        start = time.perf_counter()
+        counts = repository.bulk_ingest(historical_orders(args.orders), batch_size=args.batch_size)
+        ingest = time.perf_counter() - start
+        rerun = repository.bulk_ingest(historical_orders(min(args.orders, 10_000)), batch_size=args.batch_size)
+        legacy.insert_many(historical_orders(args.orders), ordered=False)
+
+        def legacy_confirm(i):
+            order = new_order(i)
+            legacy.insert_one(dict(order, status="pending_payment", proof_url=None))
+            legacy.update_one({"order_number": order["order_number"]},
+                              {"$set": {"status": PAID_STATUS, "proof_url": order["proof_url"]}})
+
+        def repository_confirm(i):
+            repository.add_order(new_order(i), ["payment_link", "owner_email"])
+
+        legacy_samples = timed(legacy_confirm, args.confirmations)
+        repository_samples = timed(repository_confirm, args.confirmations)
+        duplicates = sum(repository.add_order(new_order(i), ["owner_email"]) for i in range(10))
+
+        print(f"preloaded orders                 : {args.orders:,}")
+        print(f"bulk_ingest                      : {ingest:8.2f} s ({counts['inserted'] / ingest:,.0f} orders/s)")
+        print(f"bulk_ingest re-run               : {rerun['inserted']} inserted, {rerun['skipped']:,} skipped")
+        for label, samples in (("insert + unindexed update", legacy_samples),
+                               ("one indexed upsert", repository_samples)):
+            p95 = sorted(samples)[int(len(samples) * 0.95) - 1]
+            print(f"{label:<33}: mean {statistics.mean(samples) * 1000:8.3f} ms   p95 {p95 * 1000:8.3f} ms")
+        print(f"resubmitted confirmations queued : {duplicates} (expect 0)")
+
+        if not args.mongomock:
+            for label, collection in (("legacy", legacy), ("repository", repository.collection)):
+                plan = collection.find({"order_number": "N000000001"}).explain()["queryPlanner"]["winningPlan"]
+                while "inputStage" in plan:
+                    plan = plan["inputStage"]
+                print(f"order_number lookup plan ({label}): {plan['stage']}")
+    finally:
+        client.drop_database(db.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Owner notifications: one email per order vs a digest.
+
+Confirms N orders (a --high-value share priced above the immediate threshold)
+into a mongomock orders collection, delivers their owner_email outbox tasks
+with OutboxWorker, then flushes the digest, with owner emails going over SMTP
+to the local sink from fake_smtp.py (each message held --latency seconds, like
+a slow relay or API call). Runs once with OWNER_DIGEST_WINDOW_SECONDS=0 (every
+order emailed on its own, the old behaviour) and once with a digest, and
+reports emails sent, time spent sending, and that every order reached the
+owner exactly once. Keep --concurrency at 1: mongomock is not thread-safe,
+so concurrent outbox claims on it can deliver a task twice.
+
+    python benchmarks/bench_owner_notifications.py --orders 500 --latency 0.3
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+for key, value in {
+    "OPENAI_API_KEY": "stub",
+    "GEMINI_API_KEY": "stub",
+    "MONGODB_URI": "mongodb://localhost:27017",
+    "AI_PROVIDER": "openai",
+}.items():
+    os.environ.setdefault(key, value)
+
+import mongomock
+
+from agent.notifications import OwnerNotifier, SmtpTransport
+from agent.orders import OrderRepository, PAID_STATUS
+from agent.outbox import MongoOutboxStore, OutboxWorker
+from benchmarks.fake_providers import free_port
+from benchmarks.fake_smtp import serve_smtp_in_thread
+
+
+def confirmed_orders(count: int, high_value: float, threshold: float, seed: int):
+    rng = random.Random(seed)
+    for i in range(count):
+        yield {
+            "order_number": f"N{i:06d}",
+            "item": "Laptop" if i % 7 == 0 else "Pizza",
+            "customer": f"Customer {i} <b>& co</b>",
+            "email": f"c{i}@example.com",
+            "phone_number": "+2348000000000",
+            "address": f"{i} Allen Avenue, Ikeja",
+            "price": threshold + 100 if rng.random() < high_value else 99,
+            "delivery_time": "tomorrow 10 AM",
+            "payment_method": "paystack",
+            "source_website": "https://shop.example.ng/",
+            "status": PAID_STATUS,
+            "proof_url": f"/static/uploads/{i:064x}.png",
+            "created_at": datetime.utcnow(),
+        }
+
+
+async def run(args, digest_window: float) -> dict:
+    port = free_port()
+    sink = serve_smtp_in_thread(port, args.latency)
+    transport = SmtpTransport("127.0.0.1", port, "bot@example.com", "owner@example.com", starttls=False)
+    collection = mongomock.MongoClient()["bench"]["orders"]
+    repository = OrderRepository(collection)
+    repository.ensure_indexes()
+    notifier = OwnerNotifier(collection, transport, digest_window=digest_window,
+                             immediate_min_price=args.threshold, max_digest_orders=args.max_digest,
+                             public_base_url="https://assistant.example.ng")
+    worker = OutboxWorker(MongoOutboxStore(collection), {"owner_email": notifier.notify},
+                          concurrency=args.concurrency)
+    orders = list(confirmed_orders(args.orders, args.high_value, args.threshold, args.seed))
+    for order in orders:
+        repository.add_order(order, ["owner_email"])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker.run_until_idle() for _ in range(args.concurrency)))
+    outbox_s = time.perf_counter() - start
+    flushed = await asyncio.to_thread(notifier.flush)
+    total_s = time.perf_counter() - start
+
+    mentions = {}
+    for message in sink.messages:
+        body = message.get_body(("html",)).get_content()
+        for order in orders:
+            if f">{order['order_number']}<" in body or f" {order['order_number']}<" in body:
+                mentions[order["order_number"]] = mentions.get(order["order_number"], 0) + 1
+    return {
+        "emails": len(sink.messages),
+        "digested": flushed,
+        "outbox_s": outbox_s,
+        "total_s": total_s,
+        "exactly_once": sum(1 for order in orders if mentions.get(order["order_number"]) == 1),
+        "notified": collection.count_documents({"owner_notified_at": {"$exists": True}}),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--orders", type=int, default=500)
+    parser.add_argument("--high-value", type=float, default=0.05, help="share of orders emailed immediately")
+    parser.add_argument("--threshold", type=float, default=500)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds the SMTP sink takes per message")
+    parser.add_argument("--concurrency", type=int, default=1, help="outbox workers")
+    parser.add_argument("--max-digest", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"{args.orders} confirmed orders, {args.high_value:.0%} at or above {args.threshold}, "
+          f"SMTP {args.latency * 1000:.0f} ms per message, {args.concurrency} outbox workers")
+    print(f"{'mode':>10}{'emails':>8}{'digested':>10}{'outbox s':>10}{'total s':>9}{'notified':>10}  once each")
+    for label, window in (("per order", 0.0), ("digest", 300.0)):
+        r = asyncio.run(run(args, window))
+        print(f"{label:>10}{r['emails']:8d}{r['digested']:10d}{r['outbox_s']:10.2f}{r['total_s']:9.2f}"
+              f"{r['notified']:10d}  {r['exactly_once']}/{args.orders}")
+
+
+if __name__ == "__main__":
+    main()
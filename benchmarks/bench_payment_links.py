@@ -0,0 +1,116 @@
+"""
+Payment links: fresh client per call vs pooled gateways with a link cache.
+
+Runs the fake Stripe/Paystack/PayPal server from fake_payments.py and reports
+per-link latency and connections opened for a new HTTP client per order (what
+the SDK calls did) vs the shared pooled clients, checkouts created when the
+same order asks for its link repeatedly or concurrently, showing three
+providers at once sequentially vs in parallel, and how long a hung provider
+holds a caller.
+
+    python benchmarks/bench_payment_links.py --orders 50 --latency 0.15
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+for key, value in {
+    "OPENAI_API_KEY": "stub",
+    "GEMINI_API_KEY": "stub",
+    "MONGODB_URI": "mongodb://localhost:27017",
+    "AI_PROVIDER": "openai",
+}.items():
+    os.environ.setdefault(key, value)
+
+from agent.payments import PaymentLinks, PayPalGateway, PaystackGateway, StripeGateway
+from benchmarks.fake_payments import FakePaymentConfig, build_app
+from benchmarks.fake_providers import free_port, serve_in_thread
+
+METHODS = ["stripe", "paystack", "paypal"]
+
+
+def gateways(base_url: str, timeout: float = 10.0) -> dict:
+    return {
+        "stripe": StripeGateway("sk_test_stub", base_url=base_url, timeout=timeout),
+        "paystack": PaystackGateway("sk_test_stub", base_url=base_url, timeout=timeout),
+        "paypal": PayPalGateway("client", "secret", base_url=base_url, timeout=timeout),
+    }
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--orders", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.15, help="fake provider latency in seconds")
+    parser.add_argument("--refreshes", type=int, default=5, help="repeat requests per order")
+    parser.add_argument("--timeout", type=float, default=0.5, help="gateway timeout for the hung-provider run")
+    args = parser.parse_args()
+
+    config = FakePaymentConfig(latency=args.latency)
+    port = free_port()
+    server = serve_in_thread(build_app(config), port)
+    base_url = f"http://127.0.0.1:{port}"
+
+    # Fresh client per order, no cache.
+    fresh = []
+    for i in range(args.orders):
+        gateway = StripeGateway("sk_test_stub", base_url=base_url)
+        fresh.append(timed(lambda: gateway.create_link(f"F{i}", 9900, None, idempotency_key=f"F{i}:9900")))
+        gateway.close()
+    fresh_connections = len(config.connections)
+
+    # Shared pooled clients.
+    config.reset()
+    links = PaymentLinks(gateways(base_url))
+    pooled = [timed(lambda: links.get_link("stripe", f"P{i}", 99)) for i in range(args.orders)]
+    pooled_connections = len(config.connections)
+
+    # The same order asking again (page refresh, retried upload), sequentially and concurrently.
+    config.reset()
+    for _ in range(args.refreshes):
+        for i in range(args.orders):
+            links.get_link("stripe", f"P{i}", 99)
+    refresh_checkouts = config.checkouts["stripe"]
+    threads = [threading.Thread(target=links.get_link, args=("paystack", "R1", 99)) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    concurrent_checkouts = config.checkouts["paystack"]
+
+    # Three providers shown at once.
+    sequential = timed(lambda: [links.get_link(m, "S1", 99) for m in METHODS])
+    parallel = timed(lambda: links.get_links(METHODS, "S2", 99))
+
+    # A provider that never answers.
+    config.hang = True
+    hung_links = PaymentLinks(gateways(base_url, timeout=args.timeout))
+    hung = timed(lambda: hung_links.get_link("stripe", "H1", 99))
+    config.hang = False
+
+    print(f"fresh client per link  : mean {statistics.mean(fresh) * 1000:7.1f} ms, "
+          f"{fresh_connections} connections for {args.orders} links")
+    print(f"pooled gateway         : mean {statistics.mean(pooled) * 1000:7.1f} ms, "
+          f"{pooled_connections} connections for {args.orders} links")
+    print(f"{args.refreshes} refreshes x {args.orders} orders : {refresh_checkouts} new checkouts (cache {links.stats()})")
+    print(f"10 concurrent requests : {concurrent_checkouts} checkout created")
+    print(f"3 providers at once    : sequential {sequential * 1000:6.1f} ms, parallel {parallel * 1000:6.1f} ms")
+    print(f"hung provider          : caller released after {hung:.2f} s (timeout {args.timeout} s)")
+
+    links.close()
+    hung_links.close()
+    server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
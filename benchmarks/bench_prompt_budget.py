@@ -0,0 +1,157 @@
+"""
+Prompt assembly: full history vs token-budgeted prompts.
+
+Replays scripted order conversations (long assistant replies, order details
+spread over many turns) and, for every turn, builds the prompt the old way
+(system prompt + all stored history + eager Gemini conversion) and with
+PromptBuilder. Reports prompt tokens, assembly time, whether the order details
+given so far are still in the prompt, and end-to-end latency against the fake
+OpenAI server with a per-prompt-token prefill cost.
+
+    python benchmarks/bench_prompt_budget.py --conversations 40 --budget 1500
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+for key, value in {
+    "OPENAI_API_KEY": "stub",
+    "GEMINI_API_KEY": "stub",
+    "MONGODB_URI": "mongodb://localhost:27017",
+    "AI_PROVIDER": "openai",
+}.items():
+    os.environ.setdefault(key, value)
+
+from google.genai.types import Content, Part
+
+import agent.core as core
+from agent.prompt import PromptBuilder, count_tokens
+from benchmarks.fake_providers import FakeLLMConfig, build_app, free_port, point_core_at, serve_in_thread
+
+DETAILS = [
+    "I'd like to order a laptop please",
+    "My phone number is +234 803 555 0199",
+    "You can email me at ada.customer@example.com",
+    "Please deliver to 14 Marina Road Lagos",
+    "I will pay by bank transfer",
+]
+CHATTER = [
+    "Can you tell me more about the specs?",
+    "Is there a warranty on it?",
+    "How long does delivery usually take to my area?",
+    "Do you have it in another colour?",
+    "What happens if it arrives damaged?",
+    "Can I change the delivery time later?",
+    "Is the price negotiable at all?",
+]
+FILLER = (
+    "Thank you for your question. Our laptops come with a one year manufacturer warranty that covers "
+    "hardware faults, and we inspect every unit before dispatch. Delivery within Lagos usually takes "
+    "one to two working days, and we will call you before the rider arrives. If anything arrives damaged "
+    "we replace it at no cost once you send us a photo within 48 hours. "
+)
+
+
+def conversation(seed: int, turns: int) -> list:
+    rng = random.Random(seed)
+    users = DETAILS[:1] + rng.sample(CHATTER, k=min(len(CHATTER), turns)) + DETAILS[1:]
+    rng.shuffle(users[1:])
+    users = (users * 2)[:turns]
+    return [{"user": u, "assistant": FILLER * rng.randint(1, 3)} for u in users]
+
+
+def old_build(user_input_data: dict, history: list) -> list:
+    system_prompt = f"""
+You are a professional business assistant taking orders. Collect all details (item, price, address, customer name, email, phone number, and payment method).
+Available payment methods are PayPal, Paystack, and Bank Transfer.
+Once a method is chosen, provide specific details (e.g., a link or account number . if its bank transfer bank details in .env should be detect and show it to customer).
+After details are provided, the user will upload a payment proof via the website interface.
+CRITICAL RULE: Immediately after the user uploads their proof (which the system handles in the backend), you must provide the final confirmation message with the order number. Do not ask any more questions.
+"""
+    messages = [{"role": "system", "content": system_prompt}]
+    for h in history:
+        messages.append({"role": "user", "content": h["user"]})
+        messages.append({"role": "assistant", "content": h["assistant"]})
+    messages.append(user_input_data)
+    # The old get_ai_response converted every prompt for Gemini before trying OpenAI.
+    [Content(role="user" if m["role"] == "user" else "model", parts=[Part.from_text(text=m["content"])])
+     for m in messages]
+    return messages
+
+
+def tokens(messages: list) -> int:
+    return sum(count_tokens(m["content"]) + 4 for m in messages)
+
+
+def details_kept(messages: list, history: list) -> bool:
+    """Every phone/email/address the customer gave is still somewhere in the prompt."""
+    text = " ".join(m["content"] for m in messages).lower()
+    needles = {"803 555 0199": "phone", "ada.customer@example.com": "email", "14 marina road": "address"}
+    given = [n for n in needles if any(n in t["user"].lower() for t in history)]
+    return all(n in text for n in given)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--conversations", type=int, default=40)
+    parser.add_argument("--turns", type=int, default=14)
+    parser.add_argument("--history-size", type=int, default=10, help="turns kept by the session store")
+    parser.add_argument("--budget", type=int, default=1500, help="history token budget")
+    parser.add_argument("--prefill-ms-per-1k", type=float, default=150.0)
+    parser.add_argument("--samples", type=int, default=40, help="turns sent to the fake provider per mode")
+    args = parser.parse_args()
+
+    builder = PromptBuilder(core.SYSTEM_PROMPT, history_token_budget=args.budget)
+    results = {"before": {"tokens": [], "seconds": [], "kept": [], "prompts": []},
+               "after": {"tokens": [], "seconds": [], "kept": [], "prompts": []}}
+    for c in range(args.conversations):
+        turns = conversation(c, args.turns)
+        for i in range(1, len(turns)):
+            history = turns[max(0, i - args.history_size):i]
+            user_input = {"role": "user", "content": turns[i]["user"]}
+            for mode, build in (("before", old_build), ("after", builder.build)):
+                start = time.perf_counter()
+                messages = build(user_input, history)
+                results[mode]["seconds"].append(time.perf_counter() - start)
+                results[mode]["tokens"].append(tokens(messages))
+                results[mode]["kept"].append(details_kept(messages, turns[:i]))
+                results[mode]["prompts"].append(messages)
+
+    config = FakeLLMConfig(first_token_delay=0.2, token_delay=0.0,
+                           prompt_token_delay=args.prefill_ms_per_1k / 1000 / 1000)
+    port = free_port()
+    server = serve_in_thread(build_app(config), port)
+    point_core_at(f"http://127.0.0.1:{port}")
+
+    async def replay(prompts):
+        latencies = []
+        for messages in prompts:
+            start = time.perf_counter()
+            await core.get_ai_response_async(messages)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    async def replay_all():
+        # One event loop for both modes, so the async OpenAI client keeps its connections.
+        step = max(1, len(results["before"]["prompts"]) // args.samples)
+        return {mode: await replay(data["prompts"][::step]) for mode, data in results.items()}
+
+    all_latencies = asyncio.run(replay_all())
+    for mode, data in results.items():
+        latencies = all_latencies[mode]
+        p95 = sorted(data["tokens"])[int(len(data["tokens"]) * 0.95) - 1]
+        print(f"{mode:<6}: prompt tokens mean {statistics.mean(data['tokens']):7.0f}  p95 {p95:6d}   "
+              f"assembly {statistics.mean(data['seconds']) * 1e6:6.1f} us   "
+              f"details kept {sum(data['kept']) / len(data['kept']):6.1%}   "
+              f"end-to-end {statistics.mean(latencies) * 1000:6.1f} ms")
+    server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
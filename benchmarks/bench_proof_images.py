@@ -0,0 +1,89 @@
+"""
+Proof image processing throughput per core count.
+
+Synthesizes phone-camera-sized JPEGs (with EXIF orientation and GPS tags),
+renders the compact and thumbnail variants with agent.images.render_variants
+on process pools of 1..N workers, and reports images per second, output sizes
+and that no EXIF survives. Uses the real uploads/ photos instead with --uploads.
+
+    python benchmarks/bench_proof_images.py --images 48 --workers 1,2,4
+"""
+import argparse
+import glob
+import io
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+for key, value in {
+    "OPENAI_API_KEY": "stub",
+    "GEMINI_API_KEY": "stub",
+    "MONGODB_URI": "mongodb://localhost:27017",
+    "AI_PROVIDER": "openai",
+}.items():
+    os.environ.setdefault(key, value)
+
+from agent.images import VARIANTS, render_variants
+
+
+def phone_photo(seed: int, size=(4032, 3024)) -> bytes:
+    from PIL import Image
+
+    rng = random.Random(seed)
+    # Smooth gradients plus noise compress like a photo of a receipt, not like flat colour.
+    image = Image.linear_gradient("L").resize(size).convert("RGB")
+    noise = Image.effect_noise(size, rng.uniform(20, 40)).convert("RGB")
+    image = Image.blend(image, noise, 0.35)
+    exif = Image.Exif()
+    exif[0x0112] = 6  # orientation: rotate 90 CW
+    exif[0x8825] = {1: "N", 2: (6.0, 27.0, 0.0), 3: "E", 4: (3.0, 23.0, 0.0)}  # GPS
+    out = io.BytesIO()
+    image.save(out, "JPEG", quality=92, exif=exif)
+    return out.getvalue()
+
+
+def has_exif(data: bytes) -> bool:
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        return bool(image.getexif())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--images", type=int, default=48)
+    parser.add_argument("--workers", default=",".join(str(n) for n in sorted({1, 2, 4, os.cpu_count() or 1})),
+                        help="comma-separated pool sizes")
+    parser.add_argument("--uploads", action="store_true", help="use the photos in uploads/ instead")
+    args = parser.parse_args()
+
+    if args.uploads:
+        paths = [p for p in glob.glob(os.path.join(ROOT, "uploads", "*")) if os.path.isfile(p)]
+        originals = [open(paths[i % len(paths)], "rb").read() for i in range(args.images)]
+    else:
+        originals = [phone_photo(i) for i in range(min(args.images, 8))]
+        originals = [originals[i % len(originals)] for i in range(args.images)]
+
+    sample = render_variants(originals[0])
+    print(f"original {statistics.mean(len(o) for o in originals) / 1024:8.0f} KB -> "
+          + ", ".join(f"{name} {len(sample[name]) / 1024:.0f} KB" for name in VARIANTS)
+          + f"; EXIF left: {any(has_exif(data) for data in sample.values())}")
+
+    context = multiprocessing.get_context("spawn")
+    for workers in sorted(int(n) for n in args.workers.split(",")):
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            list(pool.map(render_variants, originals[:workers]))  # start the workers
+            start = time.perf_counter()
+            list(pool.map(render_variants, originals))
+            elapsed = time.perf_counter() - start
+        print(f"{workers:2d} worker(s): {args.images / elapsed:7.1f} images/s ({elapsed:6.2f} s for {args.images})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Proof storage: uuid-named copies vs content-addressed storage.
+
+Uploads R distinct receipts, each K times (retries, customers re-sending the
+same screenshot), through the old uuid naming and through the local and GCS
+content-addressed backends (GCS against the fake emulator in fake_gcs.py), then
+has the owner view every proof V times with a browser-like cache. Reports
+files and bytes stored, and requests and bytes served for the repeat views.
+
+    python benchmarks/bench_proof_storage.py --receipts 20 --copies 5 --views 10
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+for key, value in {
+    "OPENAI_API_KEY": "stub",
+    "GEMINI_API_KEY": "stub",
+    "MONGODB_URI": "mongodb://localhost:27017",
+    "AI_PROVIDER": "openai",
+}.items():
+    os.environ.setdefault(key, value)
+
+import httpx
+from starlette.staticfiles import StaticFiles
+
+from benchmarks.fake_gcs import FakeGCS, build_app
+from benchmarks.fake_providers import free_port, serve_in_thread
+
+
+class BrowserCache:
+    """Enough of a browser HTTP cache: fresh immutable responses are reused, others revalidated."""
+
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        self.entries = {}
+        self.requests = 0
+        self.bytes = 0
+
+    async def view(self, url: str) -> None:
+        cached = self.entries.get(url)
+        if cached is not None and "immutable" in cached.get("cache-control", ""):
+            return
+        headers = {"if-none-match": cached["etag"]} if cached is not None and "etag" in cached else {}
+        response = await self.client.get(url, headers=headers)
+        self.requests += 1
+        self.bytes += len(response.content)
+        if response.status_code == 200:
+            self.entries[url] = response.headers
+
+
+def disk_usage(root: str) -> tuple:
+    files = size = 0
+    for directory, _, names in os.walk(root):
+        for name in names:
+            files += 1
+            size += os.path.getsize(os.path.join(directory, name))
+    return files, size
+
+
+async def views(app, urls, repeats: int) -> BrowserCache:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://owner") as client:
+        cache = BrowserCache(client)
+        for _ in range(repeats):
+            for url in urls:
+                await cache.view(url)
+    return cache
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--receipts", type=int, default=20)
+    parser.add_argument("--copies", type=int, default=5, help="times each receipt is uploaded")
+    parser.add_argument("--views", type=int, default=10, help="times the owner opens each proof")
+    parser.add_argument("--size-kb", type=int, default=400)
+    args = parser.parse_args()
+
+    gcs = FakeGCS()
+    port = free_port()
+    server = serve_in_thread(build_app(gcs), port)
+    os.environ["STORAGE_EMULATOR_HOST"] = f"http://127.0.0.1:{port}"
+
+    from agent.storage import GCSProofStorage, LocalProofStorage
+
+    receipts = [b"\xff\xd8\xff\xe0" + os.urandom(args.size_kb * 1024) for _ in range(args.receipts)]
+    root = tempfile.mkdtemp(prefix="bench_proof_storage_")
+    try:
+        # Old scheme: every upload is a new uuid-named file, served by plain StaticFiles.
+        legacy_dir = os.path.join(root, "legacy")
+        os.makedirs(legacy_dir)
+        legacy_urls = []
+        for data in receipts:
+            for _ in range(args.copies):
+                name = f"{uuid.uuid4()}_receipt.jpg"
+                with open(os.path.join(legacy_dir, name), "wb") as f:
+                    f.write(data)
+                legacy_urls.append(f"/{name}")
+        legacy_views = asyncio.run(views(StaticFiles(directory=legacy_dir), legacy_urls, args.views))
+        print(f"uuid copies   : {disk_usage(legacy_dir)[0]:4d} files, {disk_usage(legacy_dir)[1] / 2**20:7.1f} MB stored; "
+              f"{legacy_views.requests:5d} requests, {legacy_views.bytes / 2**20:7.1f} MB served for repeat views")
+
+        for label, storage in (("local", LocalProofStorage(os.path.join(root, "local"))),
+                               ("gcs emulator", GCSProofStorage("proofs", os.path.join(root, "gcs-staging")))):
+            urls, created = [], 0
+            for data in receipts:
+                digest = hashlib.sha256(data).hexdigest()
+                for _ in range(args.copies):
+                    staged = os.path.join(storage.staging_dir, f".{uuid.uuid4().hex}.part")
+                    with open(staged, "wb") as f:
+                        f.write(data)
+                    key, new = storage.save(staged, digest, "image/jpeg")
+                    created += new
+                    urls.append(f"/{key}")
+            owner = asyncio.run(views(storage.asgi_app(), urls, args.views))
+            if label == "local":
+                files, size = disk_usage(storage.root)
+            else:
+                files, size = gcs.uploads, gcs.bytes_in
+            print(f"{label:<14}: {files:4d} files, {size / 2**20:7.1f} MB stored ({created} new of "
+                  f"{len(urls)} uploads); {owner.requests:5d} requests, {owner.bytes / 2**20:7.1f} MB served")
+        print(f"gcs emulator  : {gcs.duplicates} duplicate uploads rejected by ifGenerationMatch, "
+              f"{gcs.bytes_out / 2**20:.1f} MB read from the bucket")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
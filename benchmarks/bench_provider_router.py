@@ -0,0 +1,121 @@
+"""
+LLM provider routing under injected latency and errors.
+
+Runs the same chat turns against the fake OpenAI/Gemini servers in several
+fault scenarios (healthy, slow tail, jittery OpenAI, hung OpenAI, failing
+OpenAI, slower OpenAI) with three routing setups:
+
+  before  OpenAI, then Gemini only after an error; no timeout (the old fallback)
+  router  per-provider timeout, circuit breaker, latency-aware ordering
+  hedged  router plus a hedged Gemini call when OpenAI runs past its p95 or
+          Gemini's median (LLM_HEDGE_MIN_MS..LLM_HEDGE_MAX_MS)
+
+and reports latency percentiles, failed turns and where the calls went.
+
+    python benchmarks/bench_provider_router.py --turns 200 --concurrency 20
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+for key, value in {
+    "OPENAI_API_KEY": "stub",
+    "GEMINI_API_KEY": "stub",
+    "MONGODB_URI": "mongodb://localhost:27017",
+    "AI_PROVIDER": "openai",
+}.items():
+    os.environ.setdefault(key, value)
+
+import agent.core as core
+from agent.providers import CircuitBreaker, Provider, ProviderRouter
+from benchmarks.fake_providers import FakeLLMConfig, Faults, build_app, free_port, point_core_at, serve_in_thread
+
+MESSAGES = [{"role": "system", "content": core.SYSTEM_PROMPT}, {"role": "user", "content": "I want a laptop"}]
+
+
+def scenarios(hang: float) -> dict:
+    return {
+        "healthy": lambda: {},
+        "slow tail (5% +2 s)": lambda: {"openai": Faults(slow_rate=0.05, slow_delay=2.0, seed=1)},
+        "OpenAI jittery (30% +1 s)": lambda: {"openai": Faults(slow_rate=0.3, slow_delay=1.0, seed=3)},
+        f"OpenAI hung ({hang:.0f} s)": lambda: {"openai": Faults(slow_rate=1.0, slow_delay=hang)},
+        "OpenAI 30% errors": lambda: {"openai": Faults(error_rate=0.3, seed=2)},
+        "OpenAI +300 ms": lambda: {"openai": Faults(extra_delay=0.3)},
+    }
+
+
+def make_router(mode: str, timeout: float) -> ProviderRouter:
+    if mode == "before":
+        never = CircuitBreaker(failure_threshold=10 ** 9)
+        providers = [
+            Provider("OpenAI", core._openai_complete, timeout=None, breaker=never),
+            Provider("Gemini", core._gemini_complete, timeout=None, breaker=CircuitBreaker(10 ** 9)),
+        ]
+        return ProviderRouter(providers, min_samples=10 ** 9, probe_every=0)
+    providers = [
+        Provider("OpenAI", core._openai_complete, timeout=timeout, breaker=CircuitBreaker(5, 5.0)),
+        Provider("Gemini", core._gemini_complete, timeout=timeout, breaker=CircuitBreaker(5, 5.0)),
+    ]
+    return ProviderRouter(providers, hedge=mode == "hedged")
+
+
+async def run(router: ProviderRouter, turns: int, concurrency: int) -> tuple:
+    latencies, failures = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def turn():
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await router.complete(MESSAGES)
+            except Exception:
+                failures += 1
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(turn() for _ in range(turns)))
+    return sorted(latencies), failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.2, help="fake provider reply time in seconds")
+    parser.add_argument("--timeout", type=float, default=2.0, help="router per-provider timeout")
+    parser.add_argument("--hang", type=float, default=6.0, help="seconds a hung OpenAI call takes")
+    args = parser.parse_args()
+
+    config = FakeLLMConfig(first_token_delay=args.latency, token_delay=0.0)
+    port = free_port()
+    server = serve_in_thread(build_app(config), port)
+    point_core_at(f"http://127.0.0.1:{port}")
+
+    async def bench():
+        await run(make_router("router", args.timeout), args.concurrency, args.concurrency)  # open connections
+        for name, faults in scenarios(args.hang).items():
+            print(name)
+            for mode in ("before", "router", "hedged"):
+                config.faults = {"openai": Faults(), "gemini": Faults(), **faults()}
+                config.calls = {"openai": 0, "gemini": 0}
+                router = make_router(mode, args.timeout)
+                latencies, failures = await run(router, args.turns, args.concurrency)
+                pct = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+                print(f"  {mode:<7} p50 {pct(0.5):6.0f} ms  p95 {pct(0.95):6.0f} ms  p99 {pct(0.99):6.0f} ms  "
+                      f"mean {statistics.mean(latencies) * 1000:6.0f} ms  failed {failures:3d}  "
+                      f"calls openai {config.calls['openai']:3d} gemini {config.calls['gemini']:3d}  "
+                      f"hedged {router.hedged:3d}")
+
+    try:
+        asyncio.run(bench())
+    finally:
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
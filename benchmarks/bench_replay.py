@@ -0,0 +1,485 @@
+"""
+Replay conversations against the app with local stand-ins for every external service.
+
+Serves main.app with uvicorn in this process, with OpenAI/Gemini (fake_providers),
+Stripe/Paystack/PayPal (fake_payments), Mongo (mongomock behind SlowMongoClient)
+and SendGrid (FakeSendGrid) replaced by local stand-ins whose latency is drawn
+from seeded distributions (see fake_providers.Latency for the spec syntax).
+Conversations run concurrently, their turns in order, and the report gives
+p50/p95/p99 latency per request kind, throughput per worker, memory, the
+app's own stage timings and what the outbox delivered. ``--json`` writes the
+report for later runs to ``--compare`` against. With --max-regression the exit
+status is non-zero when p95 or throughput got worse by more than that fraction.
+
+Conversations are JSONL, one per line; without --conversations a seeded set is
+generated (--save-conversations writes it out as a starting point):
+
+    {"session": "c0001", "source": "https://shop.example.ng",
+     "turns": [{"message": "I want a laptop", "think_ms": 4000},
+               {"message": "Which payment methods do you take?", "stream": true},
+               {"message": "Here is my payment proof", "proof": true}]}
+
+"proof" is true for a generated PNG, or a path to an image relative to the file.
+
+    python benchmarks/bench_replay.py --generate 200 --concurrency 20 --json before.json
+    git stash; python benchmarks/bench_replay.py --generate 200 --concurrency 20 --compare before.json
+
+--url replays against a running deployment instead (e.g. gunicorn with several
+workers; pass --workers for the per-worker figure). The stand-ins are then up
+to that deployment, and memory, stages and outbox are not reported.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import re
+import resource
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+for key, value in {
+    "OPENAI_API_KEY": "stub",
+    "GEMINI_API_KEY": "stub",
+    "MONGODB_URI": "mongodb://localhost:27017",
+    "AI_PROVIDER": "openai",
+    "SESSION_BACKEND": "memory",
+    # Every replayed session comes from this one host, back to back; set ADMISSION_ENABLED=1 to replay through it.
+    "ADMISSION_ENABLED": "0",
+    "STRIPE_SECRET_KEY": "sk_test_stub",
+    "PAYSTACK_SECRET_KEY": "sk_test_stub",
+    "PAYPAL_CLIENT_ID": "client",
+    "PAYPAL_SECRET": "secret",
+    "SENDGRID_API_KEY": "SG.stub",
+    "FROM_EMAIL": "bot@example.com",
+    "OWNER_EMAIL": "owner@example.com",
+}.items():
+    os.environ.setdefault(key, value)
+
+import httpx
+import uvicorn
+
+from benchmarks.fake_payments import FakePaymentConfig, build_app as build_payments_app
+from benchmarks.fake_providers import FakeLLMConfig, Latency, build_app as build_llm_app, free_port, serve_in_thread
+from benchmarks.fake_services import FakeSendGrid, SlowMongoClient
+
+# Unlike fake_providers.REPLY this names no payment method, so the customer's own choice
+# decides the provider (EntityExtractor reads the assistant's turns too).
+LLM_REPLY = "Thanks! Could you confirm your full name, delivery address and phone number?"
+
+KINDS = ("chat", "stream", "stream_first_delta", "upload")
+QUANTILES = ("p50", "p95", "p99")
+
+ITEMS = ["laptop", "pizza", "premium chocolate cake", "urgent flower bouquet", "phone case", "premium laptop bag"]
+NAMES = ["Ada Obi", "John Smith", "Maria Garcia", "Chen Wei", "Fatima Bello", "Tom Baker"]
+STREETS = ["Marina Road", "Allen Avenue", "High Street", "Broad Street", "Ozumba Mbadiwe"]
+SOURCES = ["https://shop.example.com", "https://lagos.example.ng", "Direct"]
+QUESTIONS = ["Hello", "Do you deliver on weekends?", "How long does delivery take?",
+             "Is there a warranty on it?", "Can I change the colour?"]
+PAYMENTS = ["I'll pay with Paystack", "Bank transfer please", "Can I pay by PayPal?", "I'll pay by card"]
+
+
+def generate_conversations(n: int, seed: int) -> list:
+    rng = random.Random(seed)
+    conversations = []
+    for i in range(n):
+        name = rng.choice(NAMES)
+        turns = [{"message": rng.choice(QUESTIONS), "think_ms": rng.randint(1000, 6000)}]
+        turns.append({"message": f"I want to order a {rng.choice(ITEMS)}", "think_ms": rng.randint(2000, 8000)})
+        turns.append({
+            "message": f"I'm {name}, deliver to {rng.randint(1, 99)} {rng.choice(STREETS)}. "
+                       f"Phone +234 803 {rng.randint(1000000, 9999999)}, "
+                       f"email {name.split()[0].lower()}{i}@example.com",
+            "think_ms": rng.randint(5000, 20000),
+        })
+        turns.append({"message": rng.choice(PAYMENTS), "stream": rng.random() < 0.3,
+                      "think_ms": rng.randint(2000, 8000)})
+        if rng.random() < 0.8:
+            turns.append({"message": "Here is my payment proof", "proof": True,
+                          "think_ms": rng.randint(20000, 90000)})
+        conversations.append({"session": f"c{i:04d}", "source": rng.choice(SOURCES), "turns": turns})
+    return conversations
+
+
+def load_conversations(path: str) -> list:
+    base = os.path.dirname(os.path.abspath(path))
+    conversations = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                conversation = json.loads(line)
+                for turn in conversation["turns"]:
+                    if isinstance(turn.get("proof"), str):
+                        with open(os.path.join(base, turn["proof"]), "rb") as image:
+                            turn["proof_bytes"] = image.read()
+                conversations.append(conversation)
+    return conversations
+
+
+def proof_png(seed: str, size: int = 64) -> bytes:
+    """A small PNG, different per seed so content-addressed storage keeps each one."""
+    rng = random.Random(seed)
+    rows = b"".join(b"\x00" + bytes(rng.randrange(256) for _ in range(size * 3)) for _ in range(size))
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(rows)) + chunk(b"IEND", b"")
+
+
+class Recorder:
+    """Latencies and errors per request kind, for the measured part of the run only."""
+
+    def __init__(self):
+        self.recording = False
+        self.latencies = {kind: [] for kind in KINDS}
+        self.errors = dict.fromkeys(KINDS, 0)
+
+    def add(self, kind: str, seconds: float, ok: bool) -> None:
+        if not self.recording:
+            return
+        if ok:
+            self.latencies[kind].append(seconds)
+        else:
+            self.errors[kind] += 1
+
+    def summary(self) -> dict:
+        out = {}
+        for kind in KINDS:
+            values = self.latencies[kind]
+            if not values and not self.errors[kind]:
+                continue
+            row = {"count": len(values), "errors": self.errors[kind]}
+            if values:
+                cuts = statistics.quantiles(values, n=100, method="inclusive") if len(values) > 1 else values * 99
+                row.update({"mean": statistics.fmean(values), "p50": cuts[49], "p95": cuts[94], "p99": cuts[98]})
+            out[kind] = row
+        return out
+
+
+async def replay_turn(client: httpx.AsyncClient, conversation: dict, turn: dict, session_id: str,
+                      recorder: Recorder) -> None:
+    form = {"message": turn["message"], "session_id": session_id}
+    headers = {"referer": conversation.get("source", "Direct")}
+    start = time.perf_counter()
+    ok = False
+    try:
+        if turn.get("proof"):
+            kind = "upload"
+            image = turn.get("proof_bytes") or proof_png(session_id)
+            content_type = "image/jpeg" if image[:2] == b"\xff\xd8" else "image/png"
+            response = await client.post("/upload-proof", data=form, headers=headers,
+                                         files={"file": ("proof", image, content_type)})
+            ok = response.status_code == 200
+        elif turn.get("stream"):
+            kind = "stream"
+            first = None
+            async with client.stream("POST", "/chat/stream", data=form, headers=headers) as response:
+                ok = response.status_code == 200
+                async for line in response.aiter_lines():
+                    if first is None and line.startswith("data:"):
+                        first = time.perf_counter() - start
+                    if line.startswith("event: error"):
+                        ok = False
+            recorder.add("stream_first_delta", first or 0.0, ok and first is not None)
+        else:
+            kind = "chat"
+            response = await client.post("/chat", data=form, headers=headers)
+            ok = response.status_code == 200
+    except httpx.HTTPError:
+        kind = "upload" if turn.get("proof") else "stream" if turn.get("stream") else "chat"
+    recorder.add(kind, time.perf_counter() - start, ok)
+
+
+async def replay(base_url: str, conversations: list, args, recorder: Recorder, on_measure=None) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+
+        async def run(batch: list, label: str) -> None:
+            queue = asyncio.Queue()
+            for item in batch:
+                queue.put_nowait(item)
+
+            async def session_worker():
+                while not queue.empty():
+                    repeat, conversation = queue.get_nowait()
+                    session_id = re.sub(r"[^A-Za-z0-9_-]", "-", f"replay-{label}{repeat}-{conversation['session']}")[:64]
+                    for turn in conversation["turns"]:
+                        if args.think_scale:
+                            await asyncio.sleep(turn.get("think_ms", 0) / 1000 * args.think_scale)
+                        await replay_turn(client, conversation, turn, session_id, recorder)
+
+            await asyncio.gather(*(session_worker() for _ in range(args.concurrency)))
+
+        # Warm-up conversations load the intent model, clients and pools; they are not recorded.
+        await run([(0, c) for c in conversations[:args.warmup]], "warmup")
+        measured = [(repeat, c) for repeat in range(args.repeat) for c in conversations]
+        if on_measure is not None:
+            on_measure()
+        recorder.recording = True
+        start = time.perf_counter()
+        await run(measured, "run")
+        elapsed = time.perf_counter() - start
+        recorder.recording = False
+    turns = sum(len(c["turns"]) for _, c in measured)
+    return {"duration_s": elapsed, "turns": turns, "conversations": len(measured)}
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def stage_summary(before: dict, after: dict) -> dict:
+    """Stage count and mean time recorded by agent.metrics during the measured run."""
+    out = {}
+    for (name, labels), stats in sorted(after.items(), key=str):
+        prior = before.get((name, labels), {"count": 0, "seconds": 0.0})
+        count = stats["count"] - prior["count"]
+        if count:
+            key = " ".join([name] + [f"{k}={v}" for k, v in labels])
+            out[key] = {"count": count, "mean_ms": (stats["seconds"] - prior["seconds"]) / count * 1000}
+    return out
+
+
+class StandIns:
+    """Starts the fake provider servers and points the app's services at them."""
+
+    def __init__(self, args):
+        self.llm = FakeLLMConfig(first_token_delay=0.0, token_delay=args.llm_token_delay, reply=LLM_REPLY)
+        for i, provider in enumerate(("openai", "gemini")):
+            self.llm.faults[provider].latency = Latency(args.llm_latency, seed=args.seed + i)
+        self.payments = FakePaymentConfig(distribution=Latency(args.payment_latency, seed=args.seed + 2))
+        self.mongo = SlowMongoClient(Latency(args.mongo_latency, seed=args.seed + 3))
+        self.sendgrid = FakeSendGrid(Latency(args.email_latency, seed=args.seed + 4))
+        self.servers = []
+
+    def install(self) -> None:
+        import openai
+        from google import genai
+        from google.genai.types import HttpOptions
+
+        from agent.payments import payment_links
+        from agent.services import services
+        from agent.storage import LocalProofStorage, proof_storage
+
+        llm_url = self._serve(build_llm_app(self.llm))
+        payments_url = self._serve(build_payments_app(self.payments))
+        services.override("openai_async",
+                          lambda: openai.AsyncOpenAI(api_key="stub", base_url=f"{llm_url}/v1", max_retries=0))
+        services.override("gemini", lambda: genai.Client(api_key="stub", http_options=HttpOptions(base_url=llm_url)))
+        services.override("mongo", lambda: self.mongo)
+        services.override("sendgrid", lambda: self.sendgrid)
+        for gateway in payment_links.gateways.values():
+            gateway.base_url = payments_url
+        if isinstance(proof_storage, LocalProofStorage):
+            # Keep replayed proofs out of the working tree.
+            proof_storage.root = tempfile.mkdtemp(prefix="replay-uploads-")
+            proof_storage.staging_dir = os.path.join(proof_storage.root, ".incoming")
+            os.makedirs(proof_storage.staging_dir)
+
+    def _serve(self, app) -> str:
+        port = free_port()
+        self.servers.append(serve_in_thread(app, port))
+        return f"http://127.0.0.1:{port}"
+
+    def stop(self) -> None:
+        for server in self.servers:
+            server.should_exit = True
+
+    def outbox(self) -> dict:
+        """Outbox tasks by task and status, read straight from mongomock (no simulated latency)."""
+        from config import settings
+
+        counts = {}
+        for order in self.mongo.client[settings.db_name][settings.orders_collection].find({}, {"outbox": 1}):
+            for entry in order.get("outbox", []):
+                key = f"{entry['task']} {entry['status']}"
+                counts[key] = counts.get(key, 0) + 1
+        return dict(sorted(counts.items()))
+
+    def stats(self) -> dict:
+        return {
+            "llm_calls": dict(self.llm.calls),
+            "checkouts": dict(self.payments.checkouts),
+            "mongo_calls": sum(self.mongo.calls.values()),
+            "emails_sent": self.sendgrid.count,
+        }
+
+
+async def drain(stand_ins: StandIns, seconds: float) -> dict:
+    """Give the outbox worker up to ``seconds`` to finish the queued side effects."""
+    deadline = time.monotonic() + seconds
+    while True:
+        outbox = stand_ins.outbox()
+        busy = any(key.endswith((" pending", " in_progress")) for key in outbox)
+        if not busy or time.monotonic() >= deadline:
+            return outbox
+        await asyncio.sleep(0.25)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_report(results: dict) -> None:
+    run = results["run"]
+    print(f"revision {results['revision']}: {run['conversations']} conversations, {run['turns']} turns "
+          f"in {run['duration_s']:.1f}s, concurrency {results['config']['concurrency']}")
+    print(f"  {'kind':<20}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for kind, row in results["requests"].items():
+        cells = "".join(f"{row[q] * 1000:10.1f}" if q in row else f"{'-':>10}" for q in QUANTILES)
+        print(f"  {kind:<20}{row['count']:7d}{row['errors']:8d}{cells}")
+    print(f"  throughput: {results['throughput_rps']:.1f} turns/s, "
+          f"{results['per_worker_rps']:.1f} per worker ({results['workers']} worker(s))")
+    if results.get("memory"):
+        memory = results["memory"]
+        print(f"  memory: RSS {memory['rss_start_mb']:.0f} -> {memory['rss_end_mb']:.0f} MB, "
+              f"peak {memory['peak_rss_mb']:.0f} MB (app, stand-ins and client together)")
+    if results.get("stages"):
+        print("  stages (agent.metrics):")
+        for key, stage in results["stages"].items():
+            print(f"    {key:<40}{stage['count']:7d} x {stage['mean_ms']:8.2f} ms")
+    if results.get("outbox"):
+        print("  outbox: " + ", ".join(f"{key} {count}" for key, count in results["outbox"].items()))
+    if results.get("stand_ins"):
+        print(f"  stand-ins: {json.dumps(results['stand_ins'])}")
+
+
+def compare(results: dict, baseline: dict, max_regression: float) -> bool:
+    """Print current vs baseline; True when p95 or throughput regressed by more than ``max_regression``."""
+    print(f"compared with {baseline['revision']}:")
+    regressed = False
+    for kind, row in results["requests"].items():
+        base = baseline["requests"].get(kind)
+        if not base:
+            continue
+        cells = []
+        for q in QUANTILES:
+            if q in row and q in base and base[q]:
+                change = row[q] / base[q] - 1
+                cells.append(f"{q} {base[q] * 1000:.0f} -> {row[q] * 1000:.0f} ms ({change:+.0%})")
+                if q == "p95" and change > max_regression:
+                    regressed = True
+        print(f"  {kind:<20}" + ", ".join(cells))
+    change = results["per_worker_rps"] / baseline["per_worker_rps"] - 1
+    print(f"  {'throughput':<20}{baseline['per_worker_rps']:.1f} -> {results['per_worker_rps']:.1f} "
+          f"turns/s per worker ({change:+.0%})")
+    return regressed or change < -max_regression
+
+
+async def run_benchmark(args, conversations: list) -> dict:
+    recorder = Recorder()
+    results = {"revision": git_revision(), "python": platform.python_version(),
+               "config": {key: value for key, value in vars(args).items()
+                          if key not in ("json", "compare", "save_conversations")}}
+    if args.url:
+        results["run"] = await replay(args.url.rstrip("/"), conversations, args, recorder)
+    else:
+        from agent.metrics import metrics
+        from main import app
+
+        # Importing the app registers its services; none is built before the server starts.
+        stand_ins = StandIns(args)
+        stand_ins.install()
+
+        port = free_port()
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        while not server.started:
+            await asyncio.sleep(0.01)
+        # Turns go to the LLM until the intent model has loaded in the background; load it up front.
+        from agent.intent import classifier
+
+        await asyncio.to_thread(lambda: classifier.model)
+        before = {}
+
+        def measure():
+            before.update(stages=metrics.snapshot(), rss=rss_mb())
+
+        try:
+            results["run"] = await replay(f"http://127.0.0.1:{port}", conversations, args, recorder, measure)
+            results["stages"] = stage_summary(before["stages"], metrics.snapshot())
+            results["memory"] = {"rss_start_mb": before["rss"], "rss_end_mb": rss_mb(), "peak_rss_mb": peak_rss_mb()}
+            results["outbox"] = await drain(stand_ins, args.drain_seconds)
+            results["stand_ins"] = stand_ins.stats()
+        finally:
+            # Let the app's lifespan stop the outbox worker before the interpreter goes away.
+            server.should_exit = True
+            await asyncio.to_thread(thread.join, 30)
+            stand_ins.stop()
+    results["requests"] = recorder.summary()
+    results["workers"] = args.workers
+    results["throughput_rps"] = results["run"]["turns"] / results["run"]["duration_s"]
+    results["per_worker_rps"] = results["throughput_rps"] / args.workers
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--conversations", help="recorded conversations (JSONL); default: generated")
+    parser.add_argument("--generate", type=int, default=100, help="conversations to generate")
+    parser.add_argument("--save-conversations", help="write the generated conversations here and continue")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--concurrency", type=int, default=20, help="conversations in flight at once")
+    parser.add_argument("--repeat", type=int, default=1, help="replay the whole set this many times")
+    parser.add_argument("--warmup", type=int, default=5, help="conversations replayed first and not measured")
+    parser.add_argument("--think-scale", type=float, default=0.0,
+                        help="multiply recorded think time (0 replays back to back)")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--llm-latency", default="lognormal:0.5:0.4", help="time to first token")
+    parser.add_argument("--llm-token-delay", type=float, default=0.005, help="seconds between streamed tokens")
+    parser.add_argument("--payment-latency", default="lognormal:0.25:0.3")
+    parser.add_argument("--mongo-latency", default="lognormal:0.002:0.5")
+    parser.add_argument("--email-latency", default="lognormal:0.15:0.3")
+    parser.add_argument("--drain-seconds", type=float, default=10.0, help="wait for the outbox after the run")
+    parser.add_argument("--url", help="replay against a running server instead of in-process stand-ins")
+    parser.add_argument("--workers", type=int, default=1, help="server workers, for the per-worker throughput")
+    parser.add_argument("--json", help="write the results here")
+    parser.add_argument("--compare", help="results JSON of an earlier run to compare with")
+    parser.add_argument("--max-regression", type=float, help="fail if p95 or throughput is this much worse")
+    args = parser.parse_args()
+
+    if args.conversations:
+        conversations = load_conversations(args.conversations)
+    else:
+        conversations = generate_conversations(args.generate, args.seed)
+        if args.save_conversations:
+            with open(args.save_conversations, "w") as f:
+                f.writelines(json.dumps(c) + "\n" for c in conversations)
+
+    results = asyncio.run(run_benchmark(args, conversations))
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2, default=str)
+    if args.compare:
+        with open(args.compare) as f:
+            regressed = compare(results, json.load(f), args.max_regression or 0.0)
+        if regressed and args.max_regression is not None:
+            print(f"regression over {args.max_regression:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Response cache replay benchmark.
+
+Replays a traffic log of chat turns through process_user_input_async with a
+stubbed provider and reports provider calls and latency with the cache off
+and on.
+
+The log is JSONL with {"session": ..., "message": ...} per line. Without
+--log, a synthetic log of FAQ openers plus order conversations is generated.
+
+    python benchmarks/bench_response_cache.py --turns 2000 --latency 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+for key, value in {
+    "OPENAI_API_KEY": "stub",
+    "GEMINI_API_KEY": "stub",
+    "MONGODB_URI": "mongodb://localhost:27017",
+    "AI_PROVIDER": "openai",
+    "INTENT_CONFIDENCE_THRESHOLD": "2",  # measure the cache alone, without intent pre-routing
+}.items():
+    os.environ.setdefault(key, value)
+
+import agent.core as core
+from agent.cache import ResponseCache
+from agent.memory import InMemorySessionStore
+
+OPENERS = [
+    "hello", "Hello!", "hello.", "HELLO", "hi", "Hi!", "what do you sell", "What do you sell?",
+    "what do you sell??", "how do I pay", "How do I pay?", "how do i pay", "use paypal", "paypal use",
+    "pay with paystack", "Pay with Paystack", "paystack pay with", "buy premium", "premium buy",
+]
+FOLLOW_UPS = [
+    "My name is Ada, phone 0803{:07d}", "deliver to {} Allen Avenue Ikeja", "my email is ada{}@example.com",
+    "I want {} laptops",
+]
+
+
+def synthetic_log(turns: int, seed: int = 11) -> list[dict]:
+    rng = random.Random(seed)
+    log, session = [], 0
+    while len(log) < turns:
+        session += 1
+        log.append({"session": f"s{session}", "message": rng.choice(OPENERS)})
+        for template in rng.sample(FOLLOW_UPS, rng.randint(0, 2)):
+            log.append({"session": f"s{session}", "message": template.format(rng.randint(1, 9_999_999))})
+    return log[:turns]
+
+
+async def replay(log: list[dict], cache: ResponseCache, latency: float) -> tuple[int, list[float]]:
+    calls = 0
+
+    async def fake_provider(messages, model_name="stub"):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(latency)
+        return f"reply to: {messages[-1]['content']}"
+
+    core.get_ai_response_async = fake_provider
+    core.response_cache = cache
+    core.memory = InMemorySessionStore()
+    # Turns go to the LLM until the intent model is loaded; load it before replaying.
+    core.classifier.model
+    latencies = []
+    for turn in log:
+        start = time.perf_counter()
+        await core.process_user_input_async({"role": "user", "content": turn["message"]}, session_id=turn["session"])
+        latencies.append(time.perf_counter() - start)
+    return calls, latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--log", help="JSONL traffic log to replay")
+    parser.add_argument("--turns", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.05, help="stub provider latency in seconds")
+    args = parser.parse_args()
+
+    if args.log:
+        with open(args.log) as f:
+            log = [json.loads(line) for line in f if line.strip()]
+    else:
+        log = synthetic_log(args.turns)
+
+    variants = {
+        "no cache": ResponseCache(max_entries=0),
+        "cache": ResponseCache(),
+    }
+    baseline_calls = None
+    print(f"replaying {len(log)} turns, provider latency {args.latency * 1000:.0f} ms")
+    for name, cache in variants.items():
+        calls, latencies = asyncio.run(replay(log, cache, args.latency))
+        baseline_calls = baseline_calls or calls
+        stats = cache.stats()
+        print(
+            f"{name:16s} provider calls {calls:5d} (saved {baseline_calls - calls:5d})  "
+            f"mean {statistics.mean(latencies) * 1000:6.2f} ms  total {sum(latencies):6.2f} s  "
+            f"hits {stats['hits']} misses {stats['misses']} "
+            f"bypassed {stats['bypassed']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
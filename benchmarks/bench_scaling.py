@@ -0,0 +1,195 @@
+"""
+Scaling: throughput, latency and memory from 1 to N gunicorn workers.
+
+Starts the app with gunicorn.conf.py for each worker count, sessions in a
+shared store (the local Redis stand-in from fake_redis.py unless --redis-url
+is given), the LLM served by fake_providers, and replays the same generated
+conversations at each size (bench_replay's generator and client). Reports
+turns/s overall and per worker, chat p50/p95, the workers' summed RSS and PSS
+(PSS counts pages shared copy-on-write once, so it shows what preloading the
+intent model saves), and, with the stand-in, how many conversations kept their
+full history although their turns were spread across workers. A last run at
+the largest size with GUNICORN_PRELOAD=0 shows the memory without preloading.
+
+Proof uploads need Mongo for the order write, so they are left out unless
+--mongo-uri points at a server.
+
+    python benchmarks/bench_scaling.py --workers 1,2,4 --conversations 200 --concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import httpx
+
+from benchmarks.bench_replay import Recorder, generate_conversations, replay
+from benchmarks.fake_providers import FakeLLMConfig, Latency, build_app, free_port, serve_in_thread
+from benchmarks.fake_redis import serve_redis_in_thread
+
+# Unreachable and fast to fail: without --mongo-uri nothing on the measured path touches Mongo.
+NO_MONGO = "mongodb://localhost:1/?serverSelectionTimeoutMS=500"
+
+
+def process_tree(pid: int) -> list:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            children = [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+    return [pid] + [p for child in children for p in process_tree(child)]
+
+
+def memory_mb(pids: list) -> dict:
+    """Summed RSS and PSS of ``pids`` from /proc/<pid>/smaps_rollup."""
+    totals = {"rss_mb": 0.0, "pss_mb": 0.0}
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/smaps_rollup") as f:
+                for line in f:
+                    key, _, rest = line.partition(":")
+                    if key in ("Rss", "Pss"):
+                        totals[f"{key.lower()}_mb"] += int(rest.split()[0]) / 1024
+        except OSError:
+            pass
+    return totals
+
+
+def start_server(workers: int, env: dict, port: int, preload: bool) -> subprocess.Popen:
+    env = dict(env, WEB_CONCURRENCY=str(workers), PORT=str(port), GUNICORN_PRELOAD="1" if preload else "0")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}", "main:app"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 120
+    with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=10) as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"gunicorn exited with {process.returncode}")
+            try:
+                # Every worker forked and the app answering.
+                if len(process_tree(process.pid)) > workers and client.get("/").status_code == 200:
+                    return process
+            except httpx.TransportError:
+                pass
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("gunicorn did not come up within 120s")
+
+
+def stop_server(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def history_kept(store, conversations: list, repeat: int) -> tuple:
+    """(conversations whose stored history has every turn, conversations checked)."""
+    kept = 0
+    for conversation in conversations:
+        session_id = f"replay-run{repeat}-{conversation['session']}"
+        history = store.get(f"session:{{{session_id}}}:history".encode()) or []
+        kept += len(history) == min(len(conversation["turns"]), 10)
+    return kept, len(conversations)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", default="1,2,4", help="worker counts to measure")
+    parser.add_argument("--conversations", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--llm-latency", default="lognormal:0.1:0.3")
+    parser.add_argument("--session-backend", default="redis", help="redis, mongo or memory (to see it break)")
+    parser.add_argument("--redis-url", help="a real Redis; default: the in-process stand-in")
+    parser.add_argument("--mongo-uri", help="Mongo for orders (and SESSION_BACKEND=mongo); enables proof uploads")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="write the results here")
+    args = parser.parse_args()
+    counts = [int(n) for n in args.workers.split(",")]
+
+    llm = FakeLLMConfig(first_token_delay=0.0, token_delay=0.002)
+    for i, provider in enumerate(("openai", "gemini")):
+        llm.faults[provider].latency = Latency(args.llm_latency, seed=args.seed + i)
+    llm_port = free_port()
+    serve_in_thread(build_app(llm), llm_port)
+    store = None
+    redis_url = args.redis_url
+    if redis_url is None and args.session_backend == "redis":
+        redis_port = free_port()
+        store = serve_redis_in_thread(redis_port)
+        redis_url = f"redis://127.0.0.1:{redis_port}/0"
+
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_API_KEY": "stub",
+        "GEMINI_API_KEY": "stub",
+        "AI_PROVIDER": "openai",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{llm_port}/v1",
+        "GOOGLE_GEMINI_BASE_URL": f"http://127.0.0.1:{llm_port}",
+        "MONGODB_URI": args.mongo_uri or NO_MONGO,
+        "SESSION_BACKEND": args.session_backend,
+        "REDIS_URL": redis_url or "",
+        "ADMISSION_ENABLED": "0",  # one client host replaying every session
+    })
+
+    conversations = generate_conversations(args.conversations, args.seed)
+    if not args.mongo_uri:
+        for conversation in conversations:
+            conversation["turns"] = [turn for turn in conversation["turns"] if not turn.get("proof")]
+    replay_args = argparse.Namespace(concurrency=args.concurrency, timeout=60.0, warmup=args.concurrency,
+                                     repeat=1, think_scale=0.0)
+
+    rows = []
+    for workers, preload in [(n, True) for n in counts] + [(max(counts), False)]:
+        if store is not None:
+            store.execute([b"FLUSHALL"])
+        port = free_port()
+        start = time.perf_counter()
+        process = start_server(workers, env, port, preload)
+        boot = time.perf_counter() - start
+        try:
+            memory_idle = memory_mb(process_tree(process.pid))
+            recorder = Recorder()
+            run = asyncio.run(replay(f"http://127.0.0.1:{port}", conversations, replay_args, recorder))
+            memory = memory_mb(process_tree(process.pid))
+        finally:
+            stop_server(process)
+        chat = recorder.summary().get("chat", {})
+        row = {
+            "workers": workers, "preload": preload, "boot_s": boot,
+            "throughput_rps": run["turns"] / run["duration_s"],
+            "chat_p50": chat.get("p50"), "chat_p95": chat.get("p95"),
+            "errors": sum(r["errors"] for r in recorder.summary().values()),
+            "idle_pss_mb": memory_idle["pss_mb"], **memory,
+        }
+        row["per_worker_rps"] = row["throughput_rps"] / workers
+        if store is not None:
+            row["history_kept"], row["conversations"] = history_kept(store, conversations, 0)
+        rows.append(row)
+
+    print(f"{args.conversations} conversations, concurrency {args.concurrency}, sessions: {args.session_backend}"
+          f"{' (local stand-in)' if store is not None else ''}, LLM {args.llm_latency}")
+    print(f"{'workers':>8}{'preload':>8}{'boot s':>8}{'turns/s':>9}{'/worker':>9}{'p50 ms':>8}{'p95 ms':>8}"
+          f"{'errors':>7}{'RSS MB':>8}{'PSS MB':>8}{'idle PSS':>9}  history kept")
+    for row in rows:
+        kept = f"{row['history_kept']}/{row['conversations']}" if "history_kept" in row else "n/a"
+        p50 = f"{row['chat_p50'] * 1000:8.0f}" if row["chat_p50"] else f"{'-':>8}"
+        p95 = f"{row['chat_p95'] * 1000:8.0f}" if row["chat_p95"] else f"{'-':>8}"
+        print(f"{row['workers']:>8}{'yes' if row['preload'] else 'no':>8}{row['boot_s']:8.1f}"
+              f"{row['throughput_rps']:9.1f}{row['per_worker_rps']:9.1f}{p50}{p95}{row['errors']:7d}"
+              f"{row['rss_mb']:8.0f}{row['pss_mb']:8.0f}{row['idle_pss_mb']:9.0f}  {kept}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": vars(args), "rows": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
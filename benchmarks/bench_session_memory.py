@@ -0,0 +1,75 @@
+"""
+Session memory benchmark.
+
+Fills the in-process session store with N live sessions, then reports the
+per-turn cost of reading history and appending a turn, plus resident memory.
+
+    python benchmarks/bench_session_memory.py --sessions 100000 --turns 4
+"""
+import argparse
+import os
+import random
+import resource
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+for key, value in {
+    "OPENAI_API_KEY": "stub",
+    "GEMINI_API_KEY": "stub",
+    "MONGODB_URI": "mongodb://localhost:27017",
+    "AI_PROVIDER": "openai",
+}.items():
+    os.environ.setdefault(key, value)
+
+from agent.memory import InMemorySessionStore
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=100_000)
+    parser.add_argument("--turns", type=int, default=4, help="turns pre-loaded per session")
+    parser.add_argument("--ops", type=int, default=200_000, help="timed history+add operations")
+    args = parser.parse_args()
+
+    user = "I would like a premium pizza delivered to 12 Allen Avenue please"
+    assistant = "Sure! Could you share your name, phone number and preferred payment method?"
+    store = InMemorySessionStore(max_sessions=args.sessions, max_bytes=1 << 40)
+    session_ids = [f"session-{i:08d}" for i in range(args.sessions)]
+
+    baseline = rss_mb()
+    start = time.perf_counter()
+    for _ in range(args.turns):
+        for session_id in session_ids:
+            # Distinct strings per session so RSS reflects real, unshared text.
+            store.add(session_id, f"{user} ({session_id})", f"{assistant} ({session_id})")
+    fill = time.perf_counter() - start
+    filled = rss_mb()
+
+    rng = random.Random(7)
+    picks = [rng.choice(session_ids) for _ in range(args.ops)]
+    start = time.perf_counter()
+    for session_id in picks:
+        store.history(session_id)
+        store.add(session_id, user, assistant)
+    per_turn = (time.perf_counter() - start) / args.ops
+
+    print(f"live sessions      : {len(store):,} (evictions: {store.evictions})")
+    print(f"fill time          : {fill:.2f}s for {args.sessions * args.turns:,} turns")
+    print(f"per-turn overhead  : {per_turn * 1e6:.2f} us (history read + append)")
+    print(f"resident memory    : {filled - baseline:.1f} MB above baseline "
+          f"({(filled - baseline) * 1024 * 1024 / args.sessions:.0f} B/session)")
+    print(f"tracked bytes      : {store.total_bytes / 1024 / 1024:.1f} MB (memory cap accounting)")
+
+
+if __name__ == "__main__":
+    main()
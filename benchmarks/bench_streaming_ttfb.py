@@ -0,0 +1,76 @@
+"""
+Time-to-first-byte benchmark: /chat (buffered JSON) vs /chat/stream (SSE).
+
+Starts a local fake OpenAI/Gemini server and the real app on uvicorn, then
+measures how long the client waits for the first reply text on each endpoint,
+for the OpenAI path and for the Gemini fallback path.
+
+    python benchmarks/bench_streaming_ttfb.py --runs 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+for key, value in {
+    "OPENAI_API_KEY": "stub",
+    "GEMINI_API_KEY": "stub",
+    "MONGODB_URI": "mongodb://localhost:27017",
+    "AI_PROVIDER": "openai",
+    # Every turn here starts a new session, which admission control rate-limits per client.
+    "ADMISSION_ENABLED": "0",
+}.items():
+    os.environ.setdefault(key, value)
+
+import httpx
+
+from benchmarks.fake_providers import FakeLLMConfig, build_app, free_port, point_core_at, serve_in_thread
+
+
+def first_text(client: httpx.Client, path: str) -> tuple[float, float]:
+    """Return (seconds to first reply text, seconds to complete response)."""
+    start = time.perf_counter()
+    ttfb = None
+    with client.stream("POST", path, data={"message": "I want a premium pizza"}) as response:
+        response.raise_for_status()
+        for chunk in response.iter_bytes():
+            if ttfb is None and (b'"delta"' in chunk or b'"reply"' in chunk):
+                ttfb = time.perf_counter() - start
+    return ttfb, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--first-token-delay", type=float, default=0.3)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    args = parser.parse_args()
+
+    config = FakeLLMConfig(args.first_token_delay, args.token_delay)
+    provider_port = free_port()
+    serve_in_thread(build_app(config), provider_port)
+    point_core_at(f"http://127.0.0.1:{provider_port}")
+
+    import main as app_module
+
+    app_port = free_port()
+    serve_in_thread(app_module.app, app_port)
+
+    print(f"fake provider: {len(config.tokens)} tokens, first token after {config.first_token_delay * 1000:.0f} ms, "
+          f"{config.token_delay * 1000:.0f} ms/token after that")
+    with httpx.Client(base_url=f"http://127.0.0.1:{app_port}", timeout=30) as client:
+        for provider, openai_fails in (("openai", False), ("gemini fallback", True)):
+            config.openai_fails = openai_fails
+            for path in ("/chat", "/chat/stream"):
+                samples = [first_text(client, path) for _ in range(args.runs)]
+                ttfb = statistics.median(s[0] for s in samples)
+                total = statistics.median(s[1] for s in samples)
+                print(f"{provider:16s} {path:13s} first text {ttfb * 1000:7.1f} ms   complete {total * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
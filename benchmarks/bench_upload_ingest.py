@@ -0,0 +1,134 @@
+"""
+Proof upload ingest: read-all-then-copy vs streaming.
+
+Starts a uvicorn server in a child process serving either the old upload
+handler (UploadFile, ``await file.read()`` for the size check, then
+``shutil.copyfileobj``) or agent.uploads.receive_upload, fires N concurrent
+uploads of a just-under-limit JPEG at it, and reports the server's peak RSS,
+wall time and whether the stored bytes match.
+
+    python benchmarks/bench_upload_ingest.py --uploads 200 --size-mb 4.9
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MAX_FILE_SIZE = 5 * 1024 * 1024
+ALLOWED_TYPES = ["image/jpeg", "image/png"]
+
+
+def build_app(mode: str, upload_dir: str):
+    from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
+
+    from agent.uploads import UploadRejected, receive_upload
+
+    app = FastAPI()
+
+    @app.get("/rss")
+    async def rss():
+        with open("/proc/self/status") as f:
+            status = dict(line.split(":", 1) for line in f)
+        return {key: int(status[key].split()[0]) / 1024 for key in ("VmRSS", "VmHWM")}
+
+    if mode == "legacy":
+        @app.post("/upload")
+        async def upload(file: UploadFile = File(...), message: str = Form(...)):
+            if file.content_type not in ALLOWED_TYPES:
+                raise HTTPException(status_code=400, detail="Invalid file type")
+            file_content = await file.read()
+            if len(file_content) > MAX_FILE_SIZE:
+                raise HTTPException(status_code=400, detail="File size too large")
+            await file.seek(0)
+            path = os.path.join(upload_dir, f"{uuid.uuid4()}_{file.filename}")
+            with open(path, "wb") as buffer:
+                shutil.copyfileobj(file.file, buffer)
+            await file.close()
+            return {"path": path}
+    else:
+        @app.post("/upload")
+        async def upload(request: Request):
+            try:
+                _, stored = await receive_upload(request, upload_dir, MAX_FILE_SIZE, ALLOWED_TYPES)
+            except UploadRejected as e:
+                raise HTTPException(status_code=e.status_code, detail=e.detail)
+            return {"path": stored.path}
+
+    return app
+
+
+def serve(mode: str, port: int, upload_dir: str) -> None:
+    import uvicorn
+
+    uvicorn.run(build_app(mode, upload_dir), host="127.0.0.1", port=port, log_level="warning")
+
+
+async def run_client(base_url: str, uploads: int, payload: bytes) -> tuple:
+    import httpx
+
+    limits = httpx.Limits(max_connections=uploads, max_keepalive_connections=uploads)
+    async with httpx.AsyncClient(base_url=base_url, timeout=300, limits=limits) as client:
+        while True:
+            try:
+                before = (await client.get("/rss")).json()
+                break
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(
+            client.post("/upload", data={"message": "paid"}, files={"file": ("receipt.jpg", payload, "image/jpeg")})
+            for _ in range(uploads)
+        ))
+        elapsed = time.perf_counter() - start
+        after = (await client.get("/rss")).json()
+    return before, after, elapsed, responses
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--uploads", type=int, default=200)
+    parser.add_argument("--size-mb", type=float, default=4.9)
+    parser.add_argument("--serve", choices=["legacy", "streaming"], help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port, args.dir)
+        return
+
+    from benchmarks.fake_providers import free_port
+
+    payload = b"\xff\xd8\xff\xe0" + os.urandom(int(args.size_mb * 1024 * 1024) - 4)
+    digest = hashlib.sha256(payload).hexdigest()
+
+    for mode in ("legacy", "streaming"):
+        upload_dir = tempfile.mkdtemp(prefix=f"bench_upload_{mode}_")
+        port = free_port()
+        server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", mode,
+                                   "--port", str(port), "--dir", upload_dir])
+        try:
+            before, after, elapsed, responses = asyncio.run(
+                run_client(f"http://127.0.0.1:{port}", args.uploads, payload)
+            )
+            ok = [r.json()["path"] for r in responses if r.status_code == 200]
+            intact = all(hashlib.sha256(open(path, "rb").read()).hexdigest() == digest for path in ok)
+            print(f"{mode:<9}: {len(ok)}/{args.uploads} stored in {elapsed:6.2f} s, bytes intact: {intact}, "
+                  f"server RSS idle {before['VmRSS']:6.1f} MB -> peak {after['VmHWM']:7.1f} MB")
+        finally:
+            server.terminate()
+            server.wait()
+            shutil.rmtree(upload_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
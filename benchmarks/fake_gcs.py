@@ -0,0 +1,68 @@
+"""
+Local fake Google Cloud Storage JSON API for benchmarks.
+
+Just enough for google-cloud-storage's multipart upload (with
+``ifGenerationMatch``) and media download; point the client at it with
+``STORAGE_EMULATOR_HOST``. Counts uploads, rejected duplicates and bytes
+received and sent.
+"""
+import email.parser
+import email.policy
+import json
+from urllib.parse import unquote
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+
+class FakeGCS:
+    def __init__(self):
+        self.objects = {}  # (bucket, name) -> (metadata, data)
+        self.generation = 0
+        self.uploads = 0
+        self.duplicates = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+
+def _resource(bucket: str, name: str, metadata: dict, data: bytes, generation: int) -> dict:
+    return dict(metadata, bucket=bucket, name=name, size=str(len(data)), generation=str(generation),
+                metageneration="1", kind="storage#object")
+
+
+def build_app(gcs: FakeGCS) -> Starlette:
+    async def upload(request: Request):
+        bucket = request.path_params["bucket"]
+        body = await request.body()
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+            b"Content-Type: " + request.headers["content-type"].encode() + b"\r\n\r\n" + body
+        )
+        metadata_part, media_part = list(message.iter_parts())
+        metadata = json.loads(metadata_part.get_content())
+        data = media_part.get_payload(decode=True)
+        name = metadata["name"]
+        if request.query_params.get("ifGenerationMatch") == "0" and (bucket, name) in gcs.objects:
+            gcs.duplicates += 1
+            return JSONResponse({"error": {"code": 412, "message": "At least one of the pre-conditions you "
+                                                                    "specified did not hold."}}, status_code=412)
+        gcs.generation += 1
+        gcs.uploads += 1
+        gcs.bytes_in += len(data)
+        gcs.objects[(bucket, name)] = (metadata, data)
+        return JSONResponse(_resource(bucket, name, metadata, data, gcs.generation))
+
+    async def download(request: Request):
+        key = (request.path_params["bucket"], unquote(request.path_params["name"]))
+        if key not in gcs.objects:
+            return JSONResponse({"error": {"code": 404, "message": "No such object"}}, status_code=404)
+        metadata, data = gcs.objects[key]
+        gcs.bytes_out += len(data)
+        return Response(data, media_type=metadata.get("contentType", "application/octet-stream"))
+
+    return Starlette(routes=[
+        Route("/upload/storage/v1/b/{bucket}/o", upload, methods=["POST"]),
+        Route("/download/storage/v1/b/{bucket}/o/{name:path}", download, methods=["GET"]),
+        Route("/storage/v1/b/{bucket}/o/{name:path}", download, methods=["GET"]),
+    ])
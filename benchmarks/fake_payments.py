@@ -0,0 +1,115 @@
+"""
+Local fake payment providers for benchmarks.
+
+Serves the Stripe checkout-session, Paystack transaction initialize and PayPal
+OAuth + payment endpoints that agent/payments.py calls (plus Paystack's verify,
+which like the real one returns no checkout URL), with configurable latency. Honours Stripe's Idempotency-Key and PayPal-Request-Id,
+rejects a reused Paystack reference like the real API, and counts checkouts
+created and TCP connections opened.
+"""
+import asyncio
+import itertools
+from typing import Optional
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from benchmarks.fake_providers import Latency
+
+
+class FakePaymentConfig:
+    """Latency knobs and counters shared by the fake endpoints; mutate between benchmark runs."""
+
+    def __init__(self, latency: float = 0.15, hang: bool = False, distribution: Optional[Latency] = None):
+        self.latency = latency
+        self.hang = hang
+        # When set, each call's latency is drawn from it instead of the fixed ``latency``.
+        self.distribution = distribution
+        self.checkouts = {"stripe": 0, "paystack": 0, "paypal": 0}
+        self.tokens_issued = 0
+        self.connections = set()
+        self._ids = itertools.count(1)
+        self._idempotent = {}
+        self._references = {}
+
+    def reset(self) -> None:
+        self.checkouts = dict.fromkeys(self.checkouts, 0)
+        self.tokens_issued = 0
+        self.connections = set()
+
+
+def build_app(config: FakePaymentConfig) -> Starlette:
+    async def provider_call(request: Request):
+        config.connections.add(request.client)
+        if config.hang:
+            await asyncio.sleep(3600)
+        else:
+            await asyncio.sleep(config.distribution.sample() if config.distribution else config.latency)
+
+    def idempotent(provider: str, key: str, make):
+        if key and (provider, key) in config._idempotent:
+            return config._idempotent[(provider, key)]
+        config.checkouts[provider] += 1
+        body = make(next(config._ids))
+        if key:
+            config._idempotent[(provider, key)] = body
+        return body
+
+    async def stripe_session(request: Request):
+        await provider_call(request)
+        form = await request.form()
+        body = idempotent("stripe", request.headers.get("idempotency-key"), lambda i: {
+            "id": f"cs_test_{i}", "url": f"https://checkout.stripe.test/c/pay/cs_test_{i}",
+            "metadata": {"order_number": form["metadata[order_number]"]},
+        })
+        return JSONResponse(body)
+
+    async def paystack_initialize(request: Request):
+        await provider_call(request)
+        payload = await request.json()
+        if payload["reference"] in config._references:
+            return JSONResponse({"status": False, "message": "Duplicate Transaction Reference"}, status_code=400)
+        config.checkouts["paystack"] += 1
+        i = next(config._ids)
+        access_code = f"ac{i:08d}"
+        config._references[payload["reference"]] = {
+            "id": i, "domain": "test", "status": "abandoned", "reference": payload["reference"],
+            "amount": payload["amount"], "currency": "NGN", "metadata": payload.get("metadata"),
+            "customer": {"email": payload["email"]}, "authorization": {},
+        }
+        return JSONResponse({"status": True, "message": "Authorization URL created", "data": {
+            "authorization_url": f"https://checkout.paystack.com/{access_code}",
+            "access_code": access_code,
+            "reference": payload["reference"],
+        }})
+
+    async def paystack_verify(request: Request):
+        # Like the real endpoint: the transaction, without its checkout URL or access code.
+        await provider_call(request)
+        data = config._references.get(request.path_params["reference"])
+        if data is None:
+            return JSONResponse({"status": False, "message": "Transaction reference not found"}, status_code=400)
+        return JSONResponse({"status": True, "message": "Verification successful", "data": data})
+
+    async def paypal_token(request: Request):
+        await provider_call(request)
+        config.tokens_issued += 1
+        return JSONResponse({"access_token": f"A21AA{config.tokens_issued}", "expires_in": 32400})
+
+    async def paypal_payment(request: Request):
+        await provider_call(request)
+        body = idempotent("paypal", request.headers.get("paypal-request-id"), lambda i: {
+            "id": f"PAYID-{i}",
+            "links": [{"rel": "approval_url", "href": f"https://www.sandbox.paypal.test/checkoutnow?token=EC-{i}"}],
+        })
+        return JSONResponse(body, status_code=201)
+
+    return Starlette(routes=[
+        Route("/v1/checkout/sessions", stripe_session, methods=["POST"]),
+        Route("/transaction/initialize", paystack_initialize, methods=["POST"]),
+        Route("/transaction/verify/{reference}", paystack_verify, methods=["GET"]),
+        Route("/v1/oauth2/token", paypal_token, methods=["POST"]),
+        Route("/v1/payments/payment", paypal_payment, methods=["POST"]),
+    ])
@@ -0,0 +1,195 @@
+"""
+Local fake LLM providers for benchmarks.
+
+Serves just enough of the OpenAI chat-completions API and the Gemini
+generateContent API (plain and streaming) for the real SDK clients to talk to
+it, with configurable latency. Nothing leaves the machine.
+"""
+import asyncio
+import json
+import math
+import random
+import socket
+import threading
+import time
+from typing import Optional
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import ClientDisconnect, Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+REPLY = (
+    "Thanks for your order! Could you tell me your full name, delivery address, "
+    "phone number and whether you would like to pay by PayPal, Paystack or bank transfer?"
+)
+
+
+class Latency:
+    """
+    A seeded latency distribution, parsed from a spec string:
+
+        0.2                    fixed 200 ms
+        uniform:0.1:0.4        uniform between 100 and 400 ms
+        lognormal:0.3:0.5      median 300 ms, sigma 0.5 (a long right tail, like real APIs)
+        exp:0.05               exponential with a 50 ms mean
+    """
+
+    def __init__(self, spec: str = "0", seed: int = 0):
+        self.spec = str(spec)
+        kind, *params = self.spec.split(":")
+        if not params:
+            kind, params = "fixed", [kind]
+        if kind not in ("fixed", "uniform", "lognormal", "exp"):
+            raise ValueError(f"unknown latency distribution {kind!r} in {self.spec!r}")
+        self.kind = kind
+        self.params = [float(p) for p in params]
+        self.random = random.Random(seed)
+
+    def sample(self) -> float:
+        if self.kind == "uniform":
+            return self.random.uniform(*self.params)
+        if self.kind == "lognormal":
+            median, sigma = self.params
+            return median * math.exp(self.random.gauss(0.0, sigma)) if median > 0 else 0.0
+        if self.kind == "exp":
+            return self.random.expovariate(1 / self.params[0]) if self.params[0] > 0 else 0.0
+        return self.params[0]
+
+    def __str__(self) -> str:
+        return self.spec
+
+
+class Faults:
+    """Injected trouble for one fake provider: extra latency (fixed or drawn), a slow tail and failed calls."""
+
+    def __init__(self, extra_delay: float = 0.0, slow_rate: float = 0.0, slow_delay: float = 0.0,
+                 error_rate: float = 0.0, seed: int = 0, latency: Optional[Latency] = None):
+        self.extra_delay = extra_delay
+        self.slow_rate = slow_rate
+        self.slow_delay = slow_delay
+        self.error_rate = error_rate
+        self.latency = latency
+        self.random = random.Random(seed)
+
+    def draw(self) -> tuple[bool, float]:
+        """(fail this call, extra seconds before its first token)."""
+        fail = self.random.random() < self.error_rate
+        slow = self.random.random() < self.slow_rate
+        drawn = self.latency.sample() if self.latency is not None else 0.0
+        return fail, self.extra_delay + drawn + (self.slow_delay if slow else 0.0)
+
+
+class FakeLLMConfig:
+    """Latency knobs shared by the fake endpoints; mutate between benchmark runs."""
+
+    def __init__(self, first_token_delay: float = 0.3, token_delay: float = 0.02,
+                 openai_fails: bool = False, prompt_token_delay: float = 0.0, reply: str = REPLY):
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.openai_fails = openai_fails
+        # Prefill cost: extra time to first token per prompt token (~4 characters).
+        self.prompt_token_delay = prompt_token_delay
+        self.reply = reply
+        self.calls = {"openai": 0, "gemini": 0}
+        self.faults = {"openai": Faults(), "gemini": Faults()}
+
+    @property
+    def tokens(self) -> list[str]:
+        words = self.reply.split(" ")
+        return [w if i == 0 else " " + w for i, w in enumerate(words)]
+
+    @property
+    def total_delay(self) -> float:
+        return self.first_token_delay + self.token_delay * (len(self.tokens) - 1)
+
+
+def build_app(config: FakeLLMConfig) -> Starlette:
+    async def openai_chat(request: Request):
+        config.calls["openai"] += 1
+        try:
+            body = await request.json()
+        except ClientDisconnect:
+            # A hedge cancelled before its request body was sent.
+            return Response(status_code=499)
+        fail, extra = config.faults["openai"].draw()
+        if config.openai_fails or fail:
+            return JSONResponse({"error": {"message": "overloaded", "type": "server_error"}}, status_code=500)
+        created = int(time.time())
+        prefill = extra + config.prompt_token_delay * sum(len(m["content"]) for m in body["messages"]) / 4
+        if not body.get("stream"):
+            await asyncio.sleep(config.total_delay + prefill)
+            return JSONResponse({
+                "id": "chatcmpl-fake", "object": "chat.completion", "created": created,
+                "model": body["model"],
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": config.reply}}],
+            })
+
+        async def chunks():
+            for i, token in enumerate(config.tokens):
+                await asyncio.sleep(config.first_token_delay + prefill if i == 0 else config.token_delay)
+                chunk = {
+                    "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created,
+                    "model": body["model"],
+                    "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    def gemini_payload(text: str) -> dict:
+        return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}]}
+
+    async def gemini(request: Request):
+        config.calls["gemini"] += 1
+        action = request.path_params["action"]
+        fail, extra = config.faults["gemini"].draw()
+        if fail:
+            return JSONResponse({"error": {"code": 503, "message": "overloaded", "status": "UNAVAILABLE"}},
+                                status_code=503)
+        if action.endswith(":streamGenerateContent"):
+            async def chunks():
+                for i, token in enumerate(config.tokens):
+                    await asyncio.sleep(config.first_token_delay + extra if i == 0 else config.token_delay)
+                    yield f"data: {json.dumps(gemini_payload(token))}\r\n\r\n"
+
+            return StreamingResponse(chunks(), media_type="text/event-stream")
+        await asyncio.sleep(config.total_delay + extra)
+        return JSONResponse(gemini_payload(config.reply))
+
+    return Starlette(routes=[
+        Route("/v1/chat/completions", openai_chat, methods=["POST"]),
+        Route("/v1beta/models/{action:path}", gemini, methods=["POST"]),
+    ])
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve_in_thread(app, port: int) -> uvicorn.Server:
+    """Run an ASGI app with uvicorn on a daemon thread and wait until it accepts connections."""
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+def point_core_at(base_url: str) -> None:
+    """Re-point agent.core's async OpenAI and Gemini clients at a fake provider server."""
+    import openai
+    from google import genai
+    from google.genai.types import HttpOptions
+
+    import agent.core as core
+
+    core.async_openai_client = openai.AsyncOpenAI(api_key="stub", base_url=f"{base_url}/v1", max_retries=0)
+    core.async_gemini_client = genai.Client(
+        api_key="stub", http_options=HttpOptions(base_url=base_url)
+    ).aio
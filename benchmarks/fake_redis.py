@@ -0,0 +1,202 @@
+"""
+A local Redis stand-in for benchmarks.
+
+Speaks enough RESP2/RESP3 for redis-py and RedisSessionStore (strings and lists with
+TTLs, MULTI/EXEC with WATCH, connection handshake commands) over TCP, so several app
+workers can share sessions without a Redis server. Keys live in one dict in
+this process; ``data`` can be inspected directly.
+"""
+import asyncio
+import threading
+import time
+from typing import Dict, Optional
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data: Dict[bytes, object] = {}
+        self.expires: Dict[bytes, float] = {}
+        # Bumped on every write to a key, for WATCH.
+        self.versions: Dict[bytes, int] = {}
+        self.commands = 0
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    def _alive(self, key: bytes) -> bool:
+        deadline = self.expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def get(self, key: bytes):
+        return self.data[key] if self._alive(key) else None
+
+    def version(self, key: bytes) -> tuple:
+        return self.versions.get(key, 0), self._alive(key)
+
+    def execute(self, args: list):
+        """Run one command; returns the reply value (an Exception for an error reply)."""
+        self.commands += 1
+        name = args[0].upper().decode()
+        a = args[1:]
+        if name in ("SET", "DEL", "EXPIRE", "RPUSH", "LTRIM"):
+            for key in (a if name == "DEL" else a[:1]):
+                self.versions[key] = self.versions.get(key, 0) + 1
+        if name == "PING":
+            return "PONG"
+        if name == "HELLO":
+            info = {"server": "fake-redis", "version": "7.2.0", "proto": int(a[0]) if a else 2, "mode": "standalone"}
+            # RESP3 answers HELLO with a map, RESP2 with a flat array.
+            return info if info["proto"] == 3 else [x for pair in info.items() for x in pair]
+        if name in ("CLIENT", "SELECT"):
+            return "OK"
+        if name == "ECHO":
+            return a[0]
+        if name == "GET":
+            value = self.get(a[0])
+            return value if value is None or isinstance(value, bytes) else _wrong_type()
+        if name == "SET":
+            self.data[a[0]] = a[1]
+            self.expires.pop(a[0], None)
+            options = [x.upper() for x in a[2:]]
+            for unit, scale in ((b"EX", 1.0), (b"PX", 0.001)):
+                if unit in options:
+                    self.expires[a[0]] = time.monotonic() + float(a[2 + options.index(unit) + 1]) * scale
+            return "OK"
+        if name == "DEL":
+            removed = sum(1 for key in a if self._alive(key))
+            for key in a:
+                self.data.pop(key, None)
+                self.expires.pop(key, None)
+            return removed
+        if name == "EXPIRE":
+            if not self._alive(a[0]):
+                return 0
+            self.expires[a[0]] = time.monotonic() + int(a[1])
+            return 1
+        if name == "TTL":
+            if not self._alive(a[0]):
+                return -2
+            return int(self.expires[a[0]] - time.monotonic()) if a[0] in self.expires else -1
+        if name == "RPUSH":
+            items = self.get(a[0])
+            if items is None:
+                items = self.data[a[0]] = []
+            elif not isinstance(items, list):
+                return _wrong_type()
+            items.extend(a[1:])
+            return len(items)
+        if name in ("LRANGE", "LTRIM", "LLEN"):
+            items = self.get(a[0]) or []
+            if not isinstance(items, list):
+                return _wrong_type()
+            if name == "LLEN":
+                return len(items)
+            start, stop = int(a[1]), int(a[2])
+            n = len(items)
+            start = max(start + n if start < 0 else start, 0)
+            stop = stop + n if stop < 0 else min(stop, n - 1)
+            selected = items[start:stop + 1] if start <= stop else []
+            if name == "LRANGE":
+                return selected
+            if selected:
+                self.data[a[0]] = selected
+            else:
+                self.data.pop(a[0], None)
+                self.expires.pop(a[0], None)
+            return "OK"
+        if name == "DBSIZE":
+            return sum(1 for key in list(self.data) if self._alive(key))
+        if name == "FLUSHALL":
+            self.data.clear()
+            self.expires.clear()
+            return "OK"
+        return Exception(f"ERR unknown command '{name}'")
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        queued = None
+        watched = {}
+        resp3 = False
+        try:
+            while True:
+                args = await _read_command(reader)
+                if args is None:
+                    break
+                name = args[0].upper()
+                if name == b"MULTI":
+                    queued, reply = [], "OK"
+                elif name == b"EXEC":
+                    if any(self.version(key) != seen for key, seen in watched.items()):
+                        reply = None  # a watched key changed: the transaction is aborted
+                    else:
+                        reply = [self.execute(command) for command in queued or []]
+                    queued, watched = None, {}
+                elif name == b"DISCARD":
+                    queued, watched, reply = None, {}, "OK"
+                elif name == b"WATCH" and queued is None:
+                    watched.update((key, self.version(key)) for key in args[1:])
+                    reply = "OK"
+                elif name == b"UNWATCH":
+                    watched, reply = {}, "OK"
+                elif queued is not None:
+                    queued.append(args)
+                    reply = "QUEUED"
+                else:
+                    reply = self.execute(args)
+                    if name == b"HELLO" and isinstance(reply, dict):
+                        resp3 = True
+                writer.write(_encode(reply, resp3))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def _wrong_type():
+    return Exception("WRONGTYPE Operation against a key holding the wrong kind of value")
+
+
+async def _read_command(reader: asyncio.StreamReader) -> Optional[list]:
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        return line.split()  # inline command, e.g. from redis-cli or telnet
+    args = []
+    for _ in range(int(line[1:])):
+        size = int((await reader.readline())[1:])
+        args.append((await reader.readexactly(size + 2))[:-2])
+    return args
+
+
+def _encode(value, resp3: bool = False) -> bytes:
+    if value is None:
+        return b"_\r\n" if resp3 else b"$-1\r\n"
+    if isinstance(value, Exception):
+        return f"-{value}\r\n".encode()
+    if isinstance(value, str):
+        return f"+{value}\r\n".encode()
+    if isinstance(value, int):
+        return f":{value}\r\n".encode()
+    if isinstance(value, bytes):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    if isinstance(value, dict):
+        return b"%%%d\r\n" % len(value) + b"".join(_encode(k, resp3) + _encode(v, resp3) for k, v in value.items())
+    return b"*%d\r\n" % len(value) + b"".join(_encode(v, resp3) for v in value)
+
+
+def serve_redis_in_thread(port: int) -> FakeRedis:
+    """Start a FakeRedis on 127.0.0.1:``port`` on a daemon thread and return it."""
+    store = FakeRedis()
+    started = threading.Event()
+
+    async def serve():
+        store.server = await asyncio.start_server(store.handle, "127.0.0.1", port)
+        started.set()
+        async with store.server:
+            await store.server.serve_forever()
+
+    threading.Thread(target=lambda: asyncio.run(serve()), daemon=True).start()
+    started.wait()
+    return store
@@ -0,0 +1,100 @@
+"""
+In-process stand-ins for Mongo and SendGrid in benchmarks.
+
+SlowMongoClient wraps mongomock (or any MongoClient) and sleeps for a drawn
+latency before every collection call, like a round trip to a real server.
+FakeSendGrid accepts ``send(message)`` like SendGridAPIClient and records what
+would have been emailed. Both count their calls.
+"""
+import random
+import threading
+import time
+
+from benchmarks.fake_providers import Latency
+
+
+class _Counter:
+    def __init__(self):
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str) -> None:
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+
+class SlowCollection:
+    """A collection whose every method call first waits one round trip."""
+
+    def __init__(self, collection, latency: Latency, counter: _Counter):
+        self._collection = collection
+        self._latency = latency
+        self._counter = counter
+
+    def __getattr__(self, attr: str):
+        value = getattr(self._collection, attr)
+        if not callable(value):
+            return value
+
+        def call(*args, **kwargs):
+            self._counter.add(attr)
+            time.sleep(self._latency.sample())
+            return value(*args, **kwargs)
+        return call
+
+
+class SlowMongoClient:
+    """``client[db][collection]`` returns a SlowCollection; ``calls`` counts operations by method."""
+
+    def __init__(self, latency: Latency, client=None):
+        if client is None:
+            import mongomock
+
+            client = mongomock.MongoClient()
+        self.client = client
+        self.latency = latency
+        self._counter = _Counter()
+
+    @property
+    def calls(self) -> dict:
+        return dict(self._counter.calls)
+
+    def __getitem__(self, db_name: str) -> "_SlowDatabase":
+        return _SlowDatabase(self, db_name)
+
+
+class _SlowDatabase:
+    def __init__(self, client: SlowMongoClient, name: str):
+        self.client = client
+        self.name = name
+
+    def __getitem__(self, name: str) -> SlowCollection:
+        return SlowCollection(self.client.client[self.name][name], self.client.latency, self.client._counter)
+
+
+class _Sent:
+    status_code = 202
+
+
+class FakeSendGrid:
+    """Stands in for SendGridAPIClient: ``send`` waits a drawn latency and keeps the message."""
+
+    def __init__(self, latency: Latency, error_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.sent = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def send(self, message) -> _Sent:
+        time.sleep(self.latency.sample())
+        with self._lock:
+            if self._random.random() < self.error_rate:
+                raise ConnectionError("fake SendGrid: 503 Service Unavailable")
+            self.sent.append(message)
+        return _Sent()
+
+    @property
+    def count(self) -> int:
+        return len(self.sent)
+
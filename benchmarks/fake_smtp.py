@@ -0,0 +1,79 @@
+"""
+A local SMTP sink for benchmarks.
+
+Accepts mail from smtplib (HELO/EHLO, MAIL, RCPT, DATA, RSET, NOOP, QUIT; no
+STARTTLS or AUTH, so use SmtpTransport with starttls=False and no username)
+and keeps each message as parsed ``email.message.Message`` objects in
+``messages``. ``latency`` seconds are waited before accepting each message,
+like a slow relay.
+"""
+import asyncio
+import email
+import threading
+from email import policy
+from typing import Optional
+
+
+class SmtpSink:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.messages = []
+        self.connections = 0
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+
+        async def reply(line: str) -> None:
+            writer.write(f"{line}\r\n".encode())
+            await writer.drain()
+
+        try:
+            await reply("220 fake-smtp ready")
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode(errors="replace").strip().split(" ", 1)[0].upper()
+                if command == "EHLO":
+                    await reply("250-fake-smtp")
+                    await reply("250 8BITMIME")
+                elif command in ("HELO", "MAIL", "RCPT", "RSET", "NOOP"):
+                    await reply("250 OK")
+                elif command == "DATA":
+                    await reply("354 End data with <CR><LF>.<CR><LF>")
+                    lines = []
+                    while True:
+                        data = await reader.readline()
+                        if data in (b".\r\n", b".\n", b""):
+                            break
+                        lines.append(data[1:] if data.startswith(b"..") else data)
+                    if self.latency:
+                        await asyncio.sleep(self.latency)
+                    self.messages.append(email.message_from_bytes(b"".join(lines), policy=policy.default))
+                    await reply("250 OK: queued")
+                elif command == "QUIT":
+                    await reply("221 Bye")
+                    break
+                else:
+                    await reply("502 Command not implemented")
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+def serve_smtp_in_thread(port: int, latency: float = 0.0) -> SmtpSink:
+    """Start an SmtpSink on 127.0.0.1:``port`` on a daemon thread and return it."""
+    sink = SmtpSink(latency)
+    started = threading.Event()
+
+    async def serve():
+        sink.server = await asyncio.start_server(sink.handle, "127.0.0.1", port)
+        started.set()
+        async with sink.server:
+            await sink.server.serve_forever()
+
+    threading.Thread(target=lambda: asyncio.run(serve()), daemon=True).start()
+    started.wait()
+    return sink
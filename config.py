@@ -12,6 +12,9 @@ class Settings(BaseSettings):
     mongodb_uri: str = Field(..., env="MONGODB_URI")
     db_name: str = Field("aibot", env="DB_NAME")
     orders_collection: str = Field("orders", env="ORDERS_COLLECTION")
+    order_stats_collection: str = Field("order_stats", env="ORDER_STATS_COLLECTION")  # per day/site aggregates
+    orders_api_key: Optional[str] = Field(None, env="ORDERS_API_KEY")  # /orders is disabled without it
+    metrics_api_key: Optional[str] = Field(None, env="METRICS_API_KEY")  # /metrics is disabled without it
     stripe_secret_key: Optional[str] = Field(None, env="STRIPE_SECRET_KEY") # Changed from ... to None
     stripe_webhook_secret: Optional[str] = Field(None, env="STRIPE_WEBHOOK_SECRET") # Changed from ... to None
     paystack_secret_key: Optional[str] = Field(None, env="PAYSTACK_SECRET_KEY") # Changed from ... to None
@@ -21,10 +24,71 @@ class Settings(BaseSettings):
     sendgrid_api_key: Optional[str] = Field(None, env="SENDGRID_API_KEY") # Changed from ... to None
     from_email: Optional[str] = Field(None, env="FROM_EMAIL") # Changed from ... to None
     owner_email: Optional[str] = Field(None, env="OWNER_EMAIL") # Changed from ... to None
+    smtp_host: Optional[str] = Field(None, env="SMTP_HOST")  # owner emails via SMTP instead of SendGrid
+    smtp_port: int = Field(587, env="SMTP_PORT")
+    smtp_username: Optional[str] = Field(None, env="SMTP_USERNAME")
+    smtp_password: Optional[str] = Field(None, env="SMTP_PASSWORD")
+    smtp_starttls: bool = Field(True, env="SMTP_STARTTLS")
+    owner_digest_window_seconds: float = Field(300.0, env="OWNER_DIGEST_WINDOW_SECONDS")  # 0: one email per order
+    owner_immediate_min_price: float = Field(500, env="OWNER_IMMEDIATE_MIN_PRICE")  # emailed at once, not digested
+    owner_digest_max_orders: int = Field(100, env="OWNER_DIGEST_MAX_ORDERS")
+    public_base_url: Optional[str] = Field(None, env="PUBLIC_BASE_URL")  # e.g. https://shop.example.com; for links in emails
     bank_name: Optional[str] = Field(None, env="BANK_NAME") # Changed from ... to None
     account_name: Optional[str] = Field(None, env="ACCOUNT_NAME") 
     account_number: Optional[str] = Field(None, env="ACCOUNT_NUMBER") 
-    
-    #gcs_bucket_name: str = Field(..., env="GCS_BUCKET_NAME") (# i will uncomment when the cloud is set up)
+
+    session_backend: str = Field("memory", env="SESSION_BACKEND")  # "memory", "mongo" or "redis" (multi-worker)
+    redis_url: str = Field("redis://localhost:6379/0", env="REDIS_URL")
+    sessions_collection: str = Field("sessions", env="SESSIONS_COLLECTION")
+    session_history_size: int = Field(10, env="SESSION_HISTORY_SIZE")
+    session_ttl_seconds: int = Field(1800, env="SESSION_TTL_SECONDS")
+    session_max_count: int = Field(100_000, env="SESSION_MAX_COUNT")
+    session_memory_cap_mb: int = Field(256, env="SESSION_MEMORY_CAP_MB")
+
+    response_cache_size: int = Field(2048, env="RESPONSE_CACHE_SIZE")  # 0 disables the cache
+    response_cache_ttl_seconds: int = Field(3600, env="RESPONSE_CACHE_TTL_SECONDS")
+
+    intent_confidence_threshold: float = Field(0.8, env="INTENT_CONFIDENCE_THRESHOLD")  # above 1 disables routing
+    intent_batch_window_ms: float = Field(2.0, env="INTENT_BATCH_WINDOW_MS")
+    intent_reload_interval_seconds: float = Field(5.0, env="INTENT_RELOAD_INTERVAL_SECONDS")
+
+    prompt_history_tokens: int = Field(1500, env="PROMPT_HISTORY_TOKENS")  # history sent to the LLM per turn
+
+    llm_timeout_seconds: float = Field(20.0, env="LLM_TIMEOUT_SECONDS")  # per provider attempt; streams: per delta
+    llm_hedging: bool = Field(False, env="LLM_HEDGING")
+    llm_hedge_min_ms: float = Field(250.0, env="LLM_HEDGE_MIN_MS")
+    llm_hedge_max_ms: float = Field(2000.0, env="LLM_HEDGE_MAX_MS")  # hedge any call still unanswered after this
+    llm_breaker_failures: int = Field(5, env="LLM_BREAKER_FAILURES")
+    llm_breaker_cooldown_seconds: float = Field(30.0, env="LLM_BREAKER_COOLDOWN_SECONDS")
+
+    # Per worker process. Sources are client addresses; behind a proxy, have the server trust its
+    # X-Forwarded-For (uvicorn/gunicorn forwarded_allow_ips), or every visitor shares the proxy's bucket.
+    admission_enabled: bool = Field(True, env="ADMISSION_ENABLED")
+    admission_source_rate_per_minute: float = Field(300.0, env="ADMISSION_SOURCE_RATE_PER_MINUTE")  # 0: no limit
+    admission_source_burst: int = Field(100, env="ADMISSION_SOURCE_BURST")
+    admission_session_rate_per_minute: float = Field(20.0, env="ADMISSION_SESSION_RATE_PER_MINUTE")  # 0: no limit
+    admission_session_burst: int = Field(8, env="ADMISSION_SESSION_BURST")
+    # Turns from a client that sends no session id (each one would otherwise start a fresh session bucket).
+    admission_new_session_rate_per_minute: float = Field(6.0, env="ADMISSION_NEW_SESSION_RATE_PER_MINUTE")
+    admission_new_session_burst: int = Field(5, env="ADMISSION_NEW_SESSION_BURST")
+    admission_max_in_flight: int = Field(32, env="ADMISSION_MAX_IN_FLIGHT")  # turns talking to the LLM at once
+    admission_max_queue: int = Field(64, env="ADMISSION_MAX_QUEUE")  # beyond this, turns get 429 at once
+    admission_queue_timeout_seconds: float = Field(5.0, env="ADMISSION_QUEUE_TIMEOUT_SECONDS")
+
+    metrics_enabled: bool = Field(True, env="METRICS_ENABLED")
+    otel_tracing: bool = Field(False, env="OTEL_TRACING")  # needs opentelemetry-api (and an SDK/exporter)
+
+    warm_services: bool = Field(True, env="WARM_SERVICES")  # build SDK clients and models right after startup
+
+    outbox_concurrency: int = Field(4, env="OUTBOX_CONCURRENCY")
+    outbox_max_attempts: int = Field(6, env="OUTBOX_MAX_ATTEMPTS")
+
+    payment_timeout_seconds: float = Field(10.0, env="PAYMENT_TIMEOUT_SECONDS")
+    payment_link_cache_size: int = Field(4096, env="PAYMENT_LINK_CACHE_SIZE")
+    payment_link_ttl_seconds: int = Field(23 * 3600, env="PAYMENT_LINK_TTL_SECONDS")  # checkouts expire after 24h
+
+    storage_backend: str = Field("local", env="STORAGE_BACKEND")  # "local" or "gcs"
+    gcs_bucket_name: Optional[str] = Field(None, env="GCS_BUCKET_NAME")
+    image_workers: int = Field(0, env="IMAGE_WORKERS")  # proof image processes; 0 means one per core
 
 settings = Settings()
\ No newline at end of file
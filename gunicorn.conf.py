@@ -0,0 +1,58 @@
+"""
+Multi-worker deployment: gunicorn managing uvicorn workers.
+
+    SESSION_BACKEND=redis REDIS_URL=redis://localhost:6379/0 WEB_CONCURRENCY=4 \\
+        gunicorn -c gunicorn.conf.py main:app
+
+Each worker is its own process, so conversation history must live in a shared
+store: SESSION_BACKEND=redis (REDIS_URL) or SESSION_BACKEND=mongo (the
+sessions collection). With the default in-process store a turn that lands on
+another worker starts from an empty history; the master warns about it.
+
+The app is imported once in the master (preload_app) and the intent model is
+loaded there before forking, so the workers share its memory copy-on-write
+instead of each loading a copy. SDK clients, Mongo/Redis connections, the
+outbox worker and the warm-up thread are only created inside each worker
+(agent/services.py builds clients on first use), since none of them survive a
+fork. The outbox is safe to run in every worker: tasks are claimed with a lease.
+
+No sticky sessions are needed for correctness. Behind a load balancer that
+spreads several hosts, hashing on the session_id cookie (nginx:
+``hash $cookie_session_id consistent;``) keeps a conversation on one host, so
+its reply cache and payment-link cache stay warm.
+
+/metrics is per worker: each scrape sees the worker that answered it. It needs
+METRICS_API_KEY (the scraper sends it as a bearer token).
+
+Settings: PORT (8000), WEB_CONCURRENCY (workers, default one per core),
+GUNICORN_PRELOAD=0 to load the app in every worker instead.
+"""
+import gc
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") != "0"
+# LLM calls have their own timeouts (LLM_TIMEOUT_SECONDS); this only reaps hung workers.
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
+
+
+def when_ready(server):
+    """In the master, after the app is imported and before any worker is forked."""
+    from config import settings
+
+    if server.cfg.workers > 1 and settings.session_backend.lower() == "memory":
+        server.log.warning(
+            "SESSION_BACKEND=memory with %d workers: conversations lose their history when a turn "
+            "reaches another worker. Use SESSION_BACKEND=redis or mongo.", server.cfg.workers,
+        )
+    if server.cfg.preload_app:
+        from agent.intent import classifier
+
+        classifier.model  # load the pickle once, shared by every worker
+        # Keep the collector from touching (and so copying) the objects the workers share.
+        gc.freeze()
@@ -1,28 +1,68 @@
 # main.py
-from fastapi import FastAPI, Form, Request, File, UploadFile, HTTPException, status
+from fastapi import FastAPI, Form, Query, Request, Response, HTTPException, status
 from fastapi.templating import Jinja2Templates
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from agent.core import process_user_input
+from starlette.background import BackgroundTask
+from agent.core import process_user_input_async, stream_user_input
+from agent.memory import memory
+from agent.admission import AdmissionRejected, admission, source_key
+from agent.actions import image_processor, order_repository, outbox_worker, owner_notifier
+from agent.orders import decode_cursor, encode_cursor
+from agent.uploads import UploadRejected, receive_upload
+from agent.storage import URL_PREFIX, proof_storage
+from agent.metrics import metrics
+from agent.services import services
+from config import settings
+from contextlib import asynccontextmanager
 # Imports needed for local file handling
-import shutil 
+import asyncio
+import json
+import math
 import os
+import re
+import secrets
 import uuid
-# from config import settings # Not needed in this local version
-# from google.cloud import storage # i will uncomment when the cloud is set up
+from datetime import date, datetime, timedelta
+from typing import Optional
 
-# Setup the FastAPI app
-app = FastAPI()
-templates = Jinja2Templates(directory="templates")
+async def ensure_indexes():
+    """Create the indexes early; order writes refuse to run (and retry this) until the order indexes exist."""
+    try:
+        await asyncio.to_thread(order_repository.ensure_indexes)
+    except Exception as e:
+        print(f"Warning: could not create the order indexes, order writes will fail until they are: {e}")
+    if hasattr(memory, "ensure_indexes"):
+        try:
+            await asyncio.to_thread(memory.ensure_indexes)
+        except Exception as e:
+            print(f"Warning: could not create the session TTL index: {e}")
 
-# storage_client = storage.Client() (# i will uncomment when the cloud is set up)
-# GCS_BUCKET_NAME = settings.gcs_bucket_name (# i will uncomment when the cloud is set up)
 
-# LOCAL STORAGE SETUP
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nothing here waits on the network, so the app takes requests right away; SDK
+    # clients, Mongo and the intent model are built on first use or by the warm-up.
+    index_task = asyncio.create_task(ensure_indexes())
+    if settings.warm_services:
+        services.warm()
+    # Delivers queued order side effects (payment links, proof images, owner emails).
+    outbox_worker.start()
+    # Emails the owner a digest of confirmed orders every OWNER_DIGEST_WINDOW_SECONDS.
+    owner_notifier.start()
+    yield
+    index_task.cancel()
+    await owner_notifier.stop()
+    await outbox_worker.stop()
+    image_processor.shutdown()
+
+# Setup the FastAPI app
+app = FastAPI(lifespan=lifespan)
+templates = Jinja2Templates(directory="templates")
 
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+# PROOF STORAGE SETUP (local disk, or GCS with STORAGE_BACKEND=gcs; see agent/storage.py)
 
-app.mount("/static/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
+app.mount("/static/uploads", proof_storage.asgi_app(), name="uploads")
 
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -31,6 +71,98 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 MAX_FILE_SIZE = 5 * 1024 * 1024  
 ALLOWED_TYPES = ["image/jpeg", "image/png"]
 
+SESSION_COOKIE = "session_id"
+SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+
+def existing_session_id(request: Request, form_session_id: Optional[str]) -> Optional[str]:
+    """The session id from the form field or cookie, or None when neither is valid."""
+    for candidate in (form_session_id, request.cookies.get(SESSION_COOKIE)):
+        if candidate and SESSION_ID_PATTERN.match(candidate):
+            return candidate
+    return None
+
+
+def resolve_session_id(request: Request, form_session_id: Optional[str]) -> str:
+    """Pick the session id from the form field or cookie, issuing a new one when neither is valid."""
+    return existing_session_id(request, form_session_id) or uuid.uuid4().hex
+
+
+def remember_session(response: Response, session_id: str) -> None:
+    response.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite="lax")
+
+
+def request_source(request: Request) -> str:
+    return source_key(request.client.host if request.client else None)
+
+
+def too_many_requests(e: AdmissionRejected) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="The assistant is busy, please try again shortly.",
+        headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+    )
+
+
+async def admit(request: Request, kind: str, session_id: Optional[str], new_session: bool):
+    """Admission control for a turn that may reach the LLM (agent/admission.py); 429 when refused."""
+    try:
+        return await admission.admit(kind, request_source(request), session_id, new_session)
+    except AdmissionRejected as e:
+        raise too_many_requests(e)
+
+
+def require_api_key(request: Request, api_key: Optional[str]) -> None:
+    """Endpoints behind a key are off (404) until it is set; then they take it as X-API-Key or a bearer token."""
+    if not api_key:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    supplied = request.headers.get("x-api-key") or request.headers.get("authorization", "").removeprefix("Bearer ")
+    if not secrets.compare_digest(supplied.strip().encode(), api_key.encode()):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid API key.",
+                            headers={"WWW-Authenticate": "Bearer"})
+
+
+def require_orders_key(request: Request) -> None:
+    require_api_key(request, settings.orders_api_key)
+
+
+@app.get("/metrics")
+async def prometheus_metrics(request: Request):
+    """Stage timings and event counters in Prometheus text format; needs METRICS_API_KEY (a bearer token to Prometheus)."""
+    require_api_key(request, settings.metrics_api_key)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/orders")
+async def list_orders(
+    request: Request,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    status_filter: Optional[str] = Query(None, alias="status"),
+    source_website: Optional[str] = None,
+):
+    """Orders newest first, one page at a time; pass ``next_cursor`` back as ``cursor`` for the next page."""
+    require_orders_key(request)
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    orders, last = await asyncio.to_thread(order_repository.list_orders, limit, after, status_filter, source_website)
+    return {"orders": orders, "next_cursor": encode_cursor(*last) if last else None}
+
+
+@app.get("/orders/stats")
+async def order_stats(request: Request, since: Optional[str] = None, until: Optional[str] = None,
+                      source: Optional[str] = None):
+    """Orders, paid orders and revenue per day and per site (host), by default for the last 30 days (UTC)."""
+    require_orders_key(request)
+    try:
+        until_day = date.fromisoformat(until) if until else datetime.utcnow().date()
+        since_day = date.fromisoformat(since) if since else until_day - timedelta(days=29)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="since and until are YYYY-MM-DD dates.")
+    return await asyncio.to_thread(order_repository.stats, since_day.isoformat(), until_day.isoformat(), source)
+
 
 @app.get("/")
 async def home(request: Request):
@@ -38,58 +170,105 @@ async def home(request: Request):
     return templates.TemplateResponse("index.html", {"request": request, "source": source})
 
 @app.post("/chat")
-async def chat(request: Request, message: str = Form(...)):
+async def chat(request: Request, response: Response, message: str = Form(...), session_id: Optional[str] = Form(None)):
     source = request.headers.get("referer", "Unknown")
+    new_session = existing_session_id(request, session_id) is None
+    session_id = resolve_session_id(request, session_id)
+    remember_session(response, session_id)
     user_input_data = {
         "role": "user",
         "content": message
     }
-    reply = process_user_input(user_input_data, source)
+    async with await admit(request, "chat", session_id, new_session):
+        reply = await process_user_input_async(user_input_data, source, session_id)
     return {"reply": reply}
 
 
+@app.post("/chat/stream")
+async def chat_stream(request: Request, message: str = Form(...), session_id: Optional[str] = Form(None)):
+    """Same as /chat, but streams the reply as Server-Sent Events while the model generates it."""
+    source = request.headers.get("referer", "Unknown")
+    new_session = existing_session_id(request, session_id) is None
+    session_id = resolve_session_id(request, session_id)
+    user_input_data = {
+        "role": "user",
+        "content": message
+    }
+    # Admitted before the response starts, so a refusal is still a plain 429.
+    slot = await admit(request, "chat", session_id, new_session)
+
+    async def events():
+        async with slot:
+            try:
+                async for delta in stream_user_input(user_input_data, source, session_id):
+                    yield f"data: {json.dumps({'delta': delta})}\n\n"
+            except Exception as e:
+                print(f"Error while streaming reply: {e}")
+                yield f"event: error\ndata: {json.dumps({'detail': 'The assistant is unavailable, please try again.'})}\n\n"
+                return
+            yield "event: done\ndata: {}\n\n"
+
+    response = StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Also frees the slot if the client disconnects before the body is iterated.
+        background=BackgroundTask(slot.release),
+    )
+    remember_session(response, session_id)
+    return response
+
+
 @app.post("/upload-proof")
-async def upload_proof(request: Request, file: UploadFile = File(...), message: str = Form(...)):
-    """Handles the file upload, validates it, saves it locally, and calls core logic."""
+async def upload_proof(request: Request, response: Response):
+    """Streams the upload to storage (checking its size and real type on the way) and calls core logic.
+
+    Form fields: file, message, session_id (optional).
+    """
     source = request.headers.get("referer", "Unknown")
+    # Rate limits before reading the body (the form's session_id is not known yet, so the cookie's);
+    # the in-flight slot only once the file is in, so slow uploads do not hold one.
+    cookie_session_id = existing_session_id(request, None)
+    try:
+        admission.limit("proof", request_source(request), cookie_session_id, new_session=cookie_session_id is None)
+    except AdmissionRejected as e:
+        raise too_many_requests(e)
 
-    
-    if file.content_type not in ALLOWED_TYPES:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Invalid file type ({file.content_type}). Only JPEG and PNG are allowed."
-        )
-
-    file_content = await file.read()
-    if len(file_content) > MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File size too large. Must be less than {MAX_FILE_SIZE / 1024 / 1024:.0f} MB."
-        )
-    await file.seek(0) 
-
-    unique_filename = f"{uuid.uuid4()}_{file.filename}"
-    file_path = os.path.join(UPLOAD_DIR, unique_filename)
-    
     try:
-        
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer) 
-        
-        file_url = f"/static/uploads/{unique_filename}"
+        with metrics.stage("upload_receive"):
+            fields, upload = await receive_upload(request, proof_storage.staging_dir, MAX_FILE_SIZE, ALLOWED_TYPES)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    if "message" not in fields:
+        await asyncio.to_thread(os.remove, upload.path)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="The message field is required.")
+
+    session_id = resolve_session_id(request, fields.get("session_id"))
+    remember_session(response, session_id)
+    try:
+        slot = await admission.acquire("proof")
+    except AdmissionRejected as e:
+        await asyncio.to_thread(os.remove, upload.path)
+        raise too_many_requests(e)
+
+    try:
+        # Content-addressed: a receipt uploaded again is stored once and gets the same URL.
+        with metrics.stage("proof_store"):
+            key, _ = await asyncio.to_thread(proof_storage.save, upload.path, upload.sha256, upload.content_type)
+        file_url = f"{URL_PREFIX}{key}"
         
         user_input_data = {
             "role": "user",
-            "content": message,
+            "content": fields["message"],
             "image_url": file_url
         }
 
-        reply = process_user_input(user_input_data, source)
+        reply = await process_user_input_async(user_input_data, source, session_id)
         
     except Exception as e:
         print(f"Error during file upload or processing: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error uploading file: {str(e)}")
     finally:
-        await file.close()
+        slot.release()
 
     return {"reply": reply}
@@ -0,0 +1,62 @@
+import random
+
+import mongomock
+import pytest
+
+from agent.entities import EntityExtractor
+from agent.memory import InMemorySessionStore, MongoSessionStore
+from benchmarks.bench_entity_extraction import EDGE_CASES, incremental, random_conversation, reference_extract
+
+
+def corpus():
+    rng = random.Random(7)
+    return EDGE_CASES + [random_conversation(rng, rng.randint(1, 12)) for _ in range(200)]
+
+
+@pytest.mark.parametrize("history", corpus())
+def test_matches_full_transcript_scan_after_every_turn(history):
+    for cut in range(len(history) + 1):
+        assert incremental(history[:cut]) == reference_extract(history[:cut])
+
+
+def test_address_split_across_turns():
+    extractor = EntityExtractor()
+    extractor.feed("please deliver to", "sure")
+    extractor.feed("12 Allen", "Avenue Ikeja ok")
+    assert extractor.slots()[3] == "sure 12 allen"
+
+
+def test_dict_round_trip_continues_where_it_stopped():
+    history = [{"user": "deliver to", "assistant": ""}, {"user": "5 Awolowo Road", "assistant": "pay with paystack"}]
+    extractor = EntityExtractor()
+    extractor.feed(history[0]["user"], history[0]["assistant"])
+    restored = EntityExtractor.from_dict(extractor.to_dict())
+    restored.feed(history[1]["user"], history[1]["assistant"])
+    assert restored.slots() == reference_extract(history)
+
+
+def test_copy_is_independent():
+    extractor = EntityExtractor()
+    extractor.feed("I want a pizza", "ok")
+    copy = extractor.copy()
+    copy.feed("call 08031234567", "thanks")
+    assert extractor.phone_number is None
+    assert copy.slots()[6] == "08031234567"
+
+
+@pytest.mark.parametrize("make_store", [
+    lambda: InMemorySessionStore(history_size=2),
+    lambda: MongoSessionStore(mongomock.MongoClient().db.sessions, history_size=2),
+], ids=["memory", "mongo"])
+def test_session_store_keeps_entities_beyond_history(make_store):
+    store = make_store()
+    store.add("s1", "I want a laptop, deliver to 3 Main Street", "Noted.")
+    store.add("s1", "email ada@example.com", "Thanks.")
+    store.add("s1", "paypal please", "Sure.")
+    store.add("s2", "pizza", "ok")
+    # The first turn has left the history but not the slots.
+    assert len(store.history("s1")) == 2
+    item, _, _, address, email, payment_method, _ = store.entities("s1").slots()
+    assert (item, address, email, payment_method) == ("Laptop", "3 main street", "ada@example.com", "paypal")
+    assert store.entities("s2").slots()[0] == "Pizza"
+    assert store.entities("unknown").slots() == EntityExtractor().slots()
@@ -0,0 +1,102 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from agent.payments import PaymentLinks, PayPalGateway, PaystackGateway, StripeGateway
+from benchmarks.fake_payments import FakePaymentConfig, build_app
+from benchmarks.fake_providers import free_port, serve_in_thread
+
+
+@pytest.fixture(scope="module")
+def server():
+    config = FakePaymentConfig(latency=0.0)
+    port = free_port()
+    uvicorn_server = serve_in_thread(build_app(config), port)
+    yield config, f"http://127.0.0.1:{port}"
+    uvicorn_server.should_exit = True
+
+
+@pytest.fixture
+def fake(server):
+    config, base_url = server
+    config.reset()
+    config.latency, config.hang = 0.0, False
+    return config, base_url
+
+
+def gateways(base_url: str, timeout: float = 5.0) -> dict:
+    return {
+        "stripe": StripeGateway("sk_test_stub", base_url=base_url, timeout=timeout),
+        "paystack": PaystackGateway("sk_test_stub", base_url=base_url, timeout=timeout),
+        "paypal": PayPalGateway("client", "secret", base_url=base_url, timeout=timeout),
+    }
+
+
+def test_paystack_checkout_url_and_metadata(fake):
+    config, base_url = fake
+    link = PaystackGateway("sk_test_stub", base_url=base_url).create_link("T-1", 9900, "ada@example.com", "T-1:9900")
+    assert link.startswith("https://checkout.paystack.com/")
+    transaction = config._references["T-1"]
+    assert transaction["amount"] == 9900
+    assert transaction["metadata"] == {"order_number": "T-1"}
+
+
+def test_paystack_duplicate_reuses_the_checkout_it_created(fake):
+    config, base_url = fake
+    gateway = PaystackGateway("sk_test_stub", base_url=base_url)
+    first = gateway.create_link("T-2", 9900, None, "T-2:9900")
+    assert gateway.create_link("T-2", 9900, None, "T-2:9900") == first
+    assert config.checkouts["paystack"] == 1
+
+
+def test_paystack_duplicate_from_a_lost_response_starts_a_new_transaction(fake):
+    config, base_url = fake
+    # Another attempt (or process) initialized the reference but its response never arrived.
+    PaystackGateway("sk_test_stub", base_url=base_url).create_link("T-3", 9900, None, "T-3:9900")
+    gateway = PaystackGateway("sk_test_stub", base_url=base_url)
+    link = gateway.create_link("T-3", 9900, None, "T-3:9900")
+    assert link.startswith("https://checkout.paystack.com/")
+    assert config._references["T-3-1"]["metadata"] == {"order_number": "T-3"}
+    assert gateway.create_link("T-3", 9900, None, "T-3:9900") == link
+
+
+def test_paystack_verify_has_no_checkout_url(fake):
+    # The gateway must not depend on it: the real verify response has no authorization_url.
+    _, base_url = fake
+    gateway = PaystackGateway("sk_test_stub", base_url=base_url)
+    gateway.create_link("T-4", 9900, None, "T-4:9900")
+    data = gateway.http.get("/transaction/verify/T-4").json()["data"]
+    assert "authorization_url" not in data and "access_code" not in data
+
+
+def test_links_are_cached_per_order_and_amount(fake):
+    config, base_url = fake
+    links = PaymentLinks(gateways(base_url))
+    for method in ("stripe", "paystack", "paypal"):
+        first = links.get_link(method, "C-1", 99, "ada@example.com")
+        assert first and links.get_link(method, "C-1", 99, "ada@example.com") == first
+    assert links.get_link("stripe", "C-1", 150) != links.get_link("stripe", "C-1", 99)
+    assert config.checkouts == {"stripe": 2, "paystack": 1, "paypal": 1}
+    assert links.stats()["hits"] == 4
+    links.close()
+
+
+def test_concurrent_requests_share_one_checkout(fake):
+    config, base_url = fake
+    config.latency = 0.2
+    links = PaymentLinks(gateways(base_url))
+    with ThreadPoolExecutor(10) as pool:
+        results = list(pool.map(lambda _: links.get_link("stripe", "C-2", 99), range(10)))
+    assert len(set(results)) == 1 and results[0]
+    assert config.checkouts["stripe"] == 1
+    links.close()
+
+
+def test_unconfigured_and_failing_providers_return_none(fake):
+    config, base_url = fake
+    links = PaymentLinks({**gateways(base_url, timeout=0.2), "stripe": StripeGateway(None, base_url=base_url)})
+    assert links.get_link("stripe", "C-3", 99) is None
+    config.hang = True
+    assert links.get_link("paystack", "C-3", 99) is None
+    assert links.stats()["failed"] == 1
+    links.close()
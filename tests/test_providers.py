@@ -0,0 +1,178 @@
+import asyncio
+import gc
+
+import pytest
+
+import agent.core as core
+from agent.providers import CircuitBreaker, Provider, ProviderRouter, ProviderUnavailable
+from benchmarks.fake_providers import FakeLLMConfig, build_app, free_port, point_core_at, serve_in_thread
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def replying(reply: str, delay: float = 0.0):
+    async def complete(messages):
+        await asyncio.sleep(delay)
+        return reply
+    return complete
+
+
+async def failing(messages):
+    raise RuntimeError("overloaded")
+
+
+def test_breaker_opens_then_lets_one_trial_through():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=10, clock=clock)
+    breaker.record_failure()
+    assert breaker.allow() == (True, False)
+    breaker.record_failure()
+    assert breaker.state == "open" and breaker.allow() == (False, False)
+    clock.now = 10
+    assert breaker.state == "half_open"
+    assert breaker.allow() == (True, True)
+    assert breaker.allow() == (False, False)
+    breaker.record_failure()
+    assert breaker.state == "open"
+    clock.now = 20
+    assert breaker.allow() == (True, True)
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.failures == 0
+
+
+def test_cancelled_call_releases_only_a_trial_it_holds():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=1, clock=clock)
+    provider = Provider("slow", replying("late", delay=10), timeout=None, breaker=breaker)
+    router = ProviderRouter([provider])
+
+    async def scenario():
+        early = asyncio.create_task(router._attempt(provider, "complete", lambda p: p.complete(MESSAGES)))
+        await asyncio.sleep(0)
+        breaker.record_failure()
+        clock.now = 1
+        trial = asyncio.create_task(router._attempt(provider, "complete", lambda p: p.complete(MESSAGES)))
+        await asyncio.sleep(0)
+        # The call admitted while the circuit was closed does not hold the trial slot.
+        early.cancel()
+        await asyncio.gather(early, return_exceptions=True)
+        assert breaker.allow() == (False, False)
+        trial.cancel()
+        await asyncio.gather(trial, return_exceptions=True)
+        assert breaker.allow() == (True, True)
+
+    asyncio.run(scenario())
+
+
+def test_falls_back_and_skips_open_circuits():
+    primary = Provider("primary", failing, breaker=CircuitBreaker(failure_threshold=2, cooldown=60))
+    router = ProviderRouter([primary, Provider("backup", replying("from backup"))])
+
+    async def scenario():
+        for _ in range(3):
+            assert await router.complete(MESSAGES) == "from backup"
+
+    asyncio.run(scenario())
+    assert primary.breaker.state == "open"
+    assert router.fallbacks == 2
+    assert [p.name for p in router.ranked("complete")] == ["backup"]
+
+
+def test_all_failing_raises_provider_unavailable():
+    router = ProviderRouter([Provider("a", failing), Provider("b", failing)])
+    with pytest.raises(ProviderUnavailable):
+        asyncio.run(router.complete(MESSAGES))
+
+
+def test_timeout_counts_as_failure():
+    router = ProviderRouter([Provider("hung", replying("never", delay=5), timeout=0.05),
+                             Provider("backup", replying("ok"))])
+    assert asyncio.run(router.complete(MESSAGES)) == "ok"
+    assert router.providers[0].stats["complete"].error_rate() == 1.0
+
+
+def test_hedge_takes_the_first_answer_and_leaves_no_unretrieved_exception():
+    errors = []
+
+    async def fails_late(messages):
+        await asyncio.sleep(0.06)
+        raise RuntimeError("too late")
+
+    router = ProviderRouter([Provider("slow", fails_late), Provider("fast", replying("hedged", delay=0.01))],
+                            hedge=True, hedge_min_delay=0.01, hedge_max_delay=0.02)
+
+    async def scenario():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context["message"]))
+        for _ in range(5):
+            assert await router.complete(MESSAGES) == "hedged"
+        await asyncio.sleep(0.1)
+        gc.collect()
+
+    asyncio.run(scenario())
+    assert router.hedged == 5 and router.hedge_wins == 5
+    assert errors == []
+
+
+def test_hedge_delay_stays_within_budget():
+    slow, fast = Provider("slow", failing), Provider("fast", failing)
+    router = ProviderRouter([slow, fast], hedge=True, hedge_min_delay=0.25, hedge_max_delay=2.0, min_samples=5)
+    assert router._hedge_delay(slow, fast, "complete") == 2.0
+    for _ in range(10):
+        slow.record("complete", 1.2, ok=True)
+        fast.record("complete", 0.4, ok=True)
+    assert router._hedge_delay(slow, fast, "complete") == pytest.approx(0.4)
+    for _ in range(30):
+        fast.record("complete", 0.1, ok=True)
+    assert router._hedge_delay(slow, fast, "complete") == 0.25
+
+
+@pytest.fixture(scope="module")
+def fake_llm_server():
+    config = FakeLLMConfig(first_token_delay=0.01, token_delay=0.0)
+    port = free_port()
+    server = serve_in_thread(build_app(config), port)
+    yield config, f"http://127.0.0.1:{port}"
+    server.should_exit = True
+
+
+@pytest.fixture
+def fake_llm(fake_llm_server):
+    # New SDK clients per test: their connection pools belong to the event loop that used them.
+    config, base_url = fake_llm_server
+    clients = core.async_openai_client, core.async_gemini_client
+    point_core_at(base_url)
+    yield config
+    core.async_openai_client, core.async_gemini_client = clients
+
+
+def sdk_router() -> ProviderRouter:
+    return ProviderRouter([
+        Provider("OpenAI", core._openai_complete, core._openai_stream, timeout=5.0),
+        Provider("Gemini", core._gemini_complete, core._gemini_stream, timeout=5.0),
+    ])
+
+
+def test_sdk_clients_fall_back_to_gemini(fake_llm):
+    fake_llm.openai_fails = True
+    fake_llm.calls = {"openai": 0, "gemini": 0}
+    try:
+        reply = asyncio.run(sdk_router().complete(MESSAGES))
+    finally:
+        fake_llm.openai_fails = False
+    assert reply == fake_llm.reply
+    assert fake_llm.calls == {"openai": 1, "gemini": 1}
+
+
+def test_sdk_stream_yields_the_whole_reply(fake_llm):
+    async def collect():
+        return "".join([delta async for delta in sdk_router().stream(MESSAGES)])
+
+    assert asyncio.run(collect()).strip() == fake_llm.reply